@@ -1,49 +1,45 @@
-#***************************************************************************************************
-# Run only one instance of script.
-#***************************************************************************************************
-from tendo import singleton
-_me = singleton.SingleInstance()
-
-
 #***************************************************************************************************
 # Imports
 #***************************************************************************************************
 # Global packages imports
 import os
-import time
-import datetime
+import asyncio
 import argparse
 import threading
-import json
+import functools
 from typing import Union
 import traceback
+from tendo import singleton
 
 # Local packages imports
 import mooving_iot.utils.logger as logger
 import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.clock as clock
+import mooving_iot.utils.aio as aio
+import mooving_iot.utils.metrics as metrics
+import mooving_iot.utils.metrics_http as metrics_http
 import mooving_iot.project_config as prj_cfg
 import mooving_iot.hw_config as hw_cfg
 
 import mooving_iot.drivers.acc.acc as drv_acc
-import mooving_iot.drivers.acc.lis2hh12.acc_lis2hh12 as drv_acc_lis2hh12
 import mooving_iot.drivers.relay.relay as drv_relay
-import mooving_iot.drivers.relay.adjh23005.relay_adjh23005 as drv_relay_adjh23005
 import mooving_iot.drivers.buzzer.buzzer as drv_buzzer
-import mooving_iot.drivers.buzzer.cpe267.buzzer_cpe267 as drv_buzzer_cpe267
 import mooving_iot.drivers.led_rgb.led_rgb as drv_led_rgb
-import mooving_iot.drivers.led_rgb.ws1812b.led_ws2812b as drv_led_ws2812b
 import mooving_iot.drivers.adc.adc as drv_adc
-import mooving_iot.drivers.adc.ads1115.adc_ads1115 as drv_adc_ads1115
 import mooving_iot.drivers.GNSS.GNSS as gnss
-import mooving_iot.drivers.GNSS.teseo_liv3f.teseo_liv3f as teseo_liv3f
 
 import mooving_iot.libraries.cloud.cloud as lib_cloud
-import mooving_iot.libraries.cloud.google_cloud_iot.google_cloud_iot as lib_google_cloud_iot
 import mooving_iot.libraries.cloud.cloud_protocol as lib_cloud_protocol
 import mooving_iot.libraries.acc_threshold_detector.acc_threshold_detector as lib_acc_thr_detector
 import mooving_iot.libraries.device_config.device_config as lib_device_config
 import mooving_iot.libraries.buzzer_pattern.buzzer_pattern as lib_buzzer_pattern
 import mooving_iot.libraries.led_rgb_pattern.led_rgb_pattern as lib_led_rgb_pattern
+import mooving_iot.libraries.threshold_detection.threshold_detection as lib_threshold_detection
+import mooving_iot.libraries.sensor_trace.sensor_trace as lib_sensor_trace
+import mooving_iot.libraries.event_bus.event_bus as lib_event_bus
+import mooving_iot.libraries.telemetry_spool.telemetry_spool as lib_telemetry_spool
+import mooving_iot.libraries.telemetry_events.telemetry_events as lib_telemetry_events
+import mooving_iot.libraries.sampling_profiler.sampling_profiler as lib_sampling_profiler
 
 
 #***************************************************************************************************
@@ -53,32 +49,570 @@ _log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
 
 
 #***************************************************************************************************
-# Private variables
+# Private constants
 #***************************************************************************************************
-# Drivers instances
-_acc: Union[drv_acc.Acc, None] = None
-_relay: Union[drv_relay.Relay, None] = None
-_buzzer: Union[drv_buzzer.Buzzer, None] = None
-_led_rgb: Union[drv_led_rgb.LedRgb, None] = None
-_adc: Union[drv_adc.Adc, None] = None
-_GNSS: Union[gnss.GNSS, None] = None
+# Threshold detection period without accelerometer and GNSS events, seconds.
+_THRESHOLD_DETECTION_IDLE_PERIOD = 1.0
+
+# Config parameters applied to the accelerometer threshold detector. Acceleration threshold
+# changes are written to the accelerometer registers, so other config changes do not touch them.
+_ACC_THRESHOLD_PARAMS = (
+    'accThresholdMg',
+    'accPeakDurationMs',
+    'accTotalDurationMs',
+    'accPeakCount')
+_ACC_ANGLES_PARAMS = (
+    'accAngleThresholdDegree',
+    'accAngleTotalDurationMs')
+
+# Threaded runtime runs command, configuration and threshold detection processing in own threads,
+# asyncio runtime runs them and the telemetry loop as tasks of a single event loop.
+_RUNTIME_THREAD = 'thread'
+_RUNTIME_ASYNCIO = 'asyncio'
+
+# Spooled telemetry packets are sent in batches with a pause between them, so a backlog after a
+# cloud outage does not flood the connection.
+_TELEMETRY_SPOOL_DRAIN_BATCH = 10
+_TELEMETRY_SPOOL_DRAIN_PERIOD = 0.1
+# Retry period when a packet can not be sent while the cloud is connected, seconds.
+_TELEMETRY_SPOOL_RETRY_PERIOD = 1.0
 
-# Libraries instances
-_device_config = lib_device_config.DeviceConfig.get_instance()
-_acc_thr_detector : Union[lib_acc_thr_detector.AccThresholdDetector, None] = None
-_buzzer_pattern_gen : Union[lib_buzzer_pattern.BuzzerPatternGenerator, None] = None
-_led_rgb_pattern_gen : Union[lib_led_rgb_pattern.LedRgbPatternGenerator, None] = None
 
-# Module variables
-_cloud : Union[lib_cloud.Cloud, None] = None
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+# Driver implementation classes of a device, trace_player feeds the replay drivers.
+class HwImplClasses:
+    def __init__(self, acc, relay, buzzer, led_rgb, gnss, adc, trace_player=None):
+        self.acc = acc
+        self.relay = relay
+        self.buzzer = buzzer
+        self.led_rgb = led_rgb
+        self.gnss = gnss
+        self.adc = adc
+        self.trace_player : Union[lib_sensor_trace.TracePlayer, None] = trace_player
+
+
+# Scooter application: drivers, configuration, threshold detection, telemetry spool and cloud link
+# of one device. Without a loop the threaded runtime is used and start() runs the telemetry loop
+# in the calling thread, with a loop async_start() runs the application as tasks of that loop.
+# Devices which share a process need own device_config instances and spool paths.
+# CloudImplCls replaces Google Cloud IoT implementation, used by benchmarks and tools without cloud
+# connection.
+class Device:
+    def __init__(self, conn_params : lib_cloud.CloudConnectionParameters, CloudImplCls=None,
+        hw_impl_classes : HwImplClasses=None,
+        device_config : lib_device_config.DeviceConfig=None,
+        spool_path=prj_cfg.TELEMETRY_SPOOL_PATH,
+        loop : asyncio.AbstractEventLoop=None
+    ):
+        self._loop = loop
+        self._device_config = (lib_device_config.DeviceConfig.get_instance()
+            if device_config == None else device_config)
+        # Sensor updates of this device wake up its threshold detection only.
+        self._event_bus = lib_event_bus.EventBus()
+        self._previous_state = None
+
+        if loop == None:
+            self._telemetry_send_event = threading.Event()
+            self._telemetry_spool_event = threading.Event()
+        else:
+            self._telemetry_send_event = aio.LoopEvent(loop)
+            self._telemetry_spool_event = aio.LoopEvent(loop)
+
+        self._last_telemetry_packet_lock = threading.Lock()
+        self._last_telemetry_packet : Union[lib_cloud_protocol.TelemetryPacket, None] = None
+        self._telemetry_events = lib_telemetry_events.TelemetryEventQueue(
+            prj_cfg.TELEMETRY_EVENTS_DEBOUNCE)
+        self._telemetry_send_requested = False
+        self._telemetry_batch_start_time = None
+        self._telemetry_packets_metric = metrics.counter(
+            'telemetry_packets_total', 'Telemetry packets created by devices.')
+        self._next_metrics_time = clock.time() + prj_cfg.METRICS_TELEMETRY_PERIOD
+
+        self._hw_init(_get_hw_impl_classes() if hw_impl_classes == None else hw_impl_classes)
+        self._lib_init(spool_path)
+
+        self._device_config.set_param(
+            lib_device_config.ConfigParam('deviceId', conn_params.device_id))
+
+        if CloudImplCls == None:
+            CloudImplCls = _get_cloud_impl_class()
+        self._cloud = lib_cloud.Cloud(CloudImplCls, conn_params)
+        self._cloud.set_connection_listener(self._on_cloud_connection_changed)
+
+        _log.debug('Device {} created.'.format(conn_params.device_id))
+
+    def get_cloud(self) -> lib_cloud.Cloud:
+        return self._cloud
+
+    def get_device_config(self) -> lib_device_config.DeviceConfig:
+        return self._device_config
+
+    # Threaded runtime application loop, never returns.
+    def start(self):
+        # Thread names identify the threads in profiles.
+        cmd_thread = threading.Thread(
+            target=self._command_processing_thread, name='command_processing')
+        cmd_thread.start()
+        cfg_thread = threading.Thread(
+            target=self._configuration_processing_thread, name='configuration_processing')
+        cfg_thread.start()
+        thr_thread = threading.Thread(
+            target=self._threshold_detection_thread, name='threshold_detection')
+        thr_thread.start()
+        spool_thread = threading.Thread(target=self._telemetry_spool_thread, name='telemetry_spool')
+        spool_thread.start()
+
+        self._previous_state = self._device_config.get_param('deviceState').value
+        self._update_state(self._previous_state)
+
+        self._cloud.create_connection()
+
+        while True:
+            wait_time_max = self._send_telemetry()
+            send_time = clock.time() + wait_time_max
+
+            _log.debug('Wait to next telemetry send event: {} sec.'.format(wait_time_max))
+            while True:
+                wait_time = self._get_telemetry_wait_time(send_time)
+                if wait_time <= 0:
+                    break
+                clock.wait(self._telemetry_send_event, wait_time)
+                self._telemetry_send_event.clear()
+
+            # Events packet: events which come within the coalescing window are sent together.
+            if clock.time() < send_time:
+                clock.sleep(prj_cfg.TELEMETRY_COALESCE_WINDOW)
+
+    # Asyncio runtime application loop. Cloud messages are received in the MQTT network thread and
+    # handed over to the loop queues, drivers keep their own I/O threads and wake up the loop tasks
+    # through the event bus.
+    async def async_start(self):
+        cmd_queue = asyncio.Queue()
+        cfg_queue = asyncio.Queue()
+        self._cloud.set_command_listener(
+            lambda cmd_json: self._loop.call_soon_threadsafe(cmd_queue.put_nowait, cmd_json))
+        self._cloud.set_configuration_listener(
+            lambda cfg_json: self._loop.call_soon_threadsafe(cfg_queue.put_nowait, cfg_json))
+
+        self._loop.create_task(self._command_processing_task(cmd_queue))
+        self._loop.create_task(self._configuration_processing_task(cfg_queue))
+        self._loop.create_task(self._threshold_detection_task())
+        self._loop.create_task(self._telemetry_spool_task())
+
+        self._previous_state = self._device_config.get_param('deviceState').value
+        self._update_state(self._previous_state)
+
+        # Connection is retried until success, detection should keep running meanwhile.
+        await self._loop.run_in_executor(None, self._cloud.create_connection)
 
-_telemetry_send_event = threading.Event()
+        while True:
+            wait_time_max = self._send_telemetry()
+            send_time = clock.time() + wait_time_max
+
+            _log.debug('Wait to next telemetry send event: {} sec.'.format(wait_time_max))
+            while True:
+                wait_time = self._get_telemetry_wait_time(send_time)
+                if wait_time <= 0:
+                    break
+                await self._telemetry_send_event.wait(wait_time)
+                self._telemetry_send_event.clear()
+
+            # Events packet: events which come within the coalescing window are sent together.
+            if clock.time() < send_time:
+                await aio.sleep(prj_cfg.TELEMETRY_COALESCE_WINDOW)
+
+    def _hw_init(self, impl_classes : HwImplClasses):
+        self._acc = drv_acc.Acc(impl_classes.acc, hw_cfg.ACC.I2C_INST_NUM, hw_cfg.ACC.I2C_ADDR)
+        self._acc.start()
+
+        self._relay = drv_relay.Relay(
+            impl_classes.relay, hw_cfg.RELAY.SET_PIN, hw_cfg.RELAY.RESET_PIN)
+        self._relay.start(self._device_config.get_param('deviceState').value == 'unlock')
+
+        self._buzzer = drv_buzzer.Buzzer(impl_classes.buzzer, hw_cfg.BUZZER.PWM_PIN)
+        self._buzzer.start()
+
+        self._led_rgb = drv_led_rgb.LedRgb(impl_classes.led_rgb,
+            hw_cfg.LED_RGB.R_PIN, hw_cfg.LED_RGB.G_PIN, hw_cfg.LED_RGB.B_PIN)
+        self._led_rgb.start()
+
+        self._GNSS = gnss.GNSS(impl_classes.gnss, hw_cfg.GPS.RST_PIN)
+        self._GNSS.set_event_bus(self._event_bus)
+        self._GNSS.start()
+
+        self._adc = drv_adc.Adc(impl_classes.adc)
+        self._adc.start()
+
+        if impl_classes.trace_player != None:
+            impl_classes.trace_player.start()
+
+    def _lib_init(self, spool_path):
+        self._acc_thr_detector = lib_acc_thr_detector.AccThresholdDetector(
+            self._acc, batch_mode=hw_cfg.ACC.FIFO_ENABLED, event_bus=self._event_bus)
+        self._update_acc_threshold()
+        self._update_acc_angles_threshold()
+        self._device_config.subscribe(
+            _ACC_THRESHOLD_PARAMS + _ACC_ANGLES_PARAMS, self._on_dev_config_changed_acc_cb)
+
+        self._buzzer_pattern_gen = lib_buzzer_pattern.BuzzerPatternGenerator(
+            self._buzzer, self._loop)
+        self._led_rgb_pattern_gen = lib_led_rgb_pattern.LedRgbPatternGenerator(
+            self._led_rgb, self._loop)
+
+        self._threshold_detection = lib_threshold_detection.ThresholdDetection(
+            self._adc, self._GNSS, self._acc_thr_detector, self._device_config,
+            self._on_threshold_event, self._on_alarm_phase_changed,
+            event_bus=self._event_bus,
+            idle_period=_THRESHOLD_DETECTION_IDLE_PERIOD,
+            sensor_event=aio.LoopEvent(self._loop) if self._loop != None else None)
+
+        self._telemetry_spool = lib_telemetry_spool.TelemetrySpool(
+            spool_path,
+            prj_cfg.TELEMETRY_SPOOL_MAX_SIZE,
+            prj_cfg.TELEMETRY_SPOOL_SEGMENT_SIZE,
+            lib_telemetry_spool.SPOOL_EVICTION(prj_cfg.TELEMETRY_SPOOL_EVICTION),
+            prj_cfg.TELEMETRY_SPOOL_FSYNC)
+        if self._telemetry_spool.get_count() > 0:
+            _log.info('{} telemetry packets spooled.'.format(self._telemetry_spool.get_count()))
+        spool_packets = metrics.gauge(
+            'telemetry_spool_packets', 'Telemetry packets waiting in the spools.')
+        spool_packets.add_source(self._telemetry_spool.get_count)
+
+        self._profiler = lib_sampling_profiler.SamplingProfiler(
+            prj_cfg.PROFILER_SAMPLE_INTERVAL, prj_cfg.PROFILER_MAX_DUTY, prj_cfg.PROFILER_MAX_DEPTH)
+
+    def _on_dev_config_changed_acc_cb(self, changes):
+        _log.debug('Update acc params: %s.', changes)
+
+        if any(name in changes for name in _ACC_THRESHOLD_PARAMS):
+            self._update_acc_threshold()
+        if any(name in changes for name in _ACC_ANGLES_PARAMS):
+            self._update_acc_angles_threshold()
+
+    def _update_acc_threshold(self):
+        config = self._device_config.get_snapshot()
+        self._acc_thr_detector.set_acc_threshold(
+            config['accThresholdMg'],
+            config['accPeakDurationMs'],
+            config['accTotalDurationMs'],
+            config['accPeakCount'])
+
+    def _update_acc_angles_threshold(self):
+        config = self._device_config.get_snapshot()
+        self._acc_thr_detector.set_angles_threshold(
+            config['accAngleThresholdDegree'],
+            config['accAngleTotalDurationMs'])
+
+    def _process_command(self, cmd_json):
+        _log.debug('Command json: {}'.format(cmd_json))
+
+        cmd_packet = lib_cloud_protocol.CommandPacket(cmd_json)
+        cmd_dict = cmd_packet.get_dict()
+
+        if cmd_packet.is_valid():
+            if cmd_dict['command'] == 'set-intervals':
+                params = []
+                if 'lock' in cmd_dict['states']:
+                    params.append(lib_device_config.ConfigParam(
+                        'telemetryIntervalLock', cmd_dict['states']['lock']))
+                if 'unlock' in cmd_dict['states']:
+                    params.append(lib_device_config.ConfigParam(
+                        'telemetryIntervalUnlock', cmd_dict['states']['unlock']))
+                if 'unavailable' in cmd_dict['states']:
+                    params.append(lib_device_config.ConfigParam(
+                        'telemetryIntervalUnavailable', cmd_dict['states']['unavailable']))
+                self._device_config.set_params(params)
+            elif ((cmd_dict['command'] == 'lock')
+                or (cmd_dict['command'] == 'unlock')
+                or (cmd_dict['command'] == 'unavailable')):
+                # clear threshold detection to avoid immediate alarm after unlock state
+                self._acc_thr_detector.clear()
+                param = lib_device_config.ConfigParam('deviceState', cmd_dict['command'])
+                self._device_config.set_param(param)
+                self._telemetry_events.put(lib_cloud_protocol.StateEvent(cmd_dict['command']))
+            elif cmd_dict['command'] == 'beep':
+                self._buzzer_pattern_gen.start_pattern(lib_buzzer_pattern.BUZZER_PATTERN_ID.BEEP,
+                    cmd_dict['volume'], lib_buzzer_pattern.PATTERN_REPEAT_FOREVER)
+            elif cmd_dict['command'] == 'alarm':
+                self._buzzer_pattern_gen.start_pattern(lib_buzzer_pattern.BUZZER_PATTERN_ID.ALARM,
+                    cmd_dict['volume'], lib_buzzer_pattern.PATTERN_REPEAT_FOREVER)
+            elif cmd_dict['command'] == 'profile':
+                if not self._profiler.start(
+                    cmd_dict['duration'], self._on_profile_done, cmd_dict.get('threads')):
+                    _log.warning('Profiler is already running, command ignored.')
+
+            self._request_telemetry()
+
+    # Called from the profiler thread. The profile is sent directly, it is not spooled.
+    def _on_profile_done(self, result : lib_sampling_profiler.ProfileResult):
+        packet = lib_cloud_protocol.ProfilePacket(
+            device_id=self._device_config.get_param('deviceId').value,
+            duration=result.get_duration(),
+            samples=result.get_sample_count(),
+            overhead=result.get_overhead(),
+            stacks=result.get_collapsed_stacks(prj_cfg.PROFILER_MAX_STACKS))
+        try:
+            rc = self._cloud.send_event(packet.to_map())
+        except ValueError as err:
+            _log.error('Profile is not sent: %s', err)
+            return
+        if rc != 0:
+            _log.warning('Profile is not sent, status: %d.', rc)
+
+    def _command_processing_thread(self):
+        try:
+            _log.debug('command_processing_thread started.')
+
+            while True:
+                self._process_command(self._cloud.wait_for_command())
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
+
+    def _configuration_processing_thread(self):
+        try:
+            _log.debug('configuration_processing_thread started.')
+
+            while True:
+                cfg_json = self._cloud.wait_for_configuration()
+                _log.debug('Configuration json: {}'.format(cfg_json))
+
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
+
+    # Telemetry packet is sent after the coalescing window even if there are no new events.
+    def _request_telemetry(self):
+        with self._last_telemetry_packet_lock:
+            self._telemetry_send_requested = True
+        self._telemetry_send_event.set()
+
+    def _on_threshold_event(self, event : lib_cloud_protocol.Event):
+        self._telemetry_events.put(event)
+        self._telemetry_send_event.set()
+
+    # Called from the network thread. Spooled packets are sent after reconnect.
+    def _on_cloud_connection_changed(self, is_connected):
+        _log.info('Cloud connected: {}, connection: {}'.format(
+            is_connected, self._cloud.get_connection_stats()))
+        _log.info('Telemetry delivery: {}'.format(self._cloud.get_delivery_stats()))
+        self._telemetry_spool_event.set()
+
+    # Returns the time to wait for the next telemetry packet, 0 if it should be sent now: on
+    # request, with ready events or at send_time. Held events are released meanwhile.
+    def _get_telemetry_wait_time(self, send_time):
+        if self._telemetry_send_requested or self._telemetry_events.has_ready_events():
+            return 0
+
+        current_time = clock.time()
+        wait_time = send_time - current_time
+        release_time = self._telemetry_events.get_next_release_time()
+        if release_time != None:
+            wait_time = min(wait_time, release_time - current_time)
+        return max(0, wait_time)
+
+    def _on_alarm_phase_changed(self, phase):
+        if phase == 1:
+            self._buzzer_pattern_gen.start_pattern(
+                lib_buzzer_pattern.BUZZER_PATTERN_ID.ALARM_PHASE_1)
+        elif phase == 2:
+            self._buzzer_pattern_gen.start_pattern(
+                lib_buzzer_pattern.BUZZER_PATTERN_ID.ALARM_PHASE_2)
+        elif phase == 3:
+            self._buzzer_pattern_gen.start_pattern(
+                lib_buzzer_pattern.BUZZER_PATTERN_ID.ALARM_PHASE_3,
+                None, lib_buzzer_pattern.PATTERN_REPEAT_FOREVER)
+        else:
+            self._buzzer_pattern_gen.stop_pattern()
+
+    def _threshold_detection_thread(self):
+        try:
+            _log.debug('threshold_detection_thread started.')
+
+            while True:
+                self._threshold_detection.wait_and_process()
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
+
+    # Sends the oldest spooled telemetry packets while the cloud is connected. Returns the time to
+    # the next call, None if it should wait for a new packet or a connection change.
+    # With batching up to TELEMETRY_BATCH_SIZE packets are sent in one message, a packet waits for
+    # a full batch at most TELEMETRY_BATCH_MAX_DELAY seconds.
+    def _drain_telemetry_spool(self):
+        if not self._cloud.is_connected():
+            return None
+
+        sent_count = 0
+        if prj_cfg.TELEMETRY_BATCH_SIZE > 1:
+            payloads = self._telemetry_spool.peek(prj_cfg.TELEMETRY_BATCH_SIZE)
+            if len(payloads) == 0:
+                self._telemetry_batch_start_time = None
+                return None
+            if len(payloads) < prj_cfg.TELEMETRY_BATCH_SIZE:
+                if self._telemetry_batch_start_time == None:
+                    self._telemetry_batch_start_time = clock.time()
+                wait_time = (self._telemetry_batch_start_time + prj_cfg.TELEMETRY_BATCH_MAX_DELAY
+                    - clock.time())
+                if wait_time > 0:
+                    return wait_time
+            if self._cloud.send_events(payloads) == 0:
+                sent_count = len(payloads)
+                self._telemetry_batch_start_time = None
+        else:
+            payloads = self._telemetry_spool.peek(_TELEMETRY_SPOOL_DRAIN_BATCH)
+            for payload in payloads:
+                if self._cloud.send_event(payload) != 0:
+                    break
+                sent_count += 1
+        self._telemetry_spool.commit(sent_count)
+
+        if sent_count < len(payloads):
+            _log.debug('Telemetry send failed, {} packets spooled.'.format(
+                self._telemetry_spool.get_count()))
+            return _TELEMETRY_SPOOL_RETRY_PERIOD
+        if self._telemetry_spool.get_count() > 0:
+            return _TELEMETRY_SPOOL_DRAIN_PERIOD
+        return None
+
+    def _telemetry_spool_thread(self):
+        try:
+            _log.debug('telemetry_spool_thread started.')
+
+            while True:
+                self._telemetry_spool_event.clear()
+                clock.wait(self._telemetry_spool_event, self._drain_telemetry_spool())
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
+
+    async def _command_processing_task(self, cmd_queue : asyncio.Queue):
+        try:
+            _log.debug('command_processing_task started.')
+
+            while True:
+                self._process_command(await cmd_queue.get())
+        except asyncio.CancelledError:
+            raise
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
+
+    async def _configuration_processing_task(self, cfg_queue : asyncio.Queue):
+        try:
+            _log.debug('configuration_processing_task started.')
+
+            while True:
+                cfg_json = await cfg_queue.get()
+                _log.debug('Configuration json: {}'.format(cfg_json))
+
+        except asyncio.CancelledError:
+            raise
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
+
+    async def _telemetry_spool_task(self):
+        try:
+            _log.debug('telemetry_spool_task started.')
+
+            while True:
+                self._telemetry_spool_event.clear()
+                await self._telemetry_spool_event.wait(self._drain_telemetry_spool())
+        except asyncio.CancelledError:
+            raise
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
+
+    async def _threshold_detection_task(self):
+        try:
+            _log.debug('threshold_detection_task started.')
+
+            while True:
+                await self._threshold_detection.async_wait_and_process()
+        except asyncio.CancelledError:
+            raise
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
+
+    def _update_state(self, state):
+        if state == 'lock':
+            self._relay.set_state(False)
+            self._led_rgb_pattern_gen.start_pattern(
+                lib_led_rgb_pattern.LED_RGB_PATTERN_ID.LOCKED,
+                lib_led_rgb_pattern.PATTERN_REPEAT_FOREVER)
+            self._buzzer_pattern_gen.start_pattern(lib_buzzer_pattern.BUZZER_PATTERN_ID.LOCKED)
+        elif state == 'unlock':
+            self._relay.set_state(True)
+            self._led_rgb_pattern_gen.start_pattern(
+                lib_led_rgb_pattern.LED_RGB_PATTERN_ID.UNLOCKED,
+                lib_led_rgb_pattern.PATTERN_REPEAT_FOREVER)
+            self._buzzer_pattern_gen.start_pattern(lib_buzzer_pattern.BUZZER_PATTERN_ID.UNLOCKED)
+        else:
+            self._relay.set_state(False)
+            self._led_rgb_pattern_gen.stop_pattern()
+            self._buzzer_pattern_gen.stop_pattern()
 
-_last_telemetry_packet_lock = threading.Lock()
-_last_telemetry_packet : Union[lib_cloud_protocol.TelemetryPacket, None] = None
-_last_telemetry_events : list = []
+    # Sends one telemetry packet, returns the maximum time to the next one.
+    def _send_telemetry(self):
+        config = self._device_config.get_snapshot()
+        state = config['deviceState']
+        device_id = config['deviceId']
 
-_is_alarm = False
+        wait_time_max = 0
+        if state == 'lock':
+            wait_time_max = config['telemetryIntervalLock']
+        elif state == 'unlock':
+            wait_time_max = config['telemetryIntervalUnlock']
+        else:
+            wait_time_max = config['telemetryIntervalUnavailable']
+
+        if self._previous_state != state:
+            self._previous_state = state
+            self._update_state(state)
+
+        if (prj_cfg.METRICS_TELEMETRY_PERIOD > 0) and (clock.time() >= self._next_metrics_time):
+            self._next_metrics_time = clock.time() + prj_cfg.METRICS_TELEMETRY_PERIOD
+            self._telemetry_events.put(
+                lib_cloud_protocol.MetricsEvent(metrics.get_registry().get_compact_map()))
+
+        with self._last_telemetry_packet_lock:
+            self._telemetry_send_requested = False
+            self._last_telemetry_packet = lib_cloud_protocol.TelemetryPacket(
+                device_id=device_id,
+                interval=wait_time_max,
+                ext_batt=self._adc.get_ext_batt_voltage(),
+                int_batt=self._adc.get_int_batt_voltage(),
+                ext_batt_charging=self._adc.ext_batt_is_charging(),
+                latitude=self._GNSS.get_latitude(),
+                longtitude=self._GNSS.get_longitude(),
+                altitude=self._GNSS.get_altitude(),
+                heading=self._GNSS.get_heading(),
+                alarm=self._threshold_detection.is_alarm(),
+                state=state,
+                events=self._telemetry_events.pop_all())
+
+            _log.debug('Sending packet: {}'.format(str(self._last_telemetry_packet)))
+            self._telemetry_spool.put(self._last_telemetry_packet.to_map())
+            self._telemetry_spool_event.set()
+        self._telemetry_packets_metric.inc()
+
+        return wait_time_max
+
+
+#***************************************************************************************************
+# Private variables
+#***************************************************************************************************
+# Device of the command line application
+_device : Union[Device, None] = None
+_runtime = _RUNTIME_THREAD
+_loop : Union[asyncio.AbstractEventLoop, None] = None
+# Process lock, only one instance of the command line application runs on a device.
+_single_instance = None
 
 
 #***************************************************************************************************
@@ -119,310 +653,111 @@ def _parse_command_line_args():
             default=8883,
             type=int,
             help='MQTT bridge port.')
+    parser.add_argument(
+            '--runtime',
+            choices=(_RUNTIME_THREAD, _RUNTIME_ASYNCIO),
+            default=_RUNTIME_THREAD,
+            help='Application runtime: threads or a single asyncio event loop.')
     return parser.parse_args()
 
 
-def _command_processing_thread():
-    try:
-        _log.debug('command_processing_thread started.')
-
-        while True:
-            cmd_json = _cloud.wait_for_command()
-            _log.debug('Command json: {}'.format(cmd_json))
-
-            cmd_packet = lib_cloud_protocol.CommandPacket(cmd_json)
-            cmd_dict = cmd_packet.get_dict()
-
-            if cmd_packet.is_valid():
-                if cmd_dict['command'] == 'set-intervals':
-                    if 'lock' in cmd_dict['states']:
-                        param = lib_device_config.ConfigParam(
-                            'telemetryIntervalLock', cmd_dict['states']['lock'])
-                        _device_config.set_param(param)
-                    if 'unlock' in cmd_dict['states']:
-                        param = lib_device_config.ConfigParam(
-                            'telemetryIntervalUnlock', cmd_dict['states']['unlock'])
-                        _device_config.set_param(param)
-                    if 'unavailable' in cmd_dict['states']:
-                        param = lib_device_config.ConfigParam(
-                            'telemetryIntervalUnavailable', cmd_dict['states']['unavailable'])
-                        _device_config.set_param(param)
-                elif ((cmd_dict['command'] == 'lock')
-                    or (cmd_dict['command'] == 'unlock')
-                    or (cmd_dict['command'] == 'unavailable')):
-                    # clear threshold detection to avoid immediate alarm after unlock state
-                    _acc_thr_detector.clear()
-                    param = lib_device_config.ConfigParam('deviceState', cmd_dict['command'])
-                    _device_config.set_param(param)
-                    with _last_telemetry_packet_lock:
-                        _last_telemetry_events.append(
-                            lib_cloud_protocol.StateEvent(cmd_dict['command']))
-                elif cmd_dict['command'] == 'beep':
-                    _buzzer_pattern_gen.start_pattern(lib_buzzer_pattern.BUZZER_PATTERN_ID.BEEP,
-                        cmd_dict['volume'], lib_buzzer_pattern.PATTERN_REPEAT_FOREVER)
-                elif cmd_dict['command'] == 'alarm':
-                    _buzzer_pattern_gen.start_pattern(lib_buzzer_pattern.BUZZER_PATTERN_ID.ALARM,
-                        cmd_dict['volume'], lib_buzzer_pattern.PATTERN_REPEAT_FOREVER)
-
-                _telemetry_send_event.set()
-    except:
-        _log.error(traceback.format_exc())
-        utils_exit.exit(1)
-
-
-def _configuration_processing_thread():
-    try:
-        _log.debug('configuration_processing_thread started.')
-
-        while True:
-            cfg_json = _cloud.wait_for_configuration()
-            _log.debug('Configuration json: {}'.format(cfg_json))
-
-    except:
-        _log.error(traceback.format_exc())
-        utils_exit.exit(1)
-
-
-def _threshold_detection_thread():
-    try:
-        _log.debug('threshold_detection_thread started.')
-
-        is_acc_out_of_thr = False
-        is_angle_out_of_thr = False
-        is_gps_data_change_detected = False
-        last_longitude = _GNSS.get_longitude()
-        last_latitude = _GNSS.get_latitude()
-        is_ext_batt_charging = _adc.ext_batt_is_charging()
-        ext_batt_voltage = _adc.get_ext_batt_voltage()
-        int_batt_voltage = _adc.get_int_batt_voltage()
-
-        alarm_active = False
-        alarm_phase = 0
-        alarm_start_time_ms = 0
-
-        while True:
-            state = _device_config.get_param('deviceState').value
-
-            # Batteries voltages and charging detection
-            ext_batt_voltage_new = _adc.get_ext_batt_voltage()
-            int_batt_voltage_new = _adc.get_int_batt_voltage()
-            is_ext_batt_charging_new = _adc.ext_batt_is_charging()
-            int_batt_threshold = _device_config.get_param('intBattThresholdV').value
-            ext_batt_threshold = _device_config.get_param('extBattThresholdV').value
-            alarm_active = False
-
-            if ((int_batt_voltage_new >= int_batt_voltage + int_batt_threshold)
-                or (int_batt_voltage_new <= int_batt_voltage - int_batt_threshold)
-            ):
-                int_batt_voltage = int_batt_voltage_new
-                _log.debug('Internal battery voltage: {} V.'.format(int_batt_voltage))
-                with _last_telemetry_packet_lock:
-                    _last_telemetry_events.append(
-                        lib_cloud_protocol.IntBattEvent(int_batt_voltage))
-                _telemetry_send_event.set()
-
-            if ((ext_batt_voltage_new >= ext_batt_voltage + ext_batt_threshold)
-                or (ext_batt_voltage_new <= ext_batt_voltage - ext_batt_threshold)
-            ):
-                ext_batt_voltage = ext_batt_voltage_new
-                _log.debug('External battery voltage: {} V.'.format(ext_batt_voltage))
-                with _last_telemetry_packet_lock:
-                    _last_telemetry_events.append(
-                        lib_cloud_protocol.ExtBattEvent(ext_batt_voltage))
-                _telemetry_send_event.set()
-
-            if is_ext_batt_charging_new != is_ext_batt_charging:
-                is_ext_batt_charging = is_ext_batt_charging_new
-                _log.debug('External battery charge: {}.'.format(is_ext_batt_charging))
-                with _last_telemetry_packet_lock:
-                    _last_telemetry_events.append(
-                        lib_cloud_protocol.ChargingEvent(is_ext_batt_charging))
-                _telemetry_send_event.set()
-
-            # Accelerometer movement and angles threshold detection
-            is_acc_out_of_thr_new = _acc_thr_detector.is_acc_out_of_threshold()
-            is_angle_out_of_thr_new = _acc_thr_detector.is_angles_out_of_threshold()
-
-
-            if (is_acc_out_of_thr_new != is_acc_out_of_thr) and (state != 'unlock'):
-                is_acc_out_of_thr = is_acc_out_of_thr_new
-                _log.debug('Acc data out of threshold updated: {}'.format(is_acc_out_of_thr))
-                with _last_telemetry_packet_lock:
-                    _last_telemetry_events.append(
-                        lib_cloud_protocol.AccMovementEvent(is_acc_out_of_thr))
-                _telemetry_send_event.set()
-
-            if (is_angle_out_of_thr_new != is_angle_out_of_thr) and (state != 'unlock'):
-                is_angle_out_of_thr = is_angle_out_of_thr_new
-                angles = _acc_thr_detector.get_angles()
-                _log.debug('Angles are: x: {}, y: {}, z: {}.'.format(angles.x, angles.y, angles.z))
-                _log.debug('Angle out of threshold updated: {}'.format(is_angle_out_of_thr))
-                with _last_telemetry_packet_lock:
-                    _last_telemetry_events.append(
-                        lib_cloud_protocol.AccFallEvent(is_angle_out_of_thr))
-                _telemetry_send_event.set()
-
-            # GPS threshold detection
-            is_gps_data_change_detected_new, new_longitude, new_latitude = (
-                _GNSS.get_gps_data_change(last_longitude, last_latitude))
-            if ((is_gps_data_change_detected_new != is_gps_data_change_detected)
-                and (state != 'unlock') and (_GNSS.get_valid()==True)):
-                if ((new_longitude != "0.0") and (last_longitude != "0.0")
-                    and (new_latitude != "0.0") and (last_latitude != "0.0")):
-                    is_gps_data_change_detected = is_gps_data_change_detected_new
-                last_longitude = new_longitude
-                last_latitude = new_latitude
-                _log.debug('GPS position has been changed')
-                with _last_telemetry_packet_lock:
-                    _last_telemetry_events.append(
-                        lib_cloud_protocol.GNSSMovementEvent(is_gps_data_change_detected))
-                _telemetry_send_event.set()
-
-            alarm_active = (alarm_active or is_gps_data_change_detected or is_acc_out_of_thr
-                or is_angle_out_of_thr)
-
-            # Process alarm if required
-            global _is_alarm
-            if alarm_active and state != "unlock":
-                current_time_ms = int(time.time() * 1000)
-                if alarm_start_time_ms == 0:
-                    _is_alarm = True
-                    alarm_start_time_ms = current_time_ms
-
-                first_phase_timeout_ms = (
-                    _device_config.get_param('firstPhaseAlarmTimeout').value * 1000)
-                second_phase_timeout_ms = (
-                    _device_config.get_param('secondPhaseAlarmTimeout').value * 1000)
-                third_phase_timeout_ms = (
-                    _device_config.get_param('thirdPhaseAlarmTimeout').value * 1000)
-
-                if alarm_start_time_ms + first_phase_timeout_ms >= current_time_ms:
-                    if alarm_phase == 0:
-                        _log.debug('Alarm first phase started.')
-                        _buzzer_pattern_gen.start_pattern(
-                            lib_buzzer_pattern.BUZZER_PATTERN_ID.ALARM_PHASE_1)
-                        alarm_phase += 1
-                        pass
-                elif (alarm_start_time_ms + second_phase_timeout_ms <= current_time_ms
-                    and alarm_start_time_ms + third_phase_timeout_ms >= current_time_ms
-                ):
-                    if alarm_phase == 1:
-                        _log.debug('Alarm second phase started.')
-                        _buzzer_pattern_gen.start_pattern(
-                            lib_buzzer_pattern.BUZZER_PATTERN_ID.ALARM_PHASE_2)
-                        alarm_phase += 1
-                        pass
-                else:
-                    if alarm_phase == 2:
-                        _log.debug('Alarm third phase started.')
-                        _buzzer_pattern_gen.start_pattern(
-                            lib_buzzer_pattern.BUZZER_PATTERN_ID.ALARM_PHASE_3,
-                            None, lib_buzzer_pattern.PATTERN_REPEAT_FOREVER)
-                        alarm_phase += 1
-                        pass
-            elif alarm_phase != 0:
-                _is_alarm = False
-                _buzzer_pattern_gen.stop_pattern()
-                _log.debug('Alarm finished.')
-                alarm_phase = 0
-                alarm_start_time_ms = 0
-                pass
-
-            time.sleep(0.1)
-    except:
-        _log.error(traceback.format_exc())
-        utils_exit.exit(1)
-
-
-def _hw_init():
-    global _acc
-    AccImplClass = drv_acc_lis2hh12.AccLis2hh12
-    _acc = drv_acc.Acc(AccImplClass, hw_cfg.ACC.I2C_INST_NUM, hw_cfg.ACC.I2C_ADDR)
-    _acc.start()
-
-    global _relay
-    RelayImplClass = drv_relay_adjh23005.RelayAdjh23005
-    _relay = drv_relay.Relay(RelayImplClass, hw_cfg.RELAY.SET_PIN, hw_cfg.RELAY.RESET_PIN)
-    _relay.start(_device_config.get_param('deviceState').value == 'unlock')
-
-    global _buzzer
-    BuzzerImplClass = drv_buzzer_cpe267.BuzzerCpe267
-    _buzzer = drv_buzzer.Buzzer(BuzzerImplClass, hw_cfg.BUZZER.PWM_PIN)
-    _buzzer.start()
-
-    global _led_rgb
-    LedRgbImplClass = drv_led_ws2812b.LedWs2812b
-    _led_rgb = drv_led_rgb.LedRgb(LedRgbImplClass,
-        hw_cfg.LED_RGB.R_PIN, hw_cfg.LED_RGB.G_PIN, hw_cfg.LED_RGB.B_PIN)
-    _led_rgb.start()
-
-    global _GNSS
-    GNSSImplClass = teseo_liv3f.GNSS_Teseo_liv3f
-    _GNSS = gnss.GNSS(GNSSImplClass, hw_cfg.GPS.RST_PIN)
-    _GNSS.start()
-
-    global _adc
-    AdcImplClass = drv_adc_ads1115.AdcAds1115
-    _adc = drv_adc.Adc(AdcImplClass)
-    _adc.start()
-
-
-def _on_dev_config_changed_acc_cb():
-    _log.debug('Update acc params.')
-
-    _acc_thr_detector.set_acc_threshold(
-        _device_config.get_param('accThresholdMg').value,
-        _device_config.get_param('accPeakDurationMs').value,
-        _device_config.get_param('accTotalDurationMs').value,
-        _device_config.get_param('accPeakCount').value)
-    _acc_thr_detector.set_angles_threshold(
-        _device_config.get_param('accAngleThresholdDegree').value,
-        _device_config.get_param('accAngleTotalDurationMs').value)
-
-
-def _lib_init():
-    global _acc_thr_detector
-    _acc_thr_detector = lib_acc_thr_detector.AccThresholdDetector(_acc)
-    _on_dev_config_changed_acc_cb()
-    _device_config.set_on_change_callback(_on_dev_config_changed_acc_cb)
-
-    global _buzzer_pattern_gen
-    _buzzer_pattern_gen = lib_buzzer_pattern.BuzzerPatternGenerator(_buzzer)
-
-    global _led_rgb_pattern_gen
-    _led_rgb_pattern_gen = lib_led_rgb_pattern.LedRgbPatternGenerator(_led_rgb)
-
-
-def _update_state(state):
-    if state == 'lock':
-        _relay.set_state(False)
-        _led_rgb_pattern_gen.start_pattern(
-            lib_led_rgb_pattern.LED_RGB_PATTERN_ID.LOCKED,
-            lib_led_rgb_pattern.PATTERN_REPEAT_FOREVER)
-        _buzzer_pattern_gen.start_pattern(lib_buzzer_pattern.BUZZER_PATTERN_ID.LOCKED)
-    elif state == 'unlock':
-        _relay.set_state(True)
-        _led_rgb_pattern_gen.start_pattern(
-            lib_led_rgb_pattern.LED_RGB_PATTERN_ID.UNLOCKED,
-            lib_led_rgb_pattern.PATTERN_REPEAT_FOREVER)
-        _buzzer_pattern_gen.start_pattern(lib_buzzer_pattern.BUZZER_PATTERN_ID.UNLOCKED)
+def _get_hw_impl_classes() -> HwImplClasses:
+    if hw_cfg.BACKEND == hw_cfg.HW_BACKEND.DEVICE:
+        import mooving_iot.drivers.acc.lis2hh12.acc_lis2hh12 as drv_acc_lis2hh12
+        import mooving_iot.drivers.relay.adjh23005.relay_adjh23005 as drv_relay_adjh23005
+        import mooving_iot.drivers.buzzer.cpe267.buzzer_cpe267 as drv_buzzer_cpe267
+        import mooving_iot.drivers.led_rgb.ws1812b.led_ws2812b as drv_led_ws2812b
+        import mooving_iot.drivers.GNSS.teseo_liv3f.teseo_liv3f as teseo_liv3f
+        import mooving_iot.drivers.adc.ads1115.adc_ads1115 as drv_adc_ads1115
+
+        impl_classes = HwImplClasses(
+            acc=functools.partial(drv_acc_lis2hh12.AccLis2hh12,
+                int1_pin=hw_cfg.ACC.INT1_PIN, odr_hz=hw_cfg.ACC.ODR_HZ,
+                fifo_enabled=hw_cfg.ACC.FIFO_ENABLED),
+            relay=drv_relay_adjh23005.RelayAdjh23005,
+            buzzer=drv_buzzer_cpe267.BuzzerCpe267,
+            led_rgb=drv_led_ws2812b.LedWs2812b,
+            gnss=teseo_liv3f.GNSS_Teseo_liv3f,
+            adc=drv_adc_ads1115.AdcAds1115)
     else:
-        _relay.set_state(False)
-        _led_rgb_pattern_gen.stop_pattern()
-        _buzzer_pattern_gen.stop_pattern()
+        import mooving_iot.drivers.acc.sim.acc_sim as drv_acc_sim
+        import mooving_iot.drivers.relay.sim.relay_sim as drv_relay_sim
+        import mooving_iot.drivers.buzzer.sim.buzzer_sim as drv_buzzer_sim
+        import mooving_iot.drivers.led_rgb.sim.led_rgb_sim as drv_led_rgb_sim
+        import mooving_iot.drivers.GNSS.sim.gnss_sim as drv_gnss_sim
+        import mooving_iot.drivers.adc.sim.adc_sim as drv_adc_sim
+
+        impl_classes = HwImplClasses(
+            acc=functools.partial(drv_acc_sim.AccSim,
+                rate_hz=hw_cfg.SIM.ACC_RATE_HZ, seed=hw_cfg.SIM.SEED),
+            relay=drv_relay_sim.RelaySim,
+            buzzer=drv_buzzer_sim.BuzzerSim,
+            led_rgb=drv_led_rgb_sim.LedRgbSim,
+            gnss=functools.partial(drv_gnss_sim.GNSSSim,
+                rate_hz=hw_cfg.SIM.GNSS_RATE_HZ, seed=hw_cfg.SIM.SEED),
+            adc=functools.partial(drv_adc_sim.AdcSim,
+                rate_hz=hw_cfg.SIM.ADC_RATE_HZ, seed=hw_cfg.SIM.SEED))
+
+    if hw_cfg.BACKEND == hw_cfg.HW_BACKEND.REPLAY:
+        import mooving_iot.drivers.acc.trace.acc_trace as drv_acc_trace
+        import mooving_iot.drivers.adc.trace.adc_trace as drv_adc_trace
+        import mooving_iot.drivers.GNSS.trace.gnss_trace as drv_gnss_trace
+
+        trace_reader = lib_sensor_trace.TraceReader(hw_cfg.TRACE.REPLAY_FILE)
+        clock.set_speed(hw_cfg.TRACE.REPLAY_SPEED, trace_reader.get_start_time())
+        impl_classes.trace_player = lib_sensor_trace.TracePlayer(trace_reader)
+
+        impl_classes.acc = functools.partial(drv_acc_trace.AccTraceReplay,
+            trace_player=impl_classes.trace_player)
+        impl_classes.adc = functools.partial(drv_adc_trace.AdcTraceReplay,
+            trace_player=impl_classes.trace_player)
+        impl_classes.gnss = functools.partial(drv_gnss_trace.GNSSTraceReplay,
+            trace_player=impl_classes.trace_player)
+
+    if hw_cfg.TRACE.RECORD_FILE != None:
+        import mooving_iot.drivers.acc.trace.acc_trace as drv_acc_trace
+        import mooving_iot.drivers.adc.trace.adc_trace as drv_adc_trace
+        import mooving_iot.drivers.GNSS.trace.gnss_trace as drv_gnss_trace
+
+        trace_writer = lib_sensor_trace.TraceWriter(hw_cfg.TRACE.RECORD_FILE)
+
+        impl_classes.acc = functools.partial(drv_acc_trace.AccTraceRecorder,
+            AccImplCls=impl_classes.acc, trace_writer=trace_writer)
+        impl_classes.adc = functools.partial(drv_adc_trace.AdcTraceRecorder,
+            AdcImplCls=impl_classes.adc, trace_writer=trace_writer)
+        impl_classes.gnss = functools.partial(drv_gnss_trace.GNSSTraceRecorder,
+            GNSSImplCls=impl_classes.gnss, trace_writer=trace_writer)
+
+    _log.info('Hardware backend: {}.'.format(hw_cfg.BACKEND.value))
+    return impl_classes
+
+
+def _get_cloud_impl_class():
+    import mooving_iot.libraries.cloud.google_cloud_iot.google_cloud_iot as lib_google_cloud_iot
+    return functools.partial(lib_google_cloud_iot.GoogleCloudIot,
+        encoder=lib_cloud_protocol.get_encoder(prj_cfg.TELEMETRY_ENCODER),
+        qos=prj_cfg.TELEMETRY_QOS,
+        max_inflight=prj_cfg.TELEMETRY_MAX_INFLIGHT)
 
 
 #***************************************************************************************************
 # Public functions
 #***************************************************************************************************
-# Application initialization
-def init():
-
-    _hw_init()
-    _lib_init()
+# Command line application initialization. CloudImplCls replaces Google Cloud IoT implementation,
+# used by benchmarks and tools without cloud connection.
+def init(CloudImplCls=None):
+    global _single_instance
+    _single_instance = singleton.SingleInstance()
 
     args = _parse_command_line_args()
 
+    global _runtime, _loop
+    _runtime = args.runtime
+    _log.info('Application runtime: {}.'.format(_runtime))
+    if _runtime == _RUNTIME_ASYNCIO:
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+
     conn_params = lib_cloud.CloudConnectionParameters(
         project_id=args.project_id,
         cloud_region=args.cloud_region,
@@ -433,71 +768,19 @@ def init():
         mqtt_url=args.mqtt_bridge_hostname,
         mqtt_port=args.mqtt_bridge_port)
 
-    _device_config.set_param(lib_device_config.ConfigParam('deviceId', conn_params.device_id))
-
-    global _cloud
-    _cloud = lib_cloud.Cloud(lib_google_cloud_iot.GoogleCloudIot, conn_params)
+    global _device
+    _device = Device(conn_params, CloudImplCls, loop=_loop)
 
-    cmd_thread = threading.Thread(target=_command_processing_thread)
-    cmd_thread.start()
-    cfg_thread = threading.Thread(target=_configuration_processing_thread)
-    cfg_thread.start()
-    thr_thread = threading.Thread(target=_threshold_detection_thread)
-    thr_thread.start()
+    if prj_cfg.METRICS_HTTP_PORT != None:
+        metrics_http.MetricsHttpServer(
+            prj_cfg.METRICS_HTTP_HOST, prj_cfg.METRICS_HTTP_PORT).start()
 
     _log.debug('Application init completed.')
 
 
 # Application loop
 def start():
-    previous_state = None
-
-    previous_state = _device_config.get_param('deviceState').value
-    _update_state(previous_state)
-
-    _cloud.create_connection()
-
-    while True:
-        state = _device_config.get_param('deviceState').value
-        device_id = _device_config.get_param('deviceId').value
-
-        wait_time_max = 0
-        if state == 'lock':
-            wait_time_max = _device_config.get_param('telemetryIntervalLock').value
-        elif state == 'unlock':
-            wait_time_max = _device_config.get_param('telemetryIntervalUnlock').value
-        else:
-            wait_time_max = _device_config.get_param('telemetryIntervalUnavailable').value
-
-        if previous_state != state:
-            previous_state = state
-            _update_state(state)
-
-        global _last_telemetry_packet
-
-        with _last_telemetry_packet_lock:
-            if len(_last_telemetry_events) == 0:
-                _last_telemetry_events.append(lib_cloud_protocol.EmptyEvent())
-
-            _last_telemetry_packet = lib_cloud_protocol.TelemetryPacket(
-                device_id=device_id,
-                interval=wait_time_max,
-                ext_batt=_adc.get_ext_batt_voltage(),
-                int_batt=_adc.get_int_batt_voltage(),
-                ext_batt_charging=_adc.ext_batt_is_charging(),
-                latitude=_GNSS.get_latitude(),
-                longtitude=_GNSS.get_longitude(),
-                altitude=_GNSS.get_altitude(),
-                heading=_GNSS.get_heading(),
-                alarm=_is_alarm,
-                state=state,
-                event=_last_telemetry_events.pop(0))
-
-            if len(_last_telemetry_events) == 0:
-                _telemetry_send_event.clear()
-
-            _log.debug('Sending packet: {}'.format(str(_last_telemetry_packet)))
-            _cloud.send_event(_last_telemetry_packet.to_map())
-
-        _log.debug('Wait to next telemetry send event: {} sec.'.format(wait_time_max))
-        _telemetry_send_event.wait(wait_time_max)
+    if _runtime == _RUNTIME_ASYNCIO:
+        _loop.run_until_complete(_device.async_start())
+    else:
+        _device.start()
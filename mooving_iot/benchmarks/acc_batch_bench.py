@@ -0,0 +1,148 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import time
+import math
+import array
+import random
+import argparse
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.clock as clock
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.drivers.acc.acc as drv_acc
+import mooving_iot.drivers.acc.trace.acc_trace as drv_acc_trace
+import mooving_iot.libraries.sensor_trace.sensor_trace as lib_sensor_trace
+import mooving_iot.libraries.acc_threshold_detector.acc_threshold_detector as lib_acc_thr_detector
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.INFO)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+_START_TIME = 1000000.0
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _parse_command_line_args():
+    parser = argparse.ArgumentParser(
+        description='AccThresholdDetector per sample update() against update_batch().')
+    parser.add_argument(
+            '--samples',
+            default=200000,
+            type=int,
+            help='Number of samples to process.')
+    parser.add_argument(
+            '--rate',
+            default=800,
+            type=float,
+            help='Sample rate, Hz.')
+    parser.add_argument(
+            '--batch',
+            default=32,
+            type=int,
+            help='Batch size, samples.')
+    parser.add_argument(
+            '--seed',
+            default=0,
+            type=int,
+            help='Random generator seed.')
+    return parser.parse_args()
+
+
+# Slowly tilting gravity vector with noise and random out of threshold flags.
+def _generate_samples(samples_count, seed):
+    rng = random.Random(seed)
+    samples = []
+    flags = []
+    tilt = 0.0
+    for _ in range(samples_count):
+        tilt = max(-90.0, min(90.0, tilt + rng.gauss(0, 0.5)))
+        x_angle = math.radians(lib_acc_thr_detector.AccThresholdDetector.DEFAULT_ACC_ANGLE_X + tilt)
+        z_angle = math.radians(lib_acc_thr_detector.AccThresholdDetector.DEFAULT_ACC_ANGLE_Z)
+        samples.append(drv_acc.AccData(
+            int(1000 * math.sin(x_angle) + rng.gauss(0, 8)),
+            int(rng.gauss(0, 8)),
+            int(1000 * math.sin(z_angle) + rng.gauss(0, 8))))
+        flags.append(rng.random() < 0.05)
+    return samples, flags
+
+
+def _create_detector():
+    acc_replay = drv_acc_trace.AccTraceReplay(None, None)
+    detector = lib_acc_thr_detector.AccThresholdDetector(
+        drv_acc.Acc(lambda *args: acc_replay, None, None), start_thread=False)
+    detector.set_acc_threshold(250, 100, 2000, 5)
+    detector.set_angles_threshold(20, 500)
+    return acc_replay, detector
+
+
+def _get_state(detector : lib_acc_thr_detector.AccThresholdDetector):
+    angles = detector.get_angles()
+    return (angles.x, angles.y, angles.z,
+        detector.is_angles_out_of_threshold(), detector.is_acc_out_of_threshold())
+
+
+def _run(samples_count, rate_hz, batch_size, seed):
+    samples, flags = _generate_samples(samples_count, seed)
+    batches_count = samples_count // batch_size
+    sample_period = 1.0 / rate_hz
+
+    scalar_acc, scalar_detector = _create_detector()
+    batch_acc, batch_detector = _create_detector()
+
+    scalar_time = 0.0
+    batch_time = 0.0
+    mismatches = 0
+    for batch_index in range(batches_count):
+        first = batch_index * batch_size
+        timestamp = _START_TIME + (first + batch_size - 1) * sample_period
+
+        wall_start = time.perf_counter()
+        for index in range(batch_size):
+            clock.set_manual_time(timestamp - (batch_size - 1 - index) * sample_period)
+            scalar_acc.push_record(lib_sensor_trace.AccRecord(
+                clock.time(), samples[first + index], flags[first + index]))
+            scalar_detector.update()
+        scalar_time += time.perf_counter() - wall_start
+
+        batch = drv_acc.AccDataBatch(
+            array.array('h', [sample.x_mg for sample in samples[first:first + batch_size]]),
+            array.array('h', [sample.y_mg for sample in samples[first:first + batch_size]]),
+            array.array('h', [sample.z_mg for sample in samples[first:first + batch_size]]),
+            rate_hz, timestamp)
+        wall_start = time.perf_counter()
+        batch_detector.update_batch(batch, flags[first:first + batch_size])
+        batch_time += time.perf_counter() - wall_start
+
+        if _get_state(scalar_detector) != _get_state(batch_detector):
+            mismatches += 1
+
+    processed = batches_count * batch_size
+    _log.info('NumPy: {}, samples: {}, batch: {}.'.format(
+        lib_acc_thr_detector.np != None, processed, batch_size))
+    _log.info('update():       {:8.2f} us/sample.'.format(1e6 * scalar_time / processed))
+    _log.info('update_batch(): {:8.2f} us/sample, {:.1f}x faster.'.format(
+        1e6 * batch_time / processed, scalar_time / max(batch_time, 1e-9)))
+    _log.info('State mismatches: {} of {} batches.'.format(mismatches, batches_count))
+
+
+#***************************************************************************************************
+# Startup point
+#***************************************************************************************************
+if __name__ == '__main__':
+    args = _parse_command_line_args()
+    _run(args.samples, args.rate, args.batch, args.seed)
+    utils_exit.exit(0)
@@ -0,0 +1,69 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import time
+import argparse
+import functools
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.drivers.acc.acc as drv_acc
+import mooving_iot.drivers.acc.sim.acc_sim as drv_acc_sim
+import mooving_iot.libraries.acc_threshold_detector.acc_threshold_detector as lib_acc_thr_detector
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.INFO)
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _parse_command_line_args():
+    parser = argparse.ArgumentParser(
+        description='CPU cost of the simulated accelerometer and AccThresholdDetector pipeline.')
+    parser.add_argument(
+            '--rates',
+            default='10,100,1000,4000',
+            help='Comma separated list of accelerometer sample rates, Hz.')
+    parser.add_argument(
+            '--duration',
+            default=5.0,
+            type=float,
+            help='Measurement duration for each rate, seconds.')
+    return parser.parse_args()
+
+
+def _run(rate_hz, duration_s):
+    acc = drv_acc.Acc(functools.partial(drv_acc_sim.AccSim, rate_hz=rate_hz), None, None)
+    detector = lib_acc_thr_detector.AccThresholdDetector(acc)
+    detector.set_acc_threshold(250, 100, 2000, 5)
+    detector.set_angles_threshold(50, 2000)
+
+    start_wall = time.monotonic()
+    start_cpu = time.process_time()
+    acc.start()
+    time.sleep(duration_s)
+    acc.stop()
+    cpu_s = time.process_time() - start_cpu
+    wall_s = time.monotonic() - start_wall
+
+    _log.info('rate: {rate:>8.1f} Hz, process CPU: {cpu:6.2f} %.'
+        .format(rate=rate_hz, cpu=100.0 * cpu_s / wall_s))
+
+
+#***************************************************************************************************
+# Startup point
+#***************************************************************************************************
+if __name__ == '__main__':
+    args = _parse_command_line_args()
+    for rate in args.rates.split(','):
+        _run(float(rate), args.duration)
+    utils_exit.exit(0)
@@ -0,0 +1,132 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import time
+import threading
+import random
+import argparse
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.clock as clock
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.drivers.acc.acc as drv_acc
+import mooving_iot.drivers.acc.trace.acc_trace as drv_acc_trace
+import mooving_iot.drivers.adc.adc as drv_adc
+import mooving_iot.drivers.adc.trace.adc_trace as drv_adc_trace
+import mooving_iot.drivers.GNSS.GNSS as drv_gnss
+import mooving_iot.drivers.GNSS.trace.gnss_trace as drv_gnss_trace
+import mooving_iot.libraries.sensor_trace.sensor_trace as lib_sensor_trace
+import mooving_iot.libraries.cloud.cloud_protocol as lib_cloud_protocol
+import mooving_iot.libraries.event_bus.event_bus as lib_event_bus
+import mooving_iot.libraries.acc_threshold_detector.acc_threshold_detector as lib_acc_thr_detector
+import mooving_iot.libraries.device_config.device_config as lib_device_config
+import mooving_iot.libraries.threshold_detection.threshold_detection as lib_threshold_detection
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.INFO)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+_LEVEL_SAMPLE = drv_acc.AccData(-766, 0, 642)
+_TILTED_SAMPLE = drv_acc.AccData(0, 0, 1000)
+_SAMPLE_PERIOD = 0.01
+_EVENT_TIMEOUT = 2.0
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _parse_command_line_args():
+    parser = argparse.ArgumentParser(
+        description='Latency from an accelerometer sample to the fall event, '
+            'event bus against 100 ms polling.')
+    parser.add_argument(
+            '--count',
+            default=50,
+            type=int,
+            help='Number of measured tilts for each mode.')
+    parser.add_argument(
+            '--seed',
+            default=0,
+            type=int,
+            help='Random generator seed for delays between tilts.')
+    return parser.parse_args()
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+# Tilts the simulated accelerometer count times and measures the time from the driver sample to
+# the AccFallEvent telemetry event.
+def _run(event_driven, count, seed):
+    acc_replay = drv_acc_trace.AccTraceReplay(None, None)
+    acc = drv_acc.Acc(lambda *args: acc_replay, None, None)
+    adc = drv_adc.Adc(drv_adc_trace.AdcTraceReplay)
+    GNSS = drv_gnss.GNSS(drv_gnss_trace.GNSSTraceReplay, None)
+
+    acc_thr_detector = lib_acc_thr_detector.AccThresholdDetector(acc)
+    acc_thr_detector.set_acc_threshold(2000, 100, 2000, 5)
+    acc_thr_detector.set_angles_threshold(20, 0)
+
+    fall_event_time = [None]
+    fall_event = threading.Event()
+
+    def on_event(event):
+        if isinstance(event, lib_cloud_protocol.AccFallEvent):
+            fall_event_time[0] = time.perf_counter()
+            fall_event.set()
+
+    threshold_detection = lib_threshold_detection.ThresholdDetection(
+        adc, GNSS, acc_thr_detector, lib_device_config.DeviceConfig.get_instance(),
+        on_event, lambda phase: None,
+        event_bus=lib_event_bus.EventBus.get_instance() if event_driven else None)
+
+    def detection_thread_func():
+        while True:
+            threshold_detection.wait_and_process()
+
+    threading.Thread(target=detection_thread_func, daemon=True).start()
+
+    rng = random.Random(seed)
+    latencies_ms = []
+    for _ in range(count):
+        for sample in (_TILTED_SAMPLE, _LEVEL_SAMPLE):
+            time.sleep(rng.uniform(0.05, 0.15))
+            fall_event.clear()
+            sample_time = time.perf_counter()
+            # The sensor keeps streaming the same position until the event is received.
+            while True:
+                acc_replay.push_record(lib_sensor_trace.AccRecord(clock.time(), sample, False))
+                if fall_event.wait(_SAMPLE_PERIOD):
+                    break
+                if time.perf_counter() - sample_time > _EVENT_TIMEOUT:
+                    raise RuntimeError('Fall event timeout.')
+            if sample is _TILTED_SAMPLE:
+                latencies_ms.append(1000 * (fall_event_time[0] - sample_time))
+
+    _log.info('{mode:>6}: p50: {p50:7.2f} ms, p99: {p99:7.2f} ms, max: {max:7.2f} ms.'.format(
+        mode='event' if event_driven else 'poll',
+        p50=_percentile(latencies_ms, 50), p99=_percentile(latencies_ms, 99),
+        max=max(latencies_ms)))
+
+
+#***************************************************************************************************
+# Startup point
+#***************************************************************************************************
+if __name__ == '__main__':
+    args = _parse_command_line_args()
+    _run(False, args.count, args.seed)
+    _run(True, args.count, args.seed)
+    utils_exit.exit(0)
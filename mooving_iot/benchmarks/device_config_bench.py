@@ -0,0 +1,221 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import time
+import argparse
+import tempfile
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.libraries.device_config.device_config as lib_device_config
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.INFO)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+# Parameters read by one threshold detection iteration with an active alarm.
+_DETECTION_PARAMS = (
+    'deviceState',
+    'intBattThresholdV',
+    'extBattThresholdV',
+    'firstPhaseAlarmTimeout',
+    'secondPhaseAlarmTimeout',
+    'thirdPhaseAlarmTimeout')
+# Parameters changed by one set-intervals command.
+_INTERVAL_PARAMS = (
+    'telemetryIntervalLock',
+    'telemetryIntervalUnlock',
+    'telemetryIntervalUnavailable')
+# Parameters written to the accelerometer registers.
+_ACC_PARAMS = ('accThresholdMg', 'accPeakDurationMs', 'accTotalDurationMs', 'accPeakCount')
+
+
+#***************************************************************************************************
+# Private classes
+#***************************************************************************************************
+# Previous DeviceConfig.get_param(): linear scan of the parameters list by name.
+class _ScanDeviceConfig:
+    def __init__(self, device_config : lib_device_config.DeviceConfig):
+        self._params_desc = [
+            lib_device_config.ConfigParamDescription(lib_device_config.ConfigParam(name, value))
+            for name, value in device_config.get_snapshot().to_dict().items()]
+
+    def get_param(self, param_name):
+        for param_desc in self._params_desc:
+            if param_desc.get_param().name == param_name:
+                return param_desc.get_param()
+
+        return None
+
+
+# Counts config file writes.
+class _CountingDeviceConfig(lib_device_config.DeviceConfig):
+    def __init__(self, config_file_path, store_delay):
+        self.store_count = 0
+        super().__init__(config_file_path, store_delay)
+
+    def _store_params(self, snapshot):
+        self.store_count += 1
+        super()._store_params(snapshot)
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _parse_command_line_args():
+    parser = argparse.ArgumentParser(
+        description='DeviceConfig parameter reads: previous linear scan, indexed get_param() and '
+            'one snapshot per threshold detection iteration.')
+    parser.add_argument(
+            '--iterations',
+            default=200000,
+            type=int,
+            help='Detection iterations per read mode.')
+    parser.add_argument(
+            '--commands',
+            default=100,
+            type=int,
+            help='Config commands per persistence and notification run.')
+    return parser.parse_args()
+
+
+def _run_scan(scan_config, iterations):
+    for _ in range(iterations):
+        for name in _DETECTION_PARAMS:
+            scan_config.get_param(name).value
+
+
+def _run_indexed(device_config, iterations):
+    for _ in range(iterations):
+        for name in _DETECTION_PARAMS:
+            device_config.get_param(name).value
+
+
+def _run_snapshot(device_config, iterations):
+    for _ in range(iterations):
+        config = device_config.get_snapshot()
+        for name in _DETECTION_PARAMS:
+            config[name]
+
+
+def _get_interval_params(index):
+    return [lib_device_config.ConfigParam(name, 10 + index % 50) for name in _INTERVAL_PARAMS]
+
+
+# Previous set-intervals handling: every parameter is set and written separately.
+def _run_per_param(device_config, commands):
+    for index in range(commands):
+        for param in _get_interval_params(index):
+            device_config.set_param(param)
+
+
+def _run_batched(device_config, commands):
+    for index in range(commands):
+        device_config.set_params(_get_interval_params(index))
+    device_config.flush()
+
+
+def _run_persistence(commands):
+    modes = (
+        ('per-param', 0, _run_per_param),
+        ('batched', 0, _run_batched),
+        ('coalesced', prj_cfg.DEVICE_CONFIG_STORE_DELAY, _run_batched))
+
+    _log.info('{} set-intervals commands, {} parameters each.'.format(
+        commands, len(_INTERVAL_PARAMS)))
+    _log.info('{:>10} {:>10} {:>14}'.format('mode', 'writes', 'ms/command'))
+    with tempfile.TemporaryDirectory() as config_dir:
+        config_file_path = os.path.join(config_dir, 'device_config.json')
+        for mode, store_delay, run_func in modes:
+            device_config = _CountingDeviceConfig(config_file_path, store_delay)
+            start_time = time.perf_counter()
+            run_func(device_config, commands)
+            run_time = time.perf_counter() - start_time
+            _log.info('{:>10} {:>10} {:>14.3f}'.format(
+                mode, device_config.store_count, 1000 * run_time / commands))
+
+        start_time = time.perf_counter()
+        device_config = _CountingDeviceConfig(config_file_path, 0)
+        _log.info('Startup with a config file: {:.2f} ms, {} writes.'.format(
+            1000 * (time.perf_counter() - start_time), device_config.store_count))
+
+
+# Lock, unlock and set-intervals commands with one acc threshold change among them: counts
+# accelerometer updates made by an any change callback and by an acc params subscription.
+def _run_notifications(commands):
+    device_config = lib_device_config.DeviceConfig()
+    update_counts = {'any change': 0, 'subscription': 0}
+
+    def on_change_cb():
+        update_counts['any change'] += 1
+
+    def on_acc_change_cb(changes):
+        update_counts['subscription'] += 1
+
+    device_config.set_on_change_callback(on_change_cb)
+    device_config.subscribe(_ACC_PARAMS, on_acc_change_cb)
+    for index in range(commands):
+        if index % 3 == 2:
+            device_config.set_params(_get_interval_params(index))
+        else:
+            device_config.set_param(lib_device_config.ConfigParam(
+                'deviceState', 'lock' if index % 3 == 0 else 'unlock'))
+    device_config.set_param(lib_device_config.ConfigParam('accThresholdMg', 300))
+
+    _log.info('{} commands and 1 acc threshold change, accelerometer updates:'.format(commands))
+    for mode, update_count in update_counts.items():
+        _log.info('{:>14} {:>10}'.format(mode, update_count))
+
+
+def _run(iterations):
+    device_config = lib_device_config.DeviceConfig()
+    modes = (
+        ('scan', lambda: _run_scan(_ScanDeviceConfig(device_config), iterations)),
+        ('indexed', lambda: _run_indexed(device_config, iterations)),
+        ('snapshot', lambda: _run_snapshot(device_config, iterations)))
+
+    _log.info('{} iterations, {} parameters per iteration.'.format(
+        iterations, len(_DETECTION_PARAMS)))
+    _log.info('{:>10} {:>14} {:>16} {:>10}'.format(
+        'mode', 'ns/read', 'us/iteration', 'speedup'))
+    scan_time = None
+    for mode, run_func in modes:
+        start_time = time.perf_counter()
+        run_func()
+        run_time = time.perf_counter() - start_time
+        if scan_time == None:
+            scan_time = run_time
+        _log.info('{:>10} {:>14.1f} {:>16.3f} {:>10.1f}'.format(
+            mode, 1e9 * run_time / iterations / len(_DETECTION_PARAMS),
+            1e6 * run_time / iterations, scan_time / run_time))
+
+    param = lib_device_config.ConfigParam('accThresholdMg', 250)
+    start_time = time.perf_counter()
+    for index in range(iterations // 10):
+        param.value = 250 + index % 2
+        device_config.set_param(param)
+    run_time = time.perf_counter() - start_time
+    _log.info('set_param() without persistence: {:.2f} us.'.format(
+        1e6 * run_time / (iterations // 10)))
+
+
+#***************************************************************************************************
+# Startup point
+#***************************************************************************************************
+if __name__ == '__main__':
+    args = _parse_command_line_args()
+    _run(args.iterations)
+    _run_persistence(args.commands)
+    _run_notifications(args.commands)
+    utils_exit.exit(0)
@@ -0,0 +1,355 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import functools
+import threading
+import subprocess
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.drivers.acc.sim.acc_sim as drv_acc_sim
+import mooving_iot.drivers.relay.sim.relay_sim as drv_relay_sim
+import mooving_iot.drivers.buzzer.sim.buzzer_sim as drv_buzzer_sim
+import mooving_iot.drivers.led_rgb.sim.led_rgb_sim as drv_led_rgb_sim
+import mooving_iot.drivers.GNSS.sim.gnss_sim as drv_gnss_sim
+import mooving_iot.drivers.adc.sim.adc_sim as drv_adc_sim
+import mooving_iot.libraries.cloud.cloud as lib_cloud
+import mooving_iot.libraries.device_config.device_config as lib_device_config
+import mooving_iot.libraries.cloud.google_cloud_iot.google_cloud_iot as lib_google_cloud_iot
+import mooving_iot.tools.mqtt_broker_stub as mqtt_broker_stub
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.INFO)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+_CONNECT_TIMEOUT = 120
+# Commands without a telemetry answer for this time are counted as lost, seconds.
+_COMMAND_TIMEOUT = 10
+_READY_LINE = 'ready'
+
+
+#***************************************************************************************************
+# Private classes
+#***************************************************************************************************
+# Google Cloud IoT client against the local broker: no TLS and no JWT signing.
+class _LocalCloudIot(lib_google_cloud_iot.GoogleCloudIot):
+    def __init__(self, cloud_conn_params):
+        super().__init__(cloud_conn_params, use_tls=False)
+
+    def _create_jwt(self):
+        return 'unused'
+
+
+# Sends lock and unlock commands to random devices and measures the time to the telemetry packet
+# with the new state, which includes the telemetry coalescing window of the application.
+# on_message() is called from the broker thread.
+class _CommandController:
+    def __init__(self, broker : mqtt_broker_stub.MqttBrokerStub, device_ids, seed):
+        self._broker = broker
+        self._device_ids = device_ids
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._states = {device_id: 'lock' for device_id in device_ids}
+        # Device ID -> (expected state, command send time).
+        self._pending = {}
+        self.sent_count = 0
+        self.lost_count = 0
+        self.latencies = []
+        self.message_count = 0
+        self.message_bytes = 0
+
+    def send_command(self):
+        current_time = time.perf_counter()
+        with self._lock:
+            for device_id, (_, send_time) in list(self._pending.items()):
+                if current_time - send_time > _COMMAND_TIMEOUT:
+                    del self._pending[device_id]
+                    self.lost_count += 1
+
+            device_id = self._rng.choice(self._device_ids)
+            if device_id in self._pending:
+                return
+            state = 'unlock' if self._states[device_id] == 'lock' else 'lock'
+            self._states[device_id] = state
+            self._pending[device_id] = (state, current_time)
+            self.sent_count += 1
+
+        self._broker.publish('/devices/{}/commands'.format(device_id),
+            json.dumps({'command': state, 'vehicleId': device_id}).encode('utf-8'))
+
+    def get_pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def on_message(self, topic, payload):
+        receive_time = time.perf_counter()
+        self.message_count += 1
+        self.message_bytes += len(payload)
+
+        packet_map = json.loads(payload.decode('utf-8'))
+        with self._lock:
+            pending = self._pending.get(packet_map['deviceId'])
+            if (pending != None) and (pending[0] == packet_map['state']):
+                del self._pending[packet_map['deviceId']]
+                self.latencies.append(receive_time - pending[1])
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _parse_command_line_args():
+    parser = argparse.ArgumentParser(
+        description='Fleet load test: application devices with simulated hardware send telemetry '
+            'to a local MQTT broker stub and answer lock/unlock commands.')
+    parser.add_argument(
+            '--devices',
+            default=1000,
+            type=int,
+            help='Number of virtual devices.')
+    parser.add_argument(
+            '--process_devices',
+            default=150,
+            type=int,
+            help='Devices in one process. The MQTT client uses select() and devices keep telemetry '
+                'spool files open, which limits a process to about 200 devices.')
+    parser.add_argument(
+            '--interval',
+            default=10.0,
+            type=float,
+            help='Telemetry interval of every device in lock and unlock states, seconds.')
+    parser.add_argument(
+            '--command_rate',
+            default=20.0,
+            type=float,
+            help='Commands per second to the whole fleet.')
+    parser.add_argument(
+            '--sensor_rate',
+            default=1.0,
+            type=float,
+            help='Simulated accelerometer, ADC and GNSS sample rate, Hz.')
+    parser.add_argument(
+            '--duration',
+            default=30.0,
+            type=float,
+            help='Measurement time, seconds.')
+    parser.add_argument(
+            '--seed',
+            default=0,
+            type=int,
+            help='Random generator seed.')
+    parser.add_argument(
+            '--child',
+            default=None,
+            type=int,
+            help='Internal: run devices starting from this index and print measurements.')
+    parser.add_argument(
+            '--count',
+            default=0,
+            type=int,
+            help='Internal: number of devices in the child process.')
+    parser.add_argument(
+            '--port',
+            default=0,
+            type=int,
+            help='Internal: broker port for the child process.')
+    parser.add_argument(
+            '--spool_dir',
+            default=None,
+            help='Internal: telemetry spool directory of the child process devices.')
+    return parser.parse_args()
+
+
+def _percentile(values, percent):
+    if len(values) == 0:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def _get_device_id(index):
+    return 'scooter-{:05d}'.format(index)
+
+
+def _get_rss_kb():
+    with open('/proc/self/status', 'r') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def _create_device(index, port, interval, sensor_rate, seed, spool_root, loop):
+    import mooving_iot.application as app
+
+    device_id = _get_device_id(index)
+    conn_params = lib_cloud.CloudConnectionParameters(
+        project_id='fleet', cloud_region='local', registry_id='fleet', device_id=device_id,
+        private_key_filepath=None, private_key_algorithm=None,
+        mqtt_url='127.0.0.1', mqtt_port=port)
+    hw_impl_classes = app.HwImplClasses(
+        acc=functools.partial(drv_acc_sim.AccSim, rate_hz=sensor_rate, seed=seed + index),
+        relay=drv_relay_sim.RelaySim,
+        buzzer=drv_buzzer_sim.BuzzerSim,
+        led_rgb=drv_led_rgb_sim.LedRgbSim,
+        gnss=functools.partial(drv_gnss_sim.GNSSSim, rate_hz=sensor_rate, seed=seed + index),
+        adc=functools.partial(drv_adc_sim.AdcSim, rate_hz=sensor_rate, seed=seed + index))
+
+    # Configuration is kept in memory, thousands of devices would rewrite their files on start.
+    device_config = lib_device_config.DeviceConfig()
+    for name in ('telemetryIntervalLock', 'telemetryIntervalUnlock'):
+        device_config.set_param(lib_device_config.ConfigParam(name, interval))
+
+    return app.Device(conn_params, _LocalCloudIot, hw_impl_classes, device_config,
+        os.path.join(spool_root, device_id), loop)
+
+
+# Devices of the process run the asyncio runtime on one event loop.
+def _run_child(first_index, count, port, interval, sensor_rate, duration, seed, spool_root):
+    # Device logs are suppressed, thousands of devices log every connection.
+    logger.Logger.set_global_log_level(prj_cfg.LogLevel.WARNING)
+    start_rss_kb = _get_rss_kb()
+    start_thread_count = len(os.listdir('/proc/self/task'))
+
+    loop = asyncio.new_event_loop()
+    devices = [
+        _create_device(index, port, interval, sensor_rate, seed, spool_root, loop)
+        for index in range(first_index, first_index + count)]
+    threading.Thread(
+        target=loop.run_until_complete, args=(_gather_devices(devices),), daemon=True).start()
+
+    end_time = time.monotonic() + _CONNECT_TIMEOUT
+    while ((not all(device.get_cloud().is_connected() for device in devices))
+        and (time.monotonic() < end_time)):
+        time.sleep(0.1)
+    print(_READY_LINE, flush=True)
+
+    start_stats = [device.get_cloud().get_delivery_stats() for device in devices]
+    start_cpu_time = time.process_time()
+    time.sleep(duration)
+    cpu_time = time.process_time() - start_cpu_time
+    end_stats = [device.get_cloud().get_delivery_stats() for device in devices]
+
+    # Queued log messages are written before the result, the parent reads the last line.
+    logger.Logger.flush()
+    print(json.dumps({
+        'devices': len(devices),
+        'connected': sum(1 for device in devices if device.get_cloud().is_connected()),
+        'published': sum(end.published - start.published
+            for start, end in zip(start_stats, end_stats)),
+        'rejected': sum(end.rejected - start.rejected
+            for start, end in zip(start_stats, end_stats)),
+        'cpu_time': cpu_time,
+        'rss_kb': _get_rss_kb(),
+        'devices_rss_kb': _get_rss_kb() - start_rss_kb,
+        'threads': len(os.listdir('/proc/self/task')) - start_thread_count}), flush=True)
+
+
+async def _gather_devices(devices):
+    await asyncio.gather(*(device.async_start() for device in devices))
+
+
+def _run(devices_count, process_devices, interval, command_rate, sensor_rate, duration, seed):
+    broker = mqtt_broker_stub.MqttBrokerStub(record_messages=False)
+    port = broker.start()
+    device_ids = [_get_device_id(index) for index in range(devices_count)]
+    controller = _CommandController(broker, device_ids, seed)
+    broker.set_message_listener(controller.on_message)
+
+    env = dict(os.environ, MOOVING_IOT_HW_BACKEND='sim')
+    spool_dir = tempfile.TemporaryDirectory()
+    children = []
+    for first_index in range(0, devices_count, process_devices):
+        count = min(process_devices, devices_count - first_index)
+        children.append(subprocess.Popen(
+            [sys.executable, '-m', 'mooving_iot.benchmarks.fleet_load_bench',
+                '--child', str(first_index), '--count', str(count), '--port', str(port),
+                '--interval', str(interval), '--sensor_rate', str(sensor_rate),
+                '--duration', str(duration), '--seed', str(seed), '--spool_dir', spool_dir.name],
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL))
+
+    connect_start_time = time.monotonic()
+    for child in children:
+        for line in child.stdout:
+            if line.decode('utf-8').strip() == _READY_LINE:
+                break
+    _log.info('{} devices in {} processes connected in {:.1f} s.'.format(
+        broker.get_client_count(), len(children), time.monotonic() - connect_start_time))
+
+    start_time = time.monotonic()
+    start_message_count = controller.message_count
+    start_message_bytes = controller.message_bytes
+    command_time = start_time
+    while command_time < start_time + duration:
+        time.sleep(max(0, command_time - time.monotonic()))
+        controller.send_command()
+        command_time += 1.0 / command_rate
+    time.sleep(max(0, start_time + duration - time.monotonic()))
+    run_time = time.monotonic() - start_time
+    message_count = controller.message_count - start_message_count
+    message_bytes = controller.message_bytes - start_message_bytes
+
+    results = []
+    for child in children:
+        output = child.stdout.read().decode('utf-8').strip().splitlines()
+        if (child.wait() != 0) or (len(output) == 0) or not output[-1].startswith('{'):
+            _log.warning('Device process failed, exit code: {}.'.format(child.returncode))
+            continue
+        results.append(json.loads(output[-1]))
+
+    published = sum(result['published'] for result in results)
+    rejected = sum(result['rejected'] for result in results)
+    connected = sum(result['connected'] for result in results)
+    cpu_time = sum(result['cpu_time'] for result in results)
+    devices_rss_kb = sum(result['devices_rss_kb'] for result in results)
+    measured_count = max(1, sum(result['devices'] for result in results))
+
+    _log.info('Devices: {}, connected at the end: {}, telemetry interval: {} s.'.format(
+        devices_count, connected, interval))
+    _log.info('Broker received: {:.0f} messages/s, {:.1f} KB/s.'.format(
+        message_count / run_time, message_bytes / run_time / 1024))
+    _log.info('Devices published: {:.0f} messages/s, rejected: {}.'.format(
+        published / run_time, rejected))
+    _log.info('Commands: {} sent, {} answered, {} lost, {} pending.'.format(
+        controller.sent_count, len(controller.latencies), controller.lost_count,
+        controller.get_pending_count()))
+    _log.info('Command round trip: p50 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms.'.format(
+        1000 * _percentile(controller.latencies, 50), 1000 * _percentile(controller.latencies, 99),
+        1000 * max(controller.latencies, default=0)))
+    _log.info('Per device: CPU {:.3f} %, memory {:.0f} KB, threads {:.1f}.'.format(
+        100 * cpu_time / duration / measured_count, devices_rss_kb / measured_count,
+        sum(result['threads'] for result in results) / measured_count))
+
+    broker.stop()
+    spool_dir.cleanup()
+
+
+#***************************************************************************************************
+# Startup point
+#***************************************************************************************************
+if __name__ == '__main__':
+    args = _parse_command_line_args()
+    if args.child != None:
+        _run_child(args.child, args.count, args.port, args.interval, args.sensor_rate,
+            args.duration, args.seed, args.spool_dir)
+    else:
+        _run(args.devices, args.process_devices, args.interval, args.command_rate, args.sensor_rate,
+            args.duration, args.seed)
+    utils_exit.exit(0)
@@ -0,0 +1,141 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import sys
+import time
+import datetime
+import threading
+import argparse
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.project_config as prj_cfg
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.INFO)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+# Enabled messages are logged in chunks which fit into the writer queue.
+_CHUNK_SIZE = min(1000, prj_cfg.LOG_QUEUE_SIZE)
+
+
+#***************************************************************************************************
+# Private classes
+#***************************************************************************************************
+# Previous Logger: level check against both levels on every call, formatting and printing under a
+# global lock in the calling thread.
+class _SyncLogger:
+    __print_lock = threading.Lock()
+
+    def __init__(self, module_name, log_level):
+        self._module_name = module_name
+        self._log_level = log_level
+
+    def debug(self, value):
+        if self._is_log_enabled(prj_cfg.LogLevel.DEBUG):
+            self._print('DEBUG', value)
+
+    def _print(self, msg_type, value):
+        with _SyncLogger.__print_lock:
+            format_str = '[{date}] <{type}> "{module}": {value}'.format(
+                date=datetime.datetime.utcnow().isoformat(),
+                module=self._module_name,
+                type=msg_type,
+                value=value)
+            print(format_str)
+
+    def _is_log_enabled(self, log_level):
+        return (self._log_level >= log_level) and (prj_cfg.GLOBAL_LOG_LEVEL >= log_level)
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _parse_command_line_args():
+    parser = argparse.ArgumentParser(
+        description='Cost of an accelerometer sample debug message: previous eager formatting '
+            'and synchronous printing, lazy arguments and the background writer.')
+    parser.add_argument(
+            '--calls',
+            default=100000,
+            type=int,
+            help='Log calls per mode.')
+    return parser.parse_args()
+
+
+def _log_eager(log, calls):
+    x_mg, y_mg, z_mg = 12, -3, 1002
+    for _ in range(calls):
+        log.debug(
+            'Acc data updated: x = {x} mg, y = {y} mg, z = {z} mg. Out of threshold: {thr}.'
+            .format(x=x_mg, y=y_mg, z=z_mg, thr=False))
+
+
+def _log_lazy(log, calls):
+    x_mg, y_mg, z_mg = 12, -3, 1002
+    for _ in range(calls):
+        log.debug(
+            'Acc data updated: x = %s mg, y = %s mg, z = %s mg. Out of threshold: %s.',
+            x_mg, y_mg, z_mg, False)
+
+
+# Returns time spent in log calls and total time including writing, seconds.
+def _measure(log_func, log, calls, is_queued):
+    call_time = 0
+    start_time = time.perf_counter()
+    for chunk_start in range(0, calls, _CHUNK_SIZE):
+        chunk_start_time = time.perf_counter()
+        log_func(log, min(_CHUNK_SIZE, calls - chunk_start))
+        call_time += time.perf_counter() - chunk_start_time
+        if is_queued:
+            logger.Logger.flush()
+    return call_time, time.perf_counter() - start_time
+
+
+def _run(calls):
+    modes = (
+        ('disabled', 'sync eager', _SyncLogger('bench', prj_cfg.LogLevel.INFO), _log_eager),
+        ('disabled', 'lazy', logger.Logger('bench_info', prj_cfg.LogLevel.INFO), _log_lazy),
+        ('enabled', 'sync eager', _SyncLogger('bench', prj_cfg.LogLevel.DEBUG), _log_eager),
+        ('enabled', 'queued lazy', logger.Logger('bench_debug', prj_cfg.LogLevel.DEBUG),
+            _log_lazy))
+
+    # Enabled messages go to /dev/null, the console would dominate the results.
+    prev_global_log_level = prj_cfg.GLOBAL_LOG_LEVEL
+    logger.Logger.set_global_log_level(prj_cfg.LogLevel.DEBUG)
+    stdout = sys.stdout
+    results = []
+    with open(os.devnull, 'w') as null_file:
+        sys.stdout = null_file
+        try:
+            for level, mode, log, log_func in modes:
+                call_time, total_time = _measure(
+                    log_func, log, calls, isinstance(log, logger.Logger))
+                results.append((level, mode, call_time, total_time))
+        finally:
+            sys.stdout = stdout
+    logger.Logger.set_global_log_level(prev_global_log_level)
+
+    _log.info('{} calls per mode.'.format(calls))
+    _log.info('{:>10} {:>12} {:>14} {:>14}'.format('level', 'mode', 'ns/call', 'total ns/call'))
+    for level, mode, call_time, total_time in results:
+        _log.info('{:>10} {:>12} {:>14.0f} {:>14.0f}'.format(
+            level, mode, 1e9 * call_time / calls, 1e9 * total_time / calls))
+
+
+#***************************************************************************************************
+# Startup point
+#***************************************************************************************************
+if __name__ == '__main__':
+    args = _parse_command_line_args()
+    _run(args.calls)
+    utils_exit.exit(0)
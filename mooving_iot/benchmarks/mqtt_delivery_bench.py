@@ -0,0 +1,129 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import time
+import argparse
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.libraries.cloud.cloud as lib_cloud
+import mooving_iot.libraries.cloud.cloud_protocol as lib_cloud_protocol
+import mooving_iot.libraries.cloud.google_cloud_iot.google_cloud_iot as lib_google_cloud_iot
+import mooving_iot.tools.mqtt_broker_stub as mqtt_broker_stub
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.INFO)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+# Wait before the next try when the in-flight window is full, seconds.
+_RETRY_PERIOD = 0.001
+_CONNECT_TIMEOUT = 10
+_DELIVERY_TIMEOUT = 30
+
+
+#***************************************************************************************************
+# Private classes
+#***************************************************************************************************
+# Google Cloud IoT client against the local broker: no TLS and no JWT signing.
+class _LocalCloudIot(lib_google_cloud_iot.GoogleCloudIot):
+    def __init__(self, cloud_conn_params, qos, max_inflight):
+        super().__init__(cloud_conn_params, qos=qos, max_inflight=max_inflight, use_tls=False)
+
+    def _create_jwt(self):
+        return 'unused'
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _parse_command_line_args():
+    parser = argparse.ArgumentParser(
+        description='Telemetry delivery with qos 0 and qos 1 against a local MQTT broker stub, '
+            'the connection is dropped in the middle of the run.')
+    parser.add_argument(
+            '--count',
+            default=2000,
+            type=int,
+            help='Number of telemetry packets to send.')
+    parser.add_argument(
+            '--max_inflight',
+            default=prj_cfg.TELEMETRY_MAX_INFLIGHT,
+            type=int,
+            help='Maximum packets waiting for PUBACK.')
+    parser.add_argument(
+            '--ack_delay',
+            default=0.005,
+            type=float,
+            help='Broker PUBACK delay, seconds.')
+    return parser.parse_args()
+
+
+def _get_payload(index):
+    return lib_cloud_protocol.TelemetryPacket(
+        device_id='bench', interval=60, ext_batt=36.412, int_batt=3.921, ext_batt_charging=False,
+        longtitude='13.404951', latitude='52.52001', altitude='34.0', heading=str(index),
+        alarm=False, state='lock').to_map()
+
+
+def _wait_for(condition, timeout) -> bool:
+    end_time = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end_time:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _run(qos, count, max_inflight, ack_delay):
+    broker = mqtt_broker_stub.MqttBrokerStub(ack_delay=ack_delay)
+    port = broker.start()
+
+    conn_params = lib_cloud.CloudConnectionParameters(
+        project_id='bench', cloud_region='local', registry_id='bench', device_id='bench',
+        private_key_filepath=None, private_key_algorithm=None,
+        mqtt_url='127.0.0.1', mqtt_port=port)
+    client = _LocalCloudIot(conn_params, qos, max_inflight)
+    client.create_connection()
+    _wait_for(client.is_connected, _CONNECT_TIMEOUT)
+
+    start_time = time.perf_counter()
+    for index in range(count):
+        if index == count // 2:
+            # Acks of the current window are lost together with the connection.
+            broker.set_acks_enabled(False)
+            time.sleep(ack_delay + 0.05)
+            broker.disconnect_clients()
+            broker.set_acks_enabled(True)
+        while client.send_event(_get_payload(index)) != 0:
+            time.sleep(_RETRY_PERIOD)
+    _wait_for(lambda: client.get_delivery_stats().inflight == 0, _DELIVERY_TIMEOUT)
+    run_time = time.perf_counter() - start_time
+
+    stats = client.get_delivery_stats()
+    messages = broker.get_messages()
+    unique_count = len(set(payload for _, payload, _ in messages))
+    _log.info('qos {}: {:.0f} packets/s, broker received {} unique of {}, {} duplicates.'.format(
+        qos, count / run_time, unique_count, count, broker.get_duplicate_count()))
+    _log.info('  {}'.format(stats))
+    broker.stop()
+
+
+#***************************************************************************************************
+# Startup point
+#***************************************************************************************************
+if __name__ == '__main__':
+    args = _parse_command_line_args()
+    _run(0, args.count, args.max_inflight, args.ack_delay)
+    _run(1, args.count, args.max_inflight, args.ack_delay)
+    utils_exit.exit(0)
@@ -0,0 +1,245 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import time
+import random
+import datetime
+import argparse
+from typing import Union
+
+# pynmea2 is only needed for the previous Teseo driver path, it is not a device requirement
+# (pip install pynmea2==1.15.0)
+try:
+    import pynmea2
+except ImportError:
+    pynmea2 = None
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.drivers.GNSS.nmea.nmea as nmea
+import mooving_iot.drivers.GNSS.nmea.nmea_stream as nmea_stream
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.INFO)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+_START_LATITUDE = 47.3769
+_START_LONGITUDE = 8.5417
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _parse_command_line_args():
+    parser = argparse.ArgumentParser(
+        description='NMEA parsing throughput: previous Teseo driver path (readline, pynmea2), '
+            'line parser of the NMEA GNSS drivers and the streaming parser.')
+    parser.add_argument(
+            '--log',
+            default=None,
+            help='Recorded raw NMEA log, a generated Teseo-like log is used without it.')
+    parser.add_argument(
+            '--epochs',
+            default=20000,
+            type=int,
+            help='Fixes of the generated log.')
+    parser.add_argument(
+            '--chunk',
+            default=256,
+            type=int,
+            help='Bytes per serial read of the streaming parser.')
+    parser.add_argument(
+            '--seed',
+            default=0,
+            type=int,
+            help='Random generator seed.')
+    return parser.parse_args()
+
+
+# DDM ('4807.038', 'N') to the DD string format, string splitting of the previous drivers.
+def _ddm_to_dd(value : str, direction : str) -> str:
+    value_p = value.split('.')
+    dd = round(float(value_p[0][:-2]) + (float(value_p[0][-2:] + '.' + value_p[1]) / 60), 6)
+    if direction in ('S', 'W'):
+        dd = (-1) * dd
+    return str(dd)
+
+
+def _split_sentence(line : str) -> Union[list, None]:
+    line = line.strip()
+    if (len(line) < 4) or (line[0] != '$'):
+        return None
+
+    star_pos = line.rfind('*')
+    if star_pos == -1:
+        return None
+
+    body = line[1:star_pos]
+    try:
+        if int(line[star_pos + 1:star_pos + 3], 16) != nmea.checksum(body):
+            return None
+    except ValueError:
+        return None
+
+    return body.split(',')
+
+
+# Returns latitude, longitude, altitude, coord and valid flag.
+def _parse_gga(fields : list) -> tuple:
+    lat_p = fields[2].split('.')
+    lon_p = fields[4].split('.')
+    coord = (lat_p[0][:-2] + ' ' + lat_p[0][-2:] + '.' + lat_p[1]
+        + ', ' + lon_p[0][:-2] + ' ' + lon_p[0][-2:] + '.' + lon_p[1])
+
+    return (_ddm_to_dd(fields[2], fields[3]),
+        _ddm_to_dd(fields[4], fields[5]),
+        str(float(fields[9])) if fields[9] else 'None',
+        coord,
+        (fields[6] != '') and (int(fields[6]) != 0))
+
+
+# Returns heading and speed, km/h.
+def _parse_vtg(fields : list) -> tuple:
+    return (str(float(fields[1])) if fields[1] else 'None',
+        str(float(fields[7])) if fields[7] else 'None')
+
+
+# Every epoch has the sentences of a Teseo LIV3F with the default message list: GGA, VTG, RMC,
+# GSA, GSV and a proprietary message. About 1 % of the sentences are corrupted.
+def _generate_log(epochs, seed) -> bytes:
+    rng = random.Random(seed)
+    lines = []
+    for epoch in range(epochs):
+        fix_time = datetime.datetime(2000, 1, 1) + datetime.timedelta(seconds=epoch)
+        time_str = fix_time.strftime('%H%M%S.000')
+        latitude, latitude_dir = nmea.dd_to_ddm(
+            _START_LATITUDE + rng.gauss(0, 0.0005), True)
+        longitude, longitude_dir = nmea.dd_to_ddm(
+            _START_LONGITUDE + rng.gauss(0, 0.0005), False)
+        heading = rng.uniform(0, 360)
+        knots = rng.uniform(0, 10)
+
+        bodies = [
+            'GPGGA,{},{},{},{},{},1,08,0.9,{:.1f},M,47.0,M,,'.format(
+                time_str, latitude, latitude_dir, longitude, longitude_dir,
+                rng.uniform(400, 420)),
+            'GPVTG,{:.1f},T,,M,{:.1f},N,{:.1f},K,A'.format(heading, knots, knots * 1.852),
+            'GPRMC,{},A,{},{},{},{},{:.1f},{:.1f},010100,,,A'.format(
+                time_str, latitude, latitude_dir, longitude, longitude_dir, knots, heading),
+            'GPGSA,A,3,05,07,13,15,18,21,24,30,,,,,1.6,0.9,1.3',
+            'GPGSV,2,1,08,05,41,305,38,07,21,047,33,13,65,131,42,15,24,217,36',
+            'GPGSV,2,2,08,18,33,072,40,21,09,318,29,24,48,162,41,30,57,261,44',
+            'PSTMCPU,21.45,-1,49']
+        for body in bodies:
+            sentence = nmea.build_sentence(body)
+            if rng.random() < 0.01:
+                sentence = sentence.replace(',', ';', 1)
+            lines.append(sentence + '\r\n')
+    return ''.join(lines).encode('utf-8')
+
+
+# Previous Teseo driver: a readline() per sentence, UTF-8 decoding, pynmea2 parsing of every
+# sentence and DDM string splitting. Returns the number of GGA fixes and the last latitude.
+def _parse_pynmea2(data : bytes):
+    fix_count = 0
+    latitude = None
+    for line in data.splitlines(keepends=True):
+        try:
+            if (line[:1].decode('utf-8') == '$') and (line.decode('utf-8').find('PSTM') == -1):
+                msg = pynmea2.parse(line[:-2].decode('utf-8'))
+                if msg.sentence_type == 'GGA':
+                    latitude = _ddm_to_dd(msg.lat, msg.lat_dir)
+                    _ddm_to_dd(msg.lon, msg.lon_dir)
+                    fix_count += 1
+                elif msg.sentence_type == 'VTG':
+                    str(msg.true_track)
+                    str(msg.spd_over_grnd_kmph)
+        except Exception:
+            pass
+    return fix_count, latitude
+
+
+# Line parser used by the NMEA GNSS drivers before the streaming parser: a decoded string and a
+# field list per sentence.
+def _parse_lines(data : bytes):
+    fix_count = 0
+    latitude = None
+    for line in data.splitlines(keepends=True):
+        try:
+            fields = _split_sentence(line.decode('utf-8'))
+            if fields == None:
+                continue
+            if fields[0][2:] == 'GGA':
+                latitude = _parse_gga(fields)[0]
+                fix_count += 1
+            elif fields[0][2:] == 'VTG':
+                _parse_vtg(fields)
+        except (UnicodeDecodeError, ValueError, IndexError):
+            pass
+    return fix_count, latitude
+
+
+def _parse_stream(data : bytes, chunk_size):
+    parser = nmea_stream.NmeaStreamParser()
+    fix_count = 0
+    latitude = None
+    for chunk_start in range(0, len(data), chunk_size):
+        for fix in parser.feed(data[chunk_start:chunk_start + chunk_size], time.time()):
+            if fix.sentence_type == 'GGA':
+                latitude = fix.latitude
+                fix_count += 1
+    return fix_count, latitude
+
+
+def _run(log_path, epochs, chunk_size, seed):
+    if log_path != None:
+        with open(log_path, 'rb') as log_file:
+            data = log_file.read()
+    else:
+        data = _generate_log(epochs, seed)
+    sentence_count = data.count(b'\n')
+
+    # Parse errors of the corrupted sentences should not flood the console.
+    logger.Logger.set_global_log_level(prj_cfg.LogLevel.INFO)
+
+    modes = []
+    if pynmea2 != None:
+        modes.append(('pynmea2', lambda: _parse_pynmea2(data)))
+    else:
+        _log.warning('pynmea2 is not installed, previous driver path is skipped.')
+    modes.append(('line parser', lambda: _parse_lines(data)))
+    modes.append(('stream parser', lambda: _parse_stream(data, chunk_size)))
+
+    _log.info('{} sentences, {} bytes, stream chunk {} bytes.'.format(
+        sentence_count, len(data), chunk_size))
+    _log.info('{:>14} {:>10} {:>14} {:>12} {:>10} {:>12}'.format(
+        'mode', 'time, s', 'sentences/s', 'KB/s', 'fixes', 'last lat'))
+    for name, parse_func in modes:
+        start_time = time.perf_counter()
+        fix_count, latitude = parse_func()
+        elapsed_time = time.perf_counter() - start_time
+        _log.info('{:>14} {:>10.3f} {:>14.0f} {:>12.0f} {:>10} {:>12}'.format(
+            name, elapsed_time, sentence_count / elapsed_time, len(data) / 1024 / elapsed_time,
+            fix_count, latitude))
+    # Serial port at 9600 baud, 8N1.
+    _log.info('9600 baud UART: {:.0f} KB/s.'.format(9600 / 10 / 1024))
+
+
+#***************************************************************************************************
+# Startup point
+#***************************************************************************************************
+if __name__ == '__main__':
+    args = _parse_command_line_args()
+    _run(args.log, args.epochs, args.chunk, args.seed)
+    utils_exit.exit(0)
@@ -0,0 +1,152 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import time
+import random
+import datetime
+import argparse
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.libraries.cloud.cloud_protocol as lib_cloud_protocol
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.INFO)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+_ENCODERS = ('json', 'json-native', 'cbor', 'msgpack', 'struct')
+_DEVICE_ID = 'mooving-device-0001'
+# MQTT PUBLISH fixed header and topic length with qos=0, TLS records overhead is not counted.
+_MQTT_PUBLISH_OVERHEAD = 4 + len('/devices/{}/events'.format(_DEVICE_ID))
+
+
+#***************************************************************************************************
+# Private classes
+#***************************************************************************************************
+# Previous GoogleCloudIot.send_event() serialization.
+class _PrettyJsonEncoder(lib_cloud_protocol.JsonEncoder):
+    def __init__(self):
+        super().__init__(indent=4)
+
+    def get_name(self) -> str:
+        return 'json-indent'
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _parse_command_line_args():
+    parser = argparse.ArgumentParser(
+        description='Telemetry payload size and encoding throughput for every encoder.')
+    parser.add_argument(
+            '--packets',
+            default=10000,
+            type=int,
+            help='Number of telemetry packets to encode.')
+    parser.add_argument(
+            '--batch',
+            default=10,
+            type=int,
+            help='Packets in one message in batching mode.')
+    parser.add_argument(
+            '--packets_per_hour',
+            default=360,
+            type=int,
+            help='Telemetry rate used for bytes and publishes per hour.')
+    parser.add_argument(
+            '--seed',
+            default=0,
+            type=int,
+            help='Random generator seed.')
+    return parser.parse_args()
+
+
+def _generate_payloads(count, seed):
+    rng = random.Random(seed)
+    events = [
+        lambda: lib_cloud_protocol.EmptyEvent(),
+        lambda: lib_cloud_protocol.StateEvent(rng.choice(('lock', 'unlock', 'unavailable'))),
+        lambda: lib_cloud_protocol.ChargingEvent(rng.random() < 0.5),
+        lambda: lib_cloud_protocol.AccMovementEvent(rng.random() < 0.5),
+        lambda: lib_cloud_protocol.AccFallEvent(rng.random() < 0.5),
+        lambda: lib_cloud_protocol.ExtBattEvent(rng.uniform(30, 42)),
+        lambda: lib_cloud_protocol.IntBattEvent(rng.uniform(3.3, 4.2))]
+    start_time = datetime.datetime(2020, 1, 1)
+
+    payloads = []
+    for index in range(count):
+        packet = lib_cloud_protocol.TelemetryPacket(
+            device_id=_DEVICE_ID,
+            interval=rng.choice((10, 60, 300)),
+            ext_batt=rng.uniform(30, 42),
+            int_batt=rng.uniform(3.3, 4.2),
+            ext_batt_charging=rng.random() < 0.2,
+            longtitude='{:.6f}'.format(13.4 + rng.uniform(-0.1, 0.1)),
+            latitude='{:.6f}'.format(52.5 + rng.uniform(-0.1, 0.1)),
+            altitude='{:.1f}'.format(rng.uniform(20, 60)),
+            heading='{:.1f}'.format(rng.uniform(0, 360)),
+            alarm=rng.random() < 0.05,
+            state=rng.choice(('lock', 'unlock', 'unavailable')),
+            event=rng.choice(events[:1] * 6 + events)())
+        packet._timestamp_utc = (start_time + datetime.timedelta(seconds=10 * index)).isoformat()
+        payloads.append(packet.to_map())
+    return payloads
+
+
+def _run(packets_count, batch_size, packets_per_hour, seed):
+    payloads = _generate_payloads(packets_count, seed)
+    batches = [payloads[index:index + batch_size]
+        for index in range(0, len(payloads), batch_size)]
+
+    encoders = [_PrettyJsonEncoder()]
+    for name in _ENCODERS:
+        try:
+            encoders.append(lib_cloud_protocol.get_encoder(name))
+        except RuntimeError as error:
+            _log.info('{} skipped: {}'.format(name, error))
+
+    _log.info('{} packets, batch: {}, {} packets/hour, MQTT overhead: {} bytes/publish.'.format(
+        len(payloads), batch_size, packets_per_hour, _MQTT_PUBLISH_OVERHEAD))
+    _log.info('{:>12} {:>10} {:>14} {:>12} {:>12} {:>14} {:>14}'.format(
+        'encoder', 'B/packet', 'B/packet batch', 'packets/s', 'batch pk/s',
+        'KB/hour', 'KB/hour batch'))
+
+    for encoder in encoders:
+        start_time = time.perf_counter()
+        single_size = sum(len(encoder.encode(payload)) for payload in payloads)
+        single_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        batch_size_total = sum(len(encoder.encode_batch(batch)) for batch in batches)
+        batch_time = time.perf_counter() - start_time
+
+        single_per_packet = single_size / len(payloads)
+        batch_per_packet = batch_size_total / len(payloads)
+        _log.info('{:>12} {:>10.1f} {:>14.1f} {:>12.0f} {:>12.0f} {:>14.1f} {:>14.1f}'.format(
+            encoder.get_name(), single_per_packet, batch_per_packet,
+            len(payloads) / single_time, len(payloads) / batch_time,
+            packets_per_hour * (single_per_packet + _MQTT_PUBLISH_OVERHEAD) / 1024,
+            packets_per_hour * (batch_per_packet + _MQTT_PUBLISH_OVERHEAD / batch_size) / 1024))
+
+    _log.info('Publishes per hour: {} single, {:.0f} batched.'.format(
+        packets_per_hour, packets_per_hour / batch_size))
+
+
+#***************************************************************************************************
+# Startup point
+#***************************************************************************************************
+if __name__ == '__main__':
+    args = _parse_command_line_args()
+    _run(args.packets, args.batch, args.packets_per_hour, args.seed)
+    utils_exit.exit(0)
@@ -0,0 +1,135 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import time
+import threading
+import argparse
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.libraries.sampling_profiler.sampling_profiler as lib_sampling_profiler
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.INFO)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+# Sample intervals of the profiled runs, seconds. The shortest one is limited by the duty.
+_INTERVALS = (0.1, 0.01, 0.001)
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _parse_command_line_args():
+    parser = argparse.ArgumentParser(
+        description='SamplingProfiler overhead: throughput of busy threads without the profiler '
+            'and with it at several sample intervals.')
+    parser.add_argument(
+            '--duration',
+            default=3.0,
+            type=float,
+            help='Duration of every run, seconds.')
+    parser.add_argument(
+            '--busy_threads',
+            default=2,
+            type=int,
+            help='Threads which load the CPU.')
+    parser.add_argument(
+            '--idle_threads',
+            default=16,
+            type=int,
+            help='Threads which wait for an event, like the device driver threads.')
+    parser.add_argument(
+            '--max_duty',
+            default=prj_cfg.PROFILER_MAX_DUTY,
+            type=float,
+            help='Maximum part of the CPU time taken by the sampler.')
+    return parser.parse_args()
+
+
+def _busy_leaf(value):
+    for _ in range(100):
+        value = (value * 31 + 7) & 0xFFFF
+    return value
+
+
+def _busy_work(counts, index, stop_event):
+    value = 1
+    while not stop_event.is_set():
+        value = _busy_leaf(value)
+        counts[index] += 1
+
+
+# Returns busy loop iterations per second and the profile result, None without the profiler.
+def _measure(duration, busy_threads, idle_threads, interval, max_duty):
+    stop_event = threading.Event()
+    counts = [0] * busy_threads
+    threads = [threading.Thread(target=stop_event.wait, name='idle_{}'.format(index))
+        for index in range(idle_threads)]
+    threads += [threading.Thread(
+        target=_busy_work, args=(counts, index, stop_event), name='busy_{}'.format(index))
+        for index in range(busy_threads)]
+    for thread in threads:
+        thread.start()
+
+    results = []
+    done_event = threading.Event()
+    if interval != None:
+        profiler = lib_sampling_profiler.SamplingProfiler(
+            interval, max_duty, prj_cfg.PROFILER_MAX_DEPTH)
+        profiler.start(duration, lambda result: (results.append(result), done_event.set()))
+
+    time.sleep(duration)
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+    if interval != None:
+        done_event.wait()
+
+    return sum(counts) / duration, results[0] if len(results) > 0 else None
+
+
+def _run(duration, busy_threads, idle_threads, max_duty):
+    # Warm up run, the first run is slower on some machines.
+    _measure(duration / 4, busy_threads, idle_threads, None, max_duty)
+    base_rate, _ = _measure(duration, busy_threads, idle_threads, None, max_duty)
+    _log.info('{} busy and {} idle threads, {} s per run, max duty {}.'.format(
+        busy_threads, idle_threads, duration, max_duty))
+    _log.info('{:>10} {:>10} {:>12} {:>12} {:>12}'.format(
+        'interval', 'samples', 'samples/s', 'overhead %', 'slowdown %'))
+    _log.info('{:>10} {:>10} {:>12} {:>12} {:>12}'.format('off', '-', '-', '-', '0.0'))
+
+    last_result = None
+    for interval in _INTERVALS:
+        rate, result = _measure(duration, busy_threads, idle_threads, interval, max_duty)
+        _log.info('{:>10} {:>10} {:>12.0f} {:>12.2f} {:>12.1f}'.format(
+            interval,
+            result.get_sample_count(),
+            result.get_sample_count() / result.get_duration(),
+            result.get_overhead() * 100,
+            (1 - rate / base_rate) * 100))
+        last_result = result
+
+    _log.info('Top stacks of the last run:')
+    for stack in last_result.get_collapsed_stacks(5):
+        _log.info('  {}'.format(stack))
+
+
+#***************************************************************************************************
+# Startup point
+#***************************************************************************************************
+if __name__ == '__main__':
+    args = _parse_command_line_args()
+    _run(args.duration, args.busy_threads, args.idle_threads, args.max_duty)
+    utils_exit.exit(0)
@@ -0,0 +1,194 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+import collections
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.libraries.cloud.cloud as lib_cloud
+import mooving_iot.libraries.cloud.connection_manager as lib_connection_manager
+import mooving_iot.libraries.cloud.google_cloud_iot.google_cloud_iot as lib_google_cloud_iot
+import mooving_iot.tools.mqtt_broker_stub as mqtt_broker_stub
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.INFO)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+_MODES = ('no-jitter', 'jitter')
+_CONNECT_TIMEOUT = 60
+# Connect requests are counted in buckets of this length to find the peak rate, seconds.
+_RATE_BUCKET = 0.1
+
+
+#***************************************************************************************************
+# Private classes
+#***************************************************************************************************
+# Google Cloud IoT client against the local broker: no TLS and no JWT signing.
+class _LocalCloudIot(lib_google_cloud_iot.GoogleCloudIot):
+    def __init__(self, cloud_conn_params, reconnect_backoff):
+        super().__init__(cloud_conn_params, use_tls=False, reconnect_backoff=reconnect_backoff)
+
+    def _create_jwt(self):
+        return 'unused'
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _parse_command_line_args():
+    parser = argparse.ArgumentParser(
+        description='Fleet reconnect storm: virtual devices are connected to a local MQTT broker '
+            'stub which is restarted, reconnects are measured with and without backoff jitter.')
+    parser.add_argument(
+            '--devices',
+            default=200,
+            type=int,
+            help='Number of virtual devices. The MQTT client uses select(), which limits a process '
+                'to about 300 devices.')
+    parser.add_argument(
+            '--outage',
+            default=3.0,
+            type=float,
+            help='Broker restart time, seconds.')
+    parser.add_argument(
+            '--min_delay',
+            default=1.0,
+            type=float,
+            help='First reconnect delay, seconds.')
+    parser.add_argument(
+            '--max_delay',
+            default=30.0,
+            type=float,
+            help='Maximum reconnect delay, seconds.')
+    parser.add_argument(
+            '--seed',
+            default=0,
+            type=int,
+            help='Random generator seed.')
+    parser.add_argument(
+            '--child',
+            choices=_MODES,
+            default=None,
+            help='Internal: run the fleet with the given backoff and print measurements.')
+    return parser.parse_args()
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def _wait_for(condition, timeout) -> bool:
+    end_time = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end_time:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def _all_connected(clients) -> bool:
+    return all(client.is_connected() for client in clients)
+
+
+def _run_child(mode, devices_count, outage, min_delay, max_delay, seed):
+    jitter = mode == 'jitter'
+
+    broker = mqtt_broker_stub.MqttBrokerStub()
+    port = broker.start()
+
+    # Client logs are suppressed, hundreds of devices log every connection attempt.
+    logger.Logger.set_global_log_level(prj_cfg.LogLevel.WARNING)
+
+    clients = []
+    for index in range(devices_count):
+        conn_params = lib_cloud.CloudConnectionParameters(
+            project_id='bench', cloud_region='local', registry_id='bench',
+            device_id='device-{}'.format(index), private_key_filepath=None,
+            private_key_algorithm=None, mqtt_url='127.0.0.1', mqtt_port=port)
+        backoff = lib_connection_manager.ReconnectBackoff(
+            min_delay, max_delay, jitter, random.Random(seed + index))
+        client = _LocalCloudIot(conn_params, backoff)
+        client.create_connection()
+        clients.append(client)
+    _wait_for(lambda: _all_connected(clients), _CONNECT_TIMEOUT)
+
+    broker.stop()
+    _wait_for(lambda: not any(client.is_connected() for client in clients), _CONNECT_TIMEOUT)
+    time.sleep(outage)
+    restart_time = time.monotonic()
+    connects_before = len(broker.get_connect_times())
+    broker.start()
+    is_recovered = _wait_for(lambda: _all_connected(clients), _CONNECT_TIMEOUT)
+    recovery_time = time.monotonic() - restart_time
+
+    connect_times = broker.get_connect_times()[connects_before:]
+    buckets = collections.Counter(
+        int((connect_time - restart_time) / _RATE_BUCKET) for connect_time in connect_times)
+    connection_stats = [client.get_connection_stats() for client in clients]
+    downtimes = [stats.last_downtime for stats in connection_stats]
+    failed_attempts = sum(stats.failed_attempts for stats in connection_stats)
+
+    # Queued log messages are written before the result, the parent reads the last line.
+    logger.Logger.flush()
+    print(json.dumps({
+        'recovered': is_recovered,
+        'recovery_time': recovery_time,
+        'connects': len(connect_times),
+        'peak_rate': max(buckets.values(), default=0) / _RATE_BUCKET,
+        'failed_attempts': failed_attempts,
+        'downtime_p50': _percentile(downtimes, 50),
+        'downtime_p99': _percentile(downtimes, 99),
+        'downtime_max': max(downtimes)}), flush=True)
+
+
+# Every backoff mode runs in a fresh process, closed clients keep their sockets until exit.
+def _run(devices_count, outage, min_delay, max_delay, seed):
+    _log.info('{} devices, broker outage {} s, reconnect delay {}..{} s.'.format(
+        devices_count, outage, min_delay, max_delay))
+    _log.info('{:>9} {:>10} {:>12} {:>10} {:>12} {:>10} {:>10} {:>10}'.format(
+        'backoff', 'recovery,s', 'connects', 'peak, 1/s', 'failed', 'down p50,s', 'down p99,s',
+        'down max,s'))
+    for mode in _MODES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'mooving_iot.benchmarks.reconnect_storm_bench',
+                '--child', mode, '--devices', str(devices_count), '--outage', str(outage),
+                '--min_delay', str(min_delay), '--max_delay', str(max_delay),
+                '--seed', str(seed)],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+        result = json.loads(output.stdout.decode('utf-8').strip().splitlines()[-1])
+        recovery_time = '{:.2f}'.format(result['recovery_time']) if result['recovered'] else '-'
+        _log.info('{:>9} {:>10} {:>12} {:>10.0f} {:>12} {:>10.2f} {:>10.2f} {:>10.2f}'.format(
+            mode, recovery_time, result['connects'], result['peak_rate'],
+            result['failed_attempts'], result['downtime_p50'], result['downtime_p99'],
+            result['downtime_max']))
+
+
+#***************************************************************************************************
+# Startup point
+#***************************************************************************************************
+if __name__ == '__main__':
+    args = _parse_command_line_args()
+    if args.child != None:
+        _run_child(args.child, args.devices, args.outage, args.min_delay, args.max_delay,
+            args.seed)
+    else:
+        _run(args.devices, args.outage, args.min_delay, args.max_delay, args.seed)
+    utils_exit.exit(0)
@@ -0,0 +1,186 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import sys
+import time
+import json
+import threading
+import subprocess
+import argparse
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.libraries.cloud.cloud as lib_cloud
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.INFO)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+_RUNTIMES = ('thread', 'asyncio')
+_WARMUP_TIME = 2.0
+_APP_ARGS = [
+    '--project_id', 'bench', '--registry_id', 'bench', '--device_id', 'bench',
+    '--cloud_region', 'bench']
+
+
+#***************************************************************************************************
+# Private classes
+#***************************************************************************************************
+# Cloud implementation without connection, events are only counted.
+class _NullCloud(lib_cloud.CloudImplementationBase):
+    def __init__(self, cloud_conn_params):
+        super().__init__(cloud_conn_params)
+        self.events_count = 0
+        self._never_set = threading.Event()
+
+    def create_connection(self) -> int:
+        return 0
+
+    def close_connection(self) -> int:
+        return 0
+
+    def wait_for_command(self) -> str:
+        self._never_set.wait()
+
+    def wait_for_configuration(self) -> str:
+        self._never_set.wait()
+
+    def set_command_listener(self, callback):
+        pass
+
+    def set_configuration_listener(self, callback):
+        pass
+
+    def is_connected(self) -> bool:
+        return True
+
+    def set_connection_listener(self, callback):
+        pass
+
+    def send_event(self, payload) -> int:
+        self.events_count += 1
+        return 0
+
+    def send_events(self, payloads : list) -> int:
+        self.events_count += len(payloads)
+        return 0
+
+    def get_connection_stats(self) -> lib_cloud.ConnectionStats:
+        return lib_cloud.ConnectionStats()
+
+    def get_delivery_stats(self) -> lib_cloud.DeliveryStats:
+        return lib_cloud.DeliveryStats(published=self.events_count, delivered=self.events_count)
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _parse_command_line_args():
+    parser = argparse.ArgumentParser(
+        description='Threads, memory and wakeups of the threaded and asyncio application runtimes '
+            'with simulated hardware.')
+    parser.add_argument(
+            '--duration',
+            default=20.0,
+            type=float,
+            help='Measurement time for each runtime, seconds.')
+    parser.add_argument(
+            '--child',
+            choices=_RUNTIMES,
+            default=None,
+            help='Internal: run the application with the given runtime and print measurements.')
+    return parser.parse_args()
+
+
+def _read_status(path):
+    status = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                status[key] = value.split()[0] if value.strip() else ''
+    except (FileNotFoundError, ProcessLookupError):
+        pass
+    return status
+
+
+# Voluntary context switches are thread wakeups after a blocking wait, involuntary ones are
+# preemptions. Summed over all threads of the process.
+def _get_context_switches():
+    voluntary = 0
+    involuntary = 0
+    for task in os.listdir('/proc/self/task'):
+        status = _read_status('/proc/self/task/{}/status'.format(task))
+        voluntary += int(status.get('voluntary_ctxt_switches', 0))
+        involuntary += int(status.get('nonvoluntary_ctxt_switches', 0))
+    return voluntary, involuntary
+
+
+def _run_child(runtime, duration):
+    import mooving_iot.application as app
+
+    sys.argv = [sys.argv[0]] + _APP_ARGS + ['--runtime', runtime]
+    app.init(_NullCloud)
+    threading.Thread(target=app.start, daemon=True).start()
+
+    time.sleep(_WARMUP_TIME)
+    start_voluntary, start_involuntary = _get_context_switches()
+    start_cpu_time = time.process_time()
+    time.sleep(duration)
+    end_voluntary, end_involuntary = _get_context_switches()
+    end_cpu_time = time.process_time()
+
+    status = _read_status('/proc/self/status')
+    # Queued log messages are written before the result, the parent reads the last line.
+    logger.Logger.flush()
+    print(json.dumps({
+        'threads': len(os.listdir('/proc/self/task')),
+        'rss_kb': int(status.get('VmRSS', 0)),
+        'hwm_kb': int(status.get('VmHWM', 0)),
+        'vm_kb': int(status.get('VmSize', 0)),
+        'wakeups': (end_voluntary - start_voluntary) / duration,
+        'preemptions': (end_involuntary - start_involuntary) / duration,
+        'cpu': 100 * (end_cpu_time - start_cpu_time) / duration}), flush=True)
+    utils_exit.exit(0)
+
+
+# Every runtime is measured in a fresh process with simulated hardware.
+def _run(duration):
+    env = dict(os.environ, MOOVING_IOT_HW_BACKEND='sim')
+    results = {}
+    for runtime in _RUNTIMES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'mooving_iot.benchmarks.runtime_bench',
+                '--child', runtime, '--duration', str(duration)],
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+        results[runtime] = json.loads(output.stdout.decode('utf-8').strip().splitlines()[-1])
+
+    _log.info('{:>8} {:>8} {:>10} {:>10} {:>10} {:>10} {:>12} {:>8}'.format(
+        'runtime', 'threads', 'RSS, KB', 'HWM, KB', 'VM, KB', 'wakeups/s', 'preempts/s', 'CPU, %'))
+    for runtime, result in results.items():
+        _log.info('{:>8} {:>8} {:>10} {:>10} {:>10} {:>10.1f} {:>12.1f} {:>8.2f}'.format(
+            runtime, result['threads'], result['rss_kb'], result['hwm_kb'], result['vm_kb'],
+            result['wakeups'], result['preemptions'], result['cpu']))
+
+
+#***************************************************************************************************
+# Startup point
+#***************************************************************************************************
+if __name__ == '__main__':
+    args = _parse_command_line_args()
+    if args.child != None:
+        _run_child(args.child, args.duration)
+    else:
+        _run(args.duration)
+    utils_exit.exit(0)
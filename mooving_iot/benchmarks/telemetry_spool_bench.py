@@ -0,0 +1,126 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import time
+import shutil
+import tempfile
+import argparse
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.libraries.cloud.cloud_protocol as lib_cloud_protocol
+import mooving_iot.libraries.telemetry_spool.telemetry_spool as lib_telemetry_spool
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.INFO)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+_DRAIN_BATCH = 10
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _parse_command_line_args():
+    parser = argparse.ArgumentParser(
+        description='Sustained telemetry spool enqueue and drain rate. Run it with --path on the '
+            'storage used by the device (SD card).')
+    parser.add_argument(
+            '--path',
+            default=os.path.dirname(os.path.abspath(prj_cfg.TELEMETRY_SPOOL_PATH)),
+            help='Directory where a temporary spool is created.')
+    parser.add_argument(
+            '--count',
+            default=20000,
+            type=int,
+            help='Number of packets without fsync.')
+    parser.add_argument(
+            '--fsync_count',
+            default=500,
+            type=int,
+            help='Number of packets with fsync of every packet.')
+    parser.add_argument(
+            '--max_size',
+            default=prj_cfg.TELEMETRY_SPOOL_MAX_SIZE,
+            type=int,
+            help='Spool size limit, bytes.')
+    parser.add_argument(
+            '--segment_size',
+            default=prj_cfg.TELEMETRY_SPOOL_SEGMENT_SIZE,
+            type=int,
+            help='Spool segment size, bytes.')
+    return parser.parse_args()
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def _get_payload():
+    return lib_cloud_protocol.TelemetryPacket(
+        device_id='bench', interval=60, ext_batt=36.412, int_batt=3.921, ext_batt_charging=False,
+        longtitude='13.404951', latitude='52.52001', altitude='34.0', heading='45.0',
+        alarm=False, state='lock', event=lib_cloud_protocol.AccMovementEvent(True)).to_map()
+
+
+def _run(path, count, fsync, max_size, segment_size):
+    spool_path = tempfile.mkdtemp(prefix='telemetry_spool_bench_', dir=path)
+    try:
+        spool = lib_telemetry_spool.TelemetrySpool(spool_path, max_size, segment_size,
+            lib_telemetry_spool.SPOOL_EVICTION.DROP_OLDEST, fsync)
+        payload = _get_payload()
+
+        latencies = []
+        start_time = time.perf_counter()
+        for _ in range(count):
+            put_time = time.perf_counter()
+            spool.put(payload)
+            latencies.append(time.perf_counter() - put_time)
+        put_time = time.perf_counter() - start_time
+        size = spool.get_size()
+        spooled_count = spool.get_count()
+
+        start_time = time.perf_counter()
+        drained_count = 0
+        while True:
+            payloads = spool.peek(_DRAIN_BATCH)
+            if len(payloads) == 0:
+                break
+            spool.commit(len(payloads))
+            drained_count += len(payloads)
+        drain_time = time.perf_counter() - start_time
+        spool.close()
+
+        _log.info('fsync: {}, packets: {}, spooled: {} ({} KB), dropped: {}.'.format(
+            fsync, count, spooled_count, size // 1024, spool.get_dropped_count()))
+        _log.info('  put():   {:9.0f} packets/s, {:7.2f} MB/s of records.'.format(
+            count / put_time, size * count / max(spooled_count, 1) / put_time / 1e6))
+        _log.info('  latency: p50 {:7.3f} ms, p99 {:7.3f} ms, max {:7.3f} ms.'.format(
+            1000 * _percentile(latencies, 50), 1000 * _percentile(latencies, 99),
+            1000 * max(latencies)))
+        _log.info('  drain:   {:9.0f} packets/s in batches of {}.'.format(
+            drained_count / max(drain_time, 1e-9), _DRAIN_BATCH))
+    finally:
+        shutil.rmtree(spool_path, ignore_errors=True)
+
+
+#***************************************************************************************************
+# Startup point
+#***************************************************************************************************
+if __name__ == '__main__':
+    args = _parse_command_line_args()
+    _run(args.path, args.count, False, args.max_size, args.segment_size)
+    _run(args.path, args.fsync_count, True, args.max_size, args.segment_size)
+    utils_exit.exit(0)
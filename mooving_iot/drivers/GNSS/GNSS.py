@@ -53,6 +53,10 @@ class GNSSImplementationBase:
         return NotImplementedError
     def get_gps_data_change(self, gps_longitude, gps_latitude):
         return NotImplementedError
+    def set_nmea_listener(self, callback):
+        raise NotImplementedError
+    def set_event_bus(self, event_bus):
+        raise NotImplementedError
 
 
 class GNSS:
@@ -89,5 +93,13 @@ class GNSS:
     
     def get_last_data(self) -> GNSSData:
         return self._gnss_impl.get_last_data()
+
+    # Callback is called with every raw NMEA sentence (bytes) received from the module.
+    def set_nmea_listener(self, callback):
+        return self._gnss_impl.set_nmea_listener(callback)
+
+    # New fixes are published to the event bus, the process wide bus by default.
+    def set_event_bus(self, event_bus):
+        return self._gnss_impl.set_event_bus(event_bus)
     
 
@@ -0,0 +1,44 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.project_config as prj_cfg
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Public functions
+#***************************************************************************************************
+def checksum(body : str) -> int:
+    value = 0
+    for char in body:
+        value ^= ord(char)
+    return value
+
+
+def build_sentence(body : str) -> str:
+    return '${body}*{cs:02X}'.format(body=body, cs=checksum(body))
+
+
+def dd_to_ddm(value : float, is_latitude : bool) -> tuple:
+    if is_latitude:
+        direction = 'N' if value >= 0 else 'S'
+    else:
+        direction = 'E' if value >= 0 else 'W'
+
+    value = abs(value)
+    degrees = int(value)
+    minutes = (value - degrees) * 60
+    degrees_format = '{:02d}' if is_latitude else '{:03d}'
+
+    return (degrees_format.format(degrees) + '{:08.5f}'.format(minutes), direction)
+
@@ -0,0 +1,132 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import threading
+import time
+import math
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.project_config as prj_cfg
+import mooving_iot.drivers.GNSS.GNSS as gnss
+import mooving_iot.drivers.GNSS.nmea.nmea_stream as nmea_stream
+import mooving_iot.libraries.event_bus.event_bus as lib_event_bus
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+# Base for GNSS implementations fed with NMEA data: raw serial chunks or single sentences.
+class NmeaGNSS(gnss.GNSSImplementationBase):
+    _DEFAULT_GPS_CHANGE_TRES = 0.05
+    def __init__(self):
+        self._longitude = "0.0"
+        self._latitude = "0.0"
+        self._altitude = "0.0"
+        self._heading = "0.0"
+        self._valid = False
+
+        self._data_lock = threading.Lock()
+        self._last_data = gnss.GNSSData("0.0", "0.0", "0.0", "0.0", False)
+        self._coord = None
+        self._gps_speed = "0"
+
+        self._fix_receive_time = None
+
+        self._nmea_listener = None
+        self._event_bus = lib_event_bus.EventBus.get_instance()
+
+        self._parser = nmea_stream.NmeaStreamParser()
+        self._parser.set_sentence_listener(self._on_sentence)
+
+    def get_last_data(self) -> gnss.GNSSData:
+        with self._data_lock:
+            return self._last_data
+
+    def get_valid(self):
+        with self._data_lock:
+            return self._valid
+
+    def get_coord(self):
+        with self._data_lock:
+            return self._coord
+
+    def get_longitude(self):
+        with self._data_lock:
+            return self._longitude
+
+    def get_latitude(self):
+        with self._data_lock:
+            return self._latitude
+
+    def get_altitude(self):
+        with self._data_lock:
+            return self._altitude
+
+    def get_heading(self):
+        with self._data_lock:
+            return self._heading
+
+    # Time when the last GGA sentence was received, None before the first one.
+    def get_fix_receive_time(self):
+        with self._data_lock:
+            return self._fix_receive_time
+
+    def get_gps_data_change(self, gps_longitude, gps_latitude):
+        with self._data_lock:
+            is_latitude_changed = (
+                (abs(float(self._latitude) - float(gps_latitude)) * 110.574)
+                > NmeaGNSS._DEFAULT_GPS_CHANGE_TRES)
+            is_longitude_changed = (
+                (abs(float(self._longitude) - float(gps_longitude)) *
+                111.320 * math.cos(math.radians(float(self._latitude) - float(gps_latitude))))
+                > NmeaGNSS._DEFAULT_GPS_CHANGE_TRES)
+            if is_latitude_changed or is_longitude_changed:
+                return [ True , self._longitude , self._latitude ]
+            else:
+                return [ False , self._longitude , self._latitude ]
+
+    def set_nmea_listener(self, callback):
+        self._nmea_listener = callback
+
+    def set_event_bus(self, event_bus):
+        self._event_bus = event_bus
+
+    # Parses a chunk of raw NMEA data, incomplete sentences wait for the next chunk.
+    def _process_data(self, data : bytes, receive_time):
+        is_new_fix = False
+        for fix in self._parser.feed(data, receive_time):
+            with self._data_lock:
+                self._latitude = fix.latitude
+                self._longitude = fix.longitude
+                self._altitude = fix.altitude
+                self._coord = fix.coord
+                self._valid = fix.valid
+                self._heading = fix.heading
+                self._gps_speed = fix.speed_kmph
+                self._last_data = gnss.GNSSData(
+                    self._longitude, self._latitude, self._altitude, self._heading, self._valid)
+                if fix.sentence_type == 'GGA':
+                    self._fix_receive_time = fix.receive_time
+                    is_new_fix = True
+
+        if is_new_fix:
+            self._event_bus.publish(lib_event_bus.SENSOR_TOPIC.GNSS)
+
+    # Parses one raw NMEA sentence and updates the last fix.
+    def _process_sentence(self, sentence : bytes):
+        if not sentence.endswith(b'\n'):
+            sentence += b'\r\n'
+        self._process_data(sentence, time.time())
+
+    def _on_sentence(self, sentence : bytes):
+        if self._nmea_listener != None:
+            self._nmea_listener(sentence)
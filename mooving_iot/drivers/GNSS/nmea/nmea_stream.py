@@ -0,0 +1,193 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.metrics as metrics
+import mooving_iot.project_config as prj_cfg
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+# Longer lines without a line end are dropped. NMEA limits sentences to 82 characters, Teseo
+# proprietary $PSTM messages are longer.
+_MAX_SENTENCE_LENGTH = 256
+
+_KMPH_PER_KNOT = 1.852
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+# GNSS state after a consumed sentence. GGA updates the position, VTG and RMC update heading and
+# speed. Values are strings in the format of the GNSS drivers. receive_time is the time of the read
+# which completed the sentence.
+class NmeaFix:
+    def __init__(self, sentence_type, receive_time, latitude, longitude, altitude, coord, valid,
+        heading, speed_kmph):
+        self.sentence_type = sentence_type
+        self.receive_time = receive_time
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = altitude
+        self.coord = coord
+        self.valid = valid
+        self.heading = heading
+        self.speed_kmph = speed_kmph
+
+
+# Incremental NMEA parser for raw serial data. feed() takes chunks of any size, keeps the incomplete
+# tail in a reusable buffer and returns a fix for every complete GGA, VTG and RMC sentence with a
+# valid checksum. Other sentences are only passed to the sentence listener. Sentences are parsed as
+# bytes, without decoding and regular expressions. Not thread safe.
+class NmeaStreamParser:
+    def __init__(self):
+        self._buffer = bytearray()
+        self._sentence_listener = None
+
+        self._latitude = '0.0'
+        self._longitude = '0.0'
+        self._altitude = '0.0'
+        self._coord = None
+        self._valid = False
+        self._heading = '0.0'
+        self._speed_kmph = '0'
+
+        self._sentences_metric = metrics.counter(
+            'gnss_sentences_total', 'NMEA sentences received from GNSS receivers.')
+        self._parse_errors_metric = metrics.counter(
+            'gnss_parse_errors_total', 'NMEA sentences which can not be parsed.')
+
+    # Called with every complete raw line including the line end, e.g. to record traces.
+    def set_sentence_listener(self, callback):
+        self._sentence_listener = callback
+
+    def feed(self, data, receive_time) -> list:
+        buffer = self._buffer
+        buffer += data
+        fixes = []
+        start_pos = 0
+        sentence_count = 0
+        while True:
+            end_pos = buffer.find(b'\n', start_pos)
+            if end_pos == -1:
+                break
+            line = bytes(buffer[start_pos:end_pos + 1])
+            start_pos = end_pos + 1
+            sentence_count += 1
+
+            if self._sentence_listener != None:
+                self._sentence_listener(line)
+            fix = self._parse_line(line, receive_time)
+            if fix != None:
+                fixes.append(fix)
+
+        del buffer[:start_pos]
+        if sentence_count > 0:
+            self._sentences_metric.inc(sentence_count)
+        if len(buffer) > _MAX_SENTENCE_LENGTH:
+            _log.debug('NMEA line without line end dropped, %d bytes.', len(buffer))
+            self._parse_errors_metric.inc()
+            buffer.clear()
+        return fixes
+
+    def _parse_line(self, line : bytes, receive_time):
+        # $<talker><type>,... : proprietary $P... sentences and types we do not use are skipped
+        # before the checksum is computed.
+        sentence_type = line[3:6]
+        if ((line[:1] != b'$') or (line[1:2] == b'P')
+            or (sentence_type not in (b'GGA', b'VTG', b'RMC'))):
+            return None
+
+        star_pos = line.rfind(b'*')
+        try:
+            if (star_pos == -1) or (int(line[star_pos + 1:star_pos + 3], 16)
+                != _get_checksum(line[1:star_pos])):
+                raise ValueError('Wrong checksum.')
+
+            fields = line[1:star_pos].split(b',')
+            if sentence_type == b'GGA':
+                self._parse_gga(fields)
+            elif sentence_type == b'VTG':
+                self._parse_vtg(fields)
+            else:
+                self._parse_rmc(fields)
+        except (ValueError, IndexError):
+            self._parse_errors_metric.inc()
+            _log.debug('Can not parse NMEA sentence: %s.', line)
+            return None
+
+        return NmeaFix(sentence_type.decode(), receive_time,
+            self._latitude, self._longitude, self._altitude, self._coord, self._valid,
+            self._heading, self._speed_kmph)
+
+    # Without a fix the receiver sends empty position fields, the last position is kept.
+    def _parse_gga(self, fields):
+        valid = (fields[6] != b'') and (int(fields[6]) != 0)
+        if (fields[2] == b'') or (fields[4] == b''):
+            self._valid = False
+            return
+
+        # Fields are converted before the state is changed, a bad sentence changes nothing.
+        latitude = _ddm_to_dd(fields[2], fields[3])
+        longitude = _ddm_to_dd(fields[4], fields[5])
+        altitude = str(float(fields[9])) if fields[9] else 'None'
+        coord = _ddm_to_coord(fields[2]) + ', ' + _ddm_to_coord(fields[4])
+
+        self._latitude = latitude
+        self._longitude = longitude
+        self._altitude = altitude
+        self._coord = coord
+        self._valid = valid
+
+    def _parse_vtg(self, fields):
+        heading = str(float(fields[1])) if fields[1] else 'None'
+        speed_kmph = str(float(fields[7])) if fields[7] else 'None'
+        self._heading = heading
+        self._speed_kmph = speed_kmph
+
+    def _parse_rmc(self, fields):
+        speed_kmph = str(round(float(fields[7]) * _KMPH_PER_KNOT, 3)) if fields[7] else 'None'
+        heading = str(float(fields[8])) if fields[8] else 'None'
+        self._heading = heading
+        self._speed_kmph = speed_kmph
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+# XOR of all bytes: the bytes are read as one integer which is folded in halves, a few big integer
+# operations instead of a Python loop over the bytes.
+def _get_checksum(body : bytes) -> int:
+    value = int.from_bytes(body, 'little')
+    bits = len(body) * 8
+    while bits > 8:
+        bits = ((bits // 8 + 1) // 2) * 8
+        value = (value & ((1 << bits) - 1)) ^ (value >> bits)
+    return value
+
+
+# DDM b'4807.038', b'N' to the DD string format, e.g. '48.1173'.
+def _ddm_to_dd(value : bytes, direction : bytes) -> str:
+    # Minutes are converted from their own digits, float(value) % 100 changes the last digit.
+    minutes_pos = value.index(b'.') - 2
+    dd = round(float(value[:minutes_pos]) + float(value[minutes_pos:]) / 60, 6)
+    if direction in (b'S', b'W'):
+        dd = (-1) * dd
+    return str(dd)
+
+
+# DDM b'4807.038' to the receiver coordinate format '48 07.038'.
+def _ddm_to_coord(value : bytes) -> str:
+    minutes_pos = value.index(b'.') - 2
+    return value[:minutes_pos].decode() + ' ' + value[minutes_pos:].decode()
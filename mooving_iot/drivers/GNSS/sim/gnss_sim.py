@@ -0,0 +1,122 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import threading
+import time
+import math
+import random
+import datetime
+import traceback
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.project_config as prj_cfg
+import mooving_iot.drivers.GNSS.nmea.nmea as nmea
+import mooving_iot.drivers.GNSS.nmea.nmea_gnss as nmea_gnss
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+_START_LATITUDE = 52.520008
+_START_LONGITUDE = 13.404954
+_START_ALTITUDE = 34.0
+_MOVEMENT_HEADING = 45.0
+_MOVEMENT_SPEED_KMPH = 15.0
+_NOISE_DEGREE = 0.000002
+_KM_PER_LATITUDE_DEGREE = 110.574
+_KM_PER_LONGITUDE_DEGREE = 111.320
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+class GNSSSim(nmea_gnss.NmeaGNSS):
+    def __init__(self, reset_pin, rate_hz=1, seed=0, movement_period_s=300,
+        movement_duration_s=60
+    ):
+        super().__init__()
+
+        self._rate_hz = rate_hz
+        self._seed = seed
+        self._movement_period_s = movement_period_s
+        self._movement_duration_s = movement_duration_s
+
+        self._start_event = threading.Event()
+        self._process_thread = threading.Thread(target=self._process_thread_func)
+        self._process_thread.start()
+
+        utils_exit.register_on_exit(self.stop)
+
+        _log.debug('GNSSSim instance created, rate: {} Hz, seed: {}.'.format(rate_hz, seed))
+
+    def start(self):
+        self._start_event.set()
+
+    def stop(self):
+        self._start_event.clear()
+
+    # Deterministic NMEA generator, sentences depend only on the seed and fix index.
+    def _generate_sentences(self, rng : random.Random, fix_index) -> list:
+        time_s = fix_index / self._rate_hz
+
+        moving_time_s = 0
+        is_moving = False
+        if self._movement_period_s > 0:
+            moving_time_s = ((time_s // self._movement_period_s) * self._movement_duration_s
+                + min(time_s % self._movement_period_s, self._movement_duration_s))
+            is_moving = (time_s % self._movement_period_s) < self._movement_duration_s
+
+        distance_km = _MOVEMENT_SPEED_KMPH * moving_time_s / 3600
+        heading_rad = math.radians(_MOVEMENT_HEADING)
+        latitude = (_START_LATITUDE + rng.gauss(0, _NOISE_DEGREE)
+            + distance_km * math.cos(heading_rad) / _KM_PER_LATITUDE_DEGREE)
+        longitude = (_START_LONGITUDE + rng.gauss(0, _NOISE_DEGREE)
+            + distance_km * math.sin(heading_rad)
+            / (_KM_PER_LONGITUDE_DEGREE * math.cos(math.radians(_START_LATITUDE))))
+        speed_kmph = _MOVEMENT_SPEED_KMPH if is_moving else 0.0
+
+        fix_time = datetime.datetime(2000, 1, 1) + datetime.timedelta(seconds=time_s)
+        latitude_ddm, latitude_dir = nmea.dd_to_ddm(latitude, True)
+        longitude_ddm, longitude_dir = nmea.dd_to_ddm(longitude, False)
+
+        gga = nmea.build_sentence(
+            'GPGGA,{time},{lat},{lat_dir},{lon},{lon_dir},1,08,0.9,{alt:.1f},M,47.0,M,,'
+            .format(
+                time=fix_time.strftime('%H%M%S.00'),
+                lat=latitude_ddm, lat_dir=latitude_dir,
+                lon=longitude_ddm, lon_dir=longitude_dir,
+                alt=_START_ALTITUDE))
+        vtg = nmea.build_sentence(
+            'GPVTG,{heading:.1f},T,,M,{knots:.1f},N,{kmph:.1f},K,A'.format(
+                heading=_MOVEMENT_HEADING, knots=speed_kmph / 1.852, kmph=speed_kmph))
+
+        return [gga, vtg]
+
+    def _process_thread_func(self):
+        try:
+            _log.debug('gnss sim process_thread_func thread started.')
+
+            rng = random.Random(self._seed)
+            fix_index = 0
+
+            while True:
+                self._start_event.wait()
+
+                for sentence in self._generate_sentences(rng, fix_index):
+                    self._process_sentence(str.encode(sentence + '\r\n'))
+                fix_index += 1
+
+                time.sleep(1.0 / self._rate_hz)
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
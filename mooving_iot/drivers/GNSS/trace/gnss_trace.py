@@ -0,0 +1,88 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.project_config as prj_cfg
+import mooving_iot.drivers.GNSS.GNSS as gnss
+import mooving_iot.drivers.GNSS.nmea.nmea_gnss as nmea_gnss
+import mooving_iot.libraries.sensor_trace.sensor_trace as lib_sensor_trace
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+# Wraps another GNSS implementation and records raw NMEA sentences to a trace file.
+class GNSSTraceRecorder(gnss.GNSSImplementationBase):
+    def __init__(self, reset_pin, GNSSImplCls=None,
+        trace_writer : lib_sensor_trace.TraceWriter=None
+    ):
+        self._gnss_impl : gnss.GNSSImplementationBase = GNSSImplCls(reset_pin)
+        self._gnss_impl.set_nmea_listener(trace_writer.write_nmea)
+
+        _log.debug('GNSSTraceRecorder instance created.')
+
+    def start(self):
+        return self._gnss_impl.start()
+
+    def stop(self):
+        return self._gnss_impl.stop()
+
+    def get_last_data(self) -> gnss.GNSSData:
+        return self._gnss_impl.get_last_data()
+
+    def get_coord(self):
+        return self._gnss_impl.get_coord()
+
+    def get_longitude(self):
+        return self._gnss_impl.get_longitude()
+
+    def get_latitude(self):
+        return self._gnss_impl.get_latitude()
+
+    def get_valid(self):
+        return self._gnss_impl.get_valid()
+
+    def get_altitude(self):
+        return self._gnss_impl.get_altitude()
+
+    def get_heading(self):
+        return self._gnss_impl.get_heading()
+
+    def get_gps_data_change(self, gps_longitude, gps_latitude):
+        return self._gnss_impl.get_gps_data_change(gps_longitude, gps_latitude)
+
+    def set_nmea_listener(self, callback):
+        raise NotImplementedError
+
+    def set_event_bus(self, event_bus):
+        return self._gnss_impl.set_event_bus(event_bus)
+
+
+# GNSS implementation fed with NMEA sentences from a trace file.
+class GNSSTraceReplay(nmea_gnss.NmeaGNSS):
+    def __init__(self, reset_pin, trace_player : lib_sensor_trace.TracePlayer=None):
+        super().__init__()
+
+        if trace_player != None:
+            trace_player.add_sink(lib_sensor_trace.TRACE_RECORD_TYPE.NMEA, self.push_record)
+
+        _log.debug('GNSSTraceReplay instance created.')
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def push_record(self, record : lib_sensor_trace.NmeaRecord):
+        self._process_sentence(record.sentence)
@@ -26,6 +26,20 @@ class AccData:
         self.z_mg = z
 
 
+# Block of consecutive samples: x_mg, y_mg, z_mg are array('h') of the same length, timestamp is
+# the time of the last sample, rate_hz is the sample rate (None if samples are not equidistant).
+class AccDataBatch:
+    def __init__(self, x_mg, y_mg, z_mg, rate_hz, timestamp):
+        self.x_mg = x_mg
+        self.y_mg = y_mg
+        self.z_mg = z_mg
+        self.rate_hz = rate_hz
+        self.timestamp = timestamp
+
+    def __len__(self):
+        return len(self.x_mg)
+
+
 class AccImplementationBase:
     def __init__(self, i2c_instance_num, i2c_addr):
         _log.debug('AccImplementationBase instance created.')
@@ -48,6 +62,9 @@ class AccImplementationBase:
     def set_acc_threshold(self, threshold_mg, threshold_duration_ms):
         raise NotImplementedError
 
+    def set_batch_listener(self, callback):
+        raise NotImplementedError
+
 
 class Acc:
     def __init__(self, AccImplCls, i2c_instance_num, i2c_addr):
@@ -72,3 +89,8 @@ class Acc:
 
     def set_acc_threshold(self, threshold_mg, threshold_duration_ms):
         return self._acc_impl.set_acc_threshold(threshold_mg, threshold_duration_ms)
+
+    # callback(batch : AccDataBatch) is called from the driver thread with every block of new
+    # samples, None removes the listener.
+    def set_batch_listener(self, callback):
+        return self._acc_impl.set_batch_listener(callback)
@@ -3,16 +3,19 @@
 #***************************************************************************************************
 # Global imports
 import os
+import sys
 import threading
 import time
-import smbus2
+import array
 import enum
 import traceback
+import RPi.GPIO as GPIO
 
 # Project imports
 import mooving_iot.utils.logger as logger
-import mooving_iot.utils.i2c_lock as i2c_lock
+import mooving_iot.utils.i2c as i2c
 import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.clock as clock
 import mooving_iot.project_config as prj_cfg
 
 import mooving_iot.drivers.acc.acc as acc
@@ -38,6 +41,8 @@ class ACC_REG_ID(enum.IntEnum):
     CTRL7 = 0x26
     STATUS = 0x27
     OUT_X_L = 0x28
+    FIFO_CTRL = 0x2E
+    FIFO_SRC = 0x2F
     IG_CFG1 = 0x30
     IG_SRC1 = 0x31
     IG_THS_X1 = 0x32
@@ -53,13 +58,43 @@ class ACC_REG_ID(enum.IntEnum):
     ZH_REFERENCE = 0x3F
 
 
+# CTRL1 ODR bits for supported output data rates, Hz.
+_CTRL1_ODR = {10: 0x10, 50: 0x20, 100: 0x30, 200: 0x40, 400: 0x50, 800: 0x60}
+# STATUS register polling period when new data is not ready yet.
+_STATUS_POLL_PERIOD = 0.01
+# FIFO depth and watermark, FIFO_SRC FSS field is 5 bits wide so the watermark is 31 samples.
+_FIFO_SIZE = 32
+_FIFO_THRESHOLD = 31
+# 3 axes, 2 bytes each.
+_SAMPLE_SIZE = 6
+
+
 #***************************************************************************************************
 # Public classes
 #***************************************************************************************************
 class AccLis2hh12(acc.AccImplementationBase):
-    def __init__(self, i2c_instance_num, i2c_addr):
-        self._i2c_instance_num = i2c_instance_num
-        self._i2c_addr = i2c_addr
+    # int1_pin: BCM pin connected to INT1, data ready (FIFO watermark in FIFO mode) is signaled on
+    # it and the acquisition thread waits for the rising edge. STATUS register polling is used if
+    # int1_pin is None.
+    # odr_hz: output data rate, one of 10, 50, 100, 200, 400, 800.
+    # fifo_enabled: FIFO stream mode, samples are read in bursts of up to 32 samples and delivered
+    # to the batch listener, intended for high output data rates.
+    def __init__(self, i2c_instance_num, i2c_addr, int1_pin=None, odr_hz=10, fifo_enabled=False):
+        if odr_hz not in _CTRL1_ODR:
+            raise ValueError('Unsupported LIS2HH12 ODR: {} Hz.'.format(odr_hz))
+
+        self._i2c_device = i2c.get_device(i2c_instance_num, i2c_addr)
+        self._int1_pin = int1_pin
+        self._int1_event = threading.Event()
+        self._odr_hz = odr_hz
+        self._fifo_enabled = fifo_enabled
+        self._sample_period = 1.0 / odr_hz
+        # INT1 edge wait timeout, status is checked anyway to recover from a missed edge.
+        if fifo_enabled:
+            self._int1_wait_timeout = 2 * _FIFO_THRESHOLD * self._sample_period
+        else:
+            self._int1_wait_timeout = 2 * self._sample_period
+        self._batch_listener = None
         self._acc_data_threshold_update_required = False
         self._acc_data_threshold = 2000
         self._acc_data_threshold_duration = 0x7F * 100
@@ -76,7 +111,8 @@ class AccLis2hh12(acc.AccImplementationBase):
 
         utils_exit.register_on_exit(self.stop)
 
-        _log.debug('AccLis2hh12 instance created.')
+        _log.debug('AccLis2hh12 instance created, ODR: {} Hz, FIFO: {}.'
+            .format(odr_hz, fifo_enabled))
 
     def start(self):
         # force reboot
@@ -89,40 +125,62 @@ class AccLis2hh12(acc.AccImplementationBase):
         # check that accelerometer returns correct response
         who_am_i_value = self._read_register(ACC_REG_ID.WHO_AM_I)
         _log.info('Read acc WHO_AM_I value: 0x{:02X}.'.format(who_am_i_value))
-        # X, Y, Z, enabled, ODR = 10 Hz, BDU enabled
-        self._write_register(ACC_REG_ID.CTRL1, 0x1F)
-        #  high-pass filter enable
-        self._write_register(ACC_REG_ID.CTRL2, 0x02)
-        # interrupt generator 1 on INT1 pin
-        self._write_register(ACC_REG_ID.CTRL3, 0x08)
-        # increment during a multiple byte access
-        self._write_register(ACC_REG_ID.CTRL4, 0x04)
-        # interrupt active-high; Interrupt pins push-pull configuration
-        self._write_register(ACC_REG_ID.CTRL5, 0x00)
-        # interrupt 1 latched
-        self._write_register(ACC_REG_ID.CTRL7, 0x04)
-        # set threshold
+        if self._fifo_enabled:
+            # FIFO enabled; interrupt generator 1 and FIFO watermark on INT1 pin
+            ctrl3_value = 0x8A
+        elif self._int1_pin == None:
+            # interrupt generator 1 on INT1 pin
+            ctrl3_value = 0x08
+        else:
+            # interrupt generator 1 and data ready on INT1 pin
+            ctrl3_value = 0x09
         threshold = int((self._acc_data_threshold * 255) / 2000)
-        self._write_register(ACC_REG_ID.IG_THS_X1, threshold)
-        self._write_register(ACC_REG_ID.IG_THS_Y1, threshold)
-        self._write_register(ACC_REG_ID.IG_THS_Z1, threshold)
-        # set duration (for 10 Hz - 100 ms on each sample)
-        duration = int(self._acc_data_threshold_duration / 100)
-        self._write_register(ACC_REG_ID.IG_DUR1, duration & 0x7F)
+        duration = self._get_threshold_duration_samples()
+
+        config = [
+            # X, Y, Z, enabled, ODR, BDU enabled
+            (ACC_REG_ID.CTRL1, _CTRL1_ODR[self._odr_hz] | 0x0F),
+            #  high-pass filter enable
+            (ACC_REG_ID.CTRL2, 0x02),
+            (ACC_REG_ID.CTRL3, ctrl3_value),
+            # increment during a multiple byte access
+            (ACC_REG_ID.CTRL4, 0x04),
+            # interrupt active-high; Interrupt pins push-pull configuration
+            (ACC_REG_ID.CTRL5, 0x00),
+            # interrupt 1 latched
+            (ACC_REG_ID.CTRL7, 0x04),
+            # set threshold
+            (ACC_REG_ID.IG_THS_X1, threshold),
+            (ACC_REG_ID.IG_THS_Y1, threshold),
+            (ACC_REG_ID.IG_THS_Z1, threshold),
+            # set duration (1 / ODR on each sample)
+            (ACC_REG_ID.IG_DUR1, duration),
+        ]
+        if self._fifo_enabled:
+            # FIFO stream mode, watermark level
+            config.append((ACC_REG_ID.FIFO_CTRL, 0x40 | _FIFO_THRESHOLD))
+        self._i2c_device.write_register_list(config)
+
         # dummy read to force HP filter output
-        self._read_register(ACC_REG_ID.XL_REFERENCE)
-        self._read_register(ACC_REG_ID.YL_REFERENCE)
-        self._read_register(ACC_REG_ID.ZL_REFERENCE)
+        self._i2c_device.read_register_list(
+            [ACC_REG_ID.XL_REFERENCE, ACC_REG_ID.YL_REFERENCE, ACC_REG_ID.ZL_REFERENCE])
         # enable ZHIE, XHIE and YHIE interrupt generation
         self._write_register(ACC_REG_ID.IG_CFG1, 0x2A)
         # read to clear unexpected interrupt
         ig_src1_value = self._read_register(ACC_REG_ID.IG_SRC1)
 
+        if self._int1_pin != None:
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setup(self._int1_pin, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+            GPIO.add_event_detect(self._int1_pin, GPIO.RISING, callback=self._on_int1)
+
         self._start_event.set()
 
     def stop(self):
         self._start_event.clear()
         self._data_event.clear()
+        if self._int1_pin != None:
+            GPIO.remove_event_detect(self._int1_pin)
         self._write_register(ACC_REG_ID.CTRL6, 0x80)
 
     def get_last_data(self) -> acc.AccData:
@@ -141,6 +199,12 @@ class AccLis2hh12(acc.AccImplementationBase):
         with self._data_lock:
             self._acc_data_threshold_update_required = True
 
+    def set_batch_listener(self, callback):
+        self._batch_listener = callback
+
+    def get_i2c_device(self) -> i2c.I2cDevice:
+        return self._i2c_device
+
     def _process_thread_func(self):
         try:
             _log.debug('acc process_thread_func thread started.')
@@ -148,69 +212,111 @@ class AccLis2hh12(acc.AccImplementationBase):
             while True:
                 self._start_event.wait()
 
-                acc_status = self._read_register(ACC_REG_ID.STATUS)
-                # if new data available - read it
-                if acc_status & 0x08:
-                    # read data from acc
-                    last_data = self._read_acc_data()
-                    # read if data was out of threshold
-                    ig_src1_value = self._read_register(ACC_REG_ID.IG_SRC1)
-                    is_acc_out_of_threshold = (ig_src1_value & 0x2A) > 0
-                    if self._acc_data_threshold_update_required:
-                        # update acc threshold
-                        threshold = int((self._acc_data_threshold * 256) / 2000)
-                        self._write_register(ACC_REG_ID.IG_THS_X1, threshold)
-                        self._write_register(ACC_REG_ID.IG_THS_Y1, threshold)
-                        self._write_register(ACC_REG_ID.IG_THS_Z1, threshold)
-                        # set duration (for 10 Hz - 100 ms on each sample)
-                        duration = int(self._acc_data_threshold_duration / 100)
-                        self._write_register(ACC_REG_ID.IG_DUR1, duration & 0x7F)
-                        # read to clear unexpected interrupt
-                        ig_src1_value = self._read_register(ACC_REG_ID.IG_SRC1)
-
-                    with self._data_lock:
-                        self._acc_data_threshold_update_required = False
-                        self._last_data = last_data
-                        self._is_acc_out_of_threshold = is_acc_out_of_threshold
-                        self._data_event.set()
-
-                    time.sleep(0.1)
+                if self._int1_pin != None:
+                    self._int1_event.wait(self._int1_wait_timeout)
+                    self._int1_event.clear()
+
+                if self._fifo_enabled:
+                    self._process_fifo()
+                else:
+                    self._process_sample()
         except:
             _log.error(traceback.format_exc())
             utils_exit.exit(1)
 
-    def _read_register(self, register_id) -> int:
-        write = smbus2.i2c_msg.write(self._i2c_addr, [register_id])
-        read = smbus2.i2c_msg.read(self._i2c_addr, 1)
+    def _process_sample(self):
+        # STATUS and output registers are consecutive, read them in one transaction
+        raw_data = self._i2c_device.read_registers(ACC_REG_ID.STATUS, 1 + _SAMPLE_SIZE)
+        # if new data available - use it
+        if raw_data[0] & 0x08:
+            last_data = acc.AccData(
+                self._raw_data_to_mg(raw_data[1] | (raw_data[2] << 8)),
+                self._raw_data_to_mg(raw_data[3] | (raw_data[4] << 8)),
+                self._raw_data_to_mg(raw_data[5] | (raw_data[6] << 8)))
+            self._update_data(last_data)
+
+            batch_listener = self._batch_listener
+            if batch_listener != None:
+                batch_listener(acc.AccDataBatch(
+                    array.array('h', [last_data.x_mg]), array.array('h', [last_data.y_mg]),
+                    array.array('h', [last_data.z_mg]), self._odr_hz, clock.time()))
+
+            if self._int1_pin == None:
+                time.sleep(self._sample_period)
+        elif self._int1_pin == None:
+            time.sleep(_STATUS_POLL_PERIOD)
+
+    def _process_fifo(self):
+        fifo_src = self._read_register(ACC_REG_ID.FIFO_SRC)
+        # FIFO is full if overrun flag is set
+        samples_count = _FIFO_SIZE if (fifo_src & 0x40) else (fifo_src & 0x1F)
+
+        if samples_count < _FIFO_THRESHOLD and self._int1_pin == None:
+            # sleep until the watermark is reached
+            time.sleep((_FIFO_THRESHOLD - samples_count) * self._sample_period)
+            return
+        if samples_count == 0:
+            return
+
+        batch = self._read_acc_fifo(samples_count)
+        self._update_data(acc.AccData(batch.x_mg[-1], batch.y_mg[-1], batch.z_mg[-1]))
+
+        batch_listener = self._batch_listener
+        if batch_listener != None:
+            batch_listener(batch)
+
+    def _update_data(self, last_data : acc.AccData):
+        # read if data was out of threshold
+        ig_src1_value = self._read_register(ACC_REG_ID.IG_SRC1)
+        is_acc_out_of_threshold = (ig_src1_value & 0x2A) > 0
+        if self._acc_data_threshold_update_required:
+            # update acc threshold and duration (1 / ODR on each sample)
+            threshold = int((self._acc_data_threshold * 256) / 2000)
+            duration = self._get_threshold_duration_samples()
+            self._i2c_device.write_register_list([
+                (ACC_REG_ID.IG_THS_X1, threshold),
+                (ACC_REG_ID.IG_THS_Y1, threshold),
+                (ACC_REG_ID.IG_THS_Z1, threshold),
+                (ACC_REG_ID.IG_DUR1, duration)])
+            # read to clear unexpected interrupt
+            ig_src1_value = self._read_register(ACC_REG_ID.IG_SRC1)
 
-        i2c_lock_obj = i2c_lock.i2c_get_lock()
-        with i2c_lock_obj:
-            with smbus2.SMBusWrapper(self._i2c_instance_num) as bus:
-                bus.i2c_rdwr(write, read)
-        return list(read)[0]
+        with self._data_lock:
+            self._acc_data_threshold_update_required = False
+            self._last_data = last_data
+            self._is_acc_out_of_threshold = is_acc_out_of_threshold
+            self._data_event.set()
+
+    def _on_int1(self, channel):
+        self._int1_event.set()
+
+    # IG_DUR1 value: threshold duration in samples (1 / ODR each), saturated to the 7 bit register.
+    def _get_threshold_duration_samples(self) -> int:
+        duration = max(0, int(self._acc_data_threshold_duration * self._odr_hz / 1000))
+        if duration > 0x7F:
+            _log.warning('Acc threshold duration %d ms is longer than %d samples at %d Hz, '
+                'limited to %d ms.', self._acc_data_threshold_duration, 0x7F, self._odr_hz,
+                0x7F * 1000 // self._odr_hz)
+            duration = 0x7F
+        return duration
+
+    def _read_register(self, register_id) -> int:
+        return self._i2c_device.read_register(register_id)
 
     def _write_register(self, register_id, value):
-        write = smbus2.i2c_msg.write(self._i2c_addr, [register_id, value])
-
-        i2c_lock_obj = i2c_lock.i2c_get_lock()
-        with i2c_lock_obj:
-            with smbus2.SMBusWrapper(self._i2c_instance_num) as bus:
-                bus.i2c_rdwr(write)
-
-    def _read_acc_data(self) -> acc.AccData:
-        write = smbus2.i2c_msg.write(self._i2c_addr, [ACC_REG_ID.OUT_X_L])
-        read = smbus2.i2c_msg.read(self._i2c_addr, 6)
-
-        i2c_lock_obj = i2c_lock.i2c_get_lock()
-        with i2c_lock_obj:
-            with smbus2.SMBusWrapper(self._i2c_instance_num) as bus:
-                bus.i2c_rdwr(write, read)
-
-        raw_data = list(read)
-        return acc.AccData(
-            self._raw_data_to_mg(raw_data[0] | (raw_data[1] << 8)),
-            self._raw_data_to_mg(raw_data[2] | (raw_data[3] << 8)),
-            self._raw_data_to_mg(raw_data[4] | (raw_data[5] << 8)))
+        self._i2c_device.write_register(register_id, value)
+
+    # Drains samples_count samples from FIFO in one transaction, output registers address rolls back
+    # to OUT_X_L after OUT_Z_H while FIFO is enabled.
+    def _read_acc_fifo(self, samples_count) -> acc.AccDataBatch:
+        raw_data = array.array('h', self._i2c_device.read_registers(
+            ACC_REG_ID.OUT_X_L, samples_count * _SAMPLE_SIZE))
+        if sys.byteorder == 'big':
+            raw_data.byteswap()
+        data_mg = array.array('h', [int((value * 2000) / 2**15) for value in raw_data])
+
+        return acc.AccDataBatch(
+            data_mg[0::3], data_mg[1::3], data_mg[2::3], self._odr_hz, clock.time())
 
     def _raw_data_to_mg(self, data_reg) -> int:
         if (data_reg & 0x8000) > 0:
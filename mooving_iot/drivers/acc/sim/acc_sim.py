@@ -0,0 +1,186 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import threading
+import time
+import math
+import random
+import array
+import traceback
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.clock as clock
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.drivers.acc.acc as acc
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+# Rest position gravity vector, matches AccThresholdDetector default angles.
+_REST_X_MG = int(1000 * math.sin(math.radians(-50)))
+_REST_Y_MG = 0
+_REST_Z_MG = int(1000 * math.sin(math.radians(40)))
+_NOISE_MG = 8
+_MOVEMENT_FREQ_HZ = 5
+# High-pass filter coefficient used to emulate the LIS2HH12 interrupt generator.
+_HP_FILTER_COEF = 0.05
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+class AccSim(acc.AccImplementationBase):
+    def __init__(self, i2c_instance_num, i2c_addr,
+        rate_hz=10, seed=0, movement_period_s=30, movement_duration_s=3,
+        movement_amplitude_mg=400
+    ):
+        self._rate_hz = rate_hz
+        self._seed = seed
+        self._movement_period_s = movement_period_s
+        self._movement_duration_s = movement_duration_s
+        self._movement_amplitude_mg = movement_amplitude_mg
+
+        self._acc_data_threshold = 2000
+        self._acc_data_threshold_duration = 0x7F * 100
+
+        self._is_acc_out_of_threshold = False
+        self._batch_listener = None
+
+        self._data_lock = threading.Lock()
+        self._data_event = threading.Event()
+        self._last_data = acc.AccData(0, 0, 0)
+
+        self._start_event = threading.Event()
+        self._process_thread = threading.Thread(target=self._process_thread_func)
+        self._process_thread.start()
+
+        utils_exit.register_on_exit(self.stop)
+
+        _log.debug('AccSim instance created, rate: {} Hz, seed: {}.'.format(rate_hz, seed))
+
+    def start(self):
+        self._start_event.set()
+
+    def stop(self):
+        self._start_event.clear()
+        self._data_event.clear()
+
+    def get_last_data(self) -> acc.AccData:
+        with self._data_lock:
+            return self._last_data
+
+    def get_data_updated_event(self) -> threading.Event:
+        return self._data_event
+
+    def is_acc_out_of_threshold(self) -> bool:
+        return self._is_acc_out_of_threshold
+
+    def set_acc_threshold(self, threshold_mg, threshold_duration_ms):
+        with self._data_lock:
+            self._acc_data_threshold = threshold_mg
+            self._acc_data_threshold_duration = threshold_duration_ms
+
+    def set_batch_listener(self, callback):
+        self._batch_listener = callback
+
+    def get_rate_hz(self) -> float:
+        return self._rate_hz
+
+    # Deterministic sample generator, sample value depends only on the seed and sample index.
+    def _generate_sample(self, rng : random.Random, sample_index) -> acc.AccData:
+        time_s = sample_index / self._rate_hz
+        x_mg = _REST_X_MG + rng.gauss(0, _NOISE_MG)
+        y_mg = _REST_Y_MG + rng.gauss(0, _NOISE_MG)
+        z_mg = _REST_Z_MG + rng.gauss(0, _NOISE_MG)
+
+        if (self._movement_period_s > 0
+            and (time_s % self._movement_period_s) < self._movement_duration_s
+        ):
+            movement_mg = self._movement_amplitude_mg * math.sin(
+                2 * math.pi * _MOVEMENT_FREQ_HZ * time_s)
+            x_mg += movement_mg
+            y_mg += movement_mg / 2
+
+        return acc.AccData(int(x_mg), int(y_mg), int(z_mg))
+
+    def _process_thread_func(self):
+        try:
+            _log.debug('acc sim process_thread_func thread started.')
+
+            rng = random.Random(self._seed)
+            sample_index = 0
+            filter_x = filter_y = filter_z = None
+            out_of_thr_samples = 0
+
+            while True:
+                self._start_event.wait()
+                start_time = time.monotonic() - sample_index / self._rate_hz
+
+                while self._start_event.is_set():
+                    due_index = int((time.monotonic() - start_time) * self._rate_hz)
+                    if due_index <= sample_index:
+                        time.sleep(max(0, (sample_index + 1) / self._rate_hz
+                            - (time.monotonic() - start_time)))
+                        continue
+
+                    with self._data_lock:
+                        threshold_mg = self._acc_data_threshold
+                        duration_samples = int(
+                            self._acc_data_threshold_duration * self._rate_hz / 1000)
+
+                    # Process all samples due since the last wakeup as one burst.
+                    batch_listener = self._batch_listener
+                    batch = None
+                    if batch_listener != None:
+                        batch = acc.AccDataBatch(array.array('h'), array.array('h'),
+                            array.array('h'), self._rate_hz, 0)
+                    is_acc_out_of_threshold = False
+                    while sample_index < due_index:
+                        last_data = self._generate_sample(rng, sample_index)
+                        sample_index += 1
+                        if batch != None:
+                            batch.x_mg.append(last_data.x_mg)
+                            batch.y_mg.append(last_data.y_mg)
+                            batch.z_mg.append(last_data.z_mg)
+
+                        if filter_x == None:
+                            filter_x, filter_y, filter_z = (
+                                last_data.x_mg, last_data.y_mg, last_data.z_mg)
+                        filter_x += _HP_FILTER_COEF * (last_data.x_mg - filter_x)
+                        filter_y += _HP_FILTER_COEF * (last_data.y_mg - filter_y)
+                        filter_z += _HP_FILTER_COEF * (last_data.z_mg - filter_z)
+
+                        if ((abs(last_data.x_mg - filter_x) > threshold_mg)
+                            or (abs(last_data.y_mg - filter_y) > threshold_mg)
+                            or (abs(last_data.z_mg - filter_z) > threshold_mg)
+                        ):
+                            out_of_thr_samples += 1
+                        else:
+                            out_of_thr_samples = 0
+
+                        if out_of_thr_samples > duration_samples:
+                            is_acc_out_of_threshold = True
+
+                    with self._data_lock:
+                        self._last_data = last_data
+                        self._is_acc_out_of_threshold = is_acc_out_of_threshold
+                        self._data_event.set()
+
+                    if batch != None:
+                        batch.timestamp = clock.time()
+                        batch_listener(batch)
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
@@ -0,0 +1,145 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import threading
+import array
+import traceback
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.drivers.acc.acc as acc
+import mooving_iot.libraries.sensor_trace.sensor_trace as lib_sensor_trace
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+# Wraps another accelerometer implementation and records every sample to a trace file.
+class AccTraceRecorder(acc.AccImplementationBase):
+    def __init__(self, i2c_instance_num, i2c_addr,
+        AccImplCls=None, trace_writer : lib_sensor_trace.TraceWriter=None
+    ):
+        self._acc_impl : acc.AccImplementationBase = AccImplCls(i2c_instance_num, i2c_addr)
+        self._trace_writer = trace_writer
+
+        self._is_acc_out_of_threshold = False
+
+        self._data_lock = threading.Lock()
+        self._data_event = threading.Event()
+        self._last_data = acc.AccData(0, 0, 0)
+
+        self._process_thread = threading.Thread(target=self._process_thread_func)
+        self._process_thread.start()
+
+        _log.debug('AccTraceRecorder instance created.')
+
+    def start(self):
+        return self._acc_impl.start()
+
+    def stop(self):
+        return self._acc_impl.stop()
+
+    def get_last_data(self) -> acc.AccData:
+        with self._data_lock:
+            return self._last_data
+
+    def get_data_updated_event(self) -> threading.Event:
+        return self._data_event
+
+    def is_acc_out_of_threshold(self) -> bool:
+        return self._is_acc_out_of_threshold
+
+    def set_acc_threshold(self, threshold_mg, threshold_duration_ms):
+        return self._acc_impl.set_acc_threshold(threshold_mg, threshold_duration_ms)
+
+    # Batches are passed through, the trace keeps the samples seen through get_last_data() only.
+    def set_batch_listener(self, callback):
+        return self._acc_impl.set_batch_listener(callback)
+
+    def _process_thread_func(self):
+        try:
+            _log.debug('acc trace recorder thread started.')
+            data_updated = self._acc_impl.get_data_updated_event()
+
+            while True:
+                data_updated.wait()
+                data_updated.clear()
+
+                last_data = self._acc_impl.get_last_data()
+                is_acc_out_of_threshold = self._acc_impl.is_acc_out_of_threshold()
+                self._trace_writer.write_acc(last_data, is_acc_out_of_threshold)
+
+                with self._data_lock:
+                    self._last_data = last_data
+                    self._is_acc_out_of_threshold = is_acc_out_of_threshold
+                    self._data_event.set()
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
+
+
+# Accelerometer implementation fed with samples from a trace file.
+class AccTraceReplay(acc.AccImplementationBase):
+    def __init__(self, i2c_instance_num, i2c_addr,
+        trace_player : lib_sensor_trace.TracePlayer=None
+    ):
+        self._is_acc_out_of_threshold = False
+        self._batch_listener = None
+
+        self._data_lock = threading.Lock()
+        self._data_event = threading.Event()
+        self._last_data = acc.AccData(0, 0, 0)
+
+        if trace_player != None:
+            trace_player.add_sink(lib_sensor_trace.TRACE_RECORD_TYPE.ACC, self.push_record)
+
+        _log.debug('AccTraceReplay instance created.')
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self._data_event.clear()
+
+    def get_last_data(self) -> acc.AccData:
+        with self._data_lock:
+            return self._last_data
+
+    def get_data_updated_event(self) -> threading.Event:
+        return self._data_event
+
+    def is_acc_out_of_threshold(self) -> bool:
+        return self._is_acc_out_of_threshold
+
+    # Thresholds are applied by the recorded device, the trace keeps the resulting flag.
+    def set_acc_threshold(self, threshold_mg, threshold_duration_ms):
+        pass
+
+    # Trace records are delivered as single sample batches.
+    def set_batch_listener(self, callback):
+        self._batch_listener = callback
+
+    def push_record(self, record : lib_sensor_trace.AccRecord):
+        with self._data_lock:
+            self._last_data = record.acc_data
+            self._is_acc_out_of_threshold = record.is_out_of_threshold
+            self._data_event.set()
+
+        batch_listener = self._batch_listener
+        if batch_listener != None:
+            batch_listener(acc.AccDataBatch(
+                array.array('h', [record.acc_data.x_mg]),
+                array.array('h', [record.acc_data.y_mg]),
+                array.array('h', [record.acc_data.z_mg]),
+                None, record.timestamp))
@@ -0,0 +1,119 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import threading
+import time
+import math
+import random
+import traceback
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.project_config as prj_cfg
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.drivers.adc.adc as adc
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+_EXT_BATTERY_NOMINAL_V = 36.0
+_EXT_BATTERY_SWING_V = 1.5
+_INT_BATTERY_NOMINAL_V = 4.0
+_INT_BATTERY_SWING_V = 0.15
+_NOISE_V = 0.01
+_VOLTAGE_LEVEL_FILTER_COEF = 0.2
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+class AdcSim(adc.AdcImplementationBase):
+    def __init__(self, rate_hz=10, seed=0, charge_period_s=600, charge_duration_s=120):
+        self._rate_hz = rate_hz
+        self._seed = seed
+        self._charge_period_s = charge_period_s
+        self._charge_duration_s = charge_duration_s
+
+        self._data_lock = threading.Lock()
+        self._ext_batt_voltage = 0
+        self._int_batt_voltage = 0
+        self._is_charging = False
+
+        self._start_event = threading.Event()
+        self._process_thread = threading.Thread(target=self._process_thread_func)
+        self._process_thread.start()
+
+        _log.debug('AdcSim instance created, rate: {} Hz, seed: {}.'.format(rate_hz, seed))
+
+    def start(self):
+        self._start_event.set()
+
+    def stop(self):
+        self._start_event.clear()
+
+    def get_ext_batt_voltage(self) -> float:
+        with self._data_lock:
+            return self._ext_batt_voltage
+
+    def get_int_batt_voltage(self) -> float:
+        with self._data_lock:
+            return self._int_batt_voltage
+
+    def ext_batt_is_charging(self) -> bool:
+        with self._data_lock:
+            return self._is_charging
+
+    # Deterministic sample generator, sample value depends only on the seed and sample index.
+    def _generate_sample(self, rng : random.Random, sample_index) -> tuple:
+        time_s = sample_index / self._rate_hz
+        is_charging = (self._charge_period_s > 0
+            and (time_s % self._charge_period_s) < self._charge_duration_s)
+        phase = 2 * math.pi * time_s / max(self._charge_period_s, 1)
+
+        ext_batt_voltage = (_EXT_BATTERY_NOMINAL_V + _EXT_BATTERY_SWING_V * math.cos(phase)
+            + rng.gauss(0, _NOISE_V))
+        int_batt_voltage = (_INT_BATTERY_NOMINAL_V + _INT_BATTERY_SWING_V * math.cos(phase)
+            + rng.gauss(0, _NOISE_V))
+
+        return (ext_batt_voltage, int_batt_voltage, is_charging)
+
+    def _process_thread_func(self):
+        try:
+            _log.debug('adc sim process_thread_func thread started.')
+
+            rng = random.Random(self._seed)
+            sample_index = 0
+
+            while True:
+                self._start_event.wait()
+
+                ext_batt_voltage, int_batt_voltage, is_charging = self._generate_sample(
+                    rng, sample_index)
+                sample_index += 1
+
+                with self._data_lock:
+                    if self._ext_batt_voltage == 0:
+                        self._ext_batt_voltage = ext_batt_voltage
+                        self._int_batt_voltage = int_batt_voltage
+                    else:
+                        self._ext_batt_voltage = (
+                            (1.0 - _VOLTAGE_LEVEL_FILTER_COEF) * self._ext_batt_voltage
+                            + _VOLTAGE_LEVEL_FILTER_COEF * ext_batt_voltage)
+                        self._int_batt_voltage = (
+                            (1.0 - _VOLTAGE_LEVEL_FILTER_COEF) * self._int_batt_voltage
+                            + _VOLTAGE_LEVEL_FILTER_COEF * int_batt_voltage)
+                    self._is_charging = is_charging
+
+                time.sleep(1.0 / self._rate_hz)
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
@@ -0,0 +1,113 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import threading
+import traceback
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.clock as clock
+import mooving_iot.project_config as prj_cfg
+import mooving_iot.drivers.adc.adc as adc
+import mooving_iot.libraries.sensor_trace.sensor_trace as lib_sensor_trace
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+# Wraps another ADC implementation and records its voltages to a trace file.
+class AdcTraceRecorder(adc.AdcImplementationBase):
+    def __init__(self, AdcImplCls=None, trace_writer : lib_sensor_trace.TraceWriter=None,
+        rate_hz=10
+    ):
+        self._adc_impl : adc.AdcImplementationBase = AdcImplCls()
+        self._trace_writer = trace_writer
+        self._rate_hz = rate_hz
+
+        self._start_event = threading.Event()
+        self._process_thread = threading.Thread(target=self._process_thread_func)
+        self._process_thread.start()
+
+        _log.debug('AdcTraceRecorder instance created.')
+
+    def start(self):
+        result = self._adc_impl.start()
+        self._start_event.set()
+        return result
+
+    def stop(self):
+        self._start_event.clear()
+        return self._adc_impl.stop()
+
+    def get_ext_batt_voltage(self) -> float:
+        return self._adc_impl.get_ext_batt_voltage()
+
+    def get_int_batt_voltage(self) -> float:
+        return self._adc_impl.get_int_batt_voltage()
+
+    def ext_batt_is_charging(self) -> bool:
+        return self._adc_impl.ext_batt_is_charging()
+
+    def _process_thread_func(self):
+        try:
+            _log.debug('adc trace recorder thread started.')
+
+            while True:
+                self._start_event.wait()
+
+                self._trace_writer.write_adc(
+                    self._adc_impl.get_ext_batt_voltage(),
+                    self._adc_impl.get_int_batt_voltage(),
+                    self._adc_impl.ext_batt_is_charging())
+
+                clock.sleep(1.0 / self._rate_hz)
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
+
+
+# ADC implementation fed with voltages from a trace file.
+class AdcTraceReplay(adc.AdcImplementationBase):
+    def __init__(self, trace_player : lib_sensor_trace.TracePlayer=None):
+        self._data_lock = threading.Lock()
+        self._ext_batt_voltage = 0
+        self._int_batt_voltage = 0
+        self._is_charging = False
+
+        if trace_player != None:
+            trace_player.add_sink(lib_sensor_trace.TRACE_RECORD_TYPE.ADC, self.push_record)
+
+        _log.debug('AdcTraceReplay instance created.')
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def get_ext_batt_voltage(self) -> float:
+        with self._data_lock:
+            return self._ext_batt_voltage
+
+    def get_int_batt_voltage(self) -> float:
+        with self._data_lock:
+            return self._int_batt_voltage
+
+    def ext_batt_is_charging(self) -> bool:
+        with self._data_lock:
+            return self._is_charging
+
+    def push_record(self, record : lib_sensor_trace.AdcRecord):
+        with self._data_lock:
+            self._ext_batt_voltage = record.ext_batt_voltage
+            self._int_batt_voltage = record.int_batt_voltage
+            self._is_charging = record.is_ext_batt_charging
@@ -13,6 +13,7 @@ from typing import Union
 # Project imports
 import mooving_iot.utils.logger as logger
 import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.metrics as metrics
 import mooving_iot.project_config as prj_cfg
 
 import mooving_iot.drivers.buzzer.buzzer as buzzer
@@ -35,6 +36,9 @@ class BuzzerCpe267(buzzer.BuzzerImplementationBase):
 
         self._start_event = threading.Event()
         self._events_queue = queue.Queue(100)
+        queue_depth = metrics.gauge(
+            'buzzer_events_queue_depth', 'Buzzer events waiting for the driver thread.')
+        queue_depth.add_source(self._events_queue.qsize)
         self._process_thread = threading.Thread(target=self._process_thread_func)
         self._process_thread.start()
 
@@ -0,0 +1,90 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import threading
+import time
+import traceback
+import queue
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.metrics as metrics
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.drivers.buzzer.buzzer as buzzer
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+class BuzzerSim(buzzer.BuzzerImplementationBase):
+    def __init__(self, pwm_pin):
+        self._pwm_pin = pwm_pin
+
+        self._state_lock = threading.Lock()
+        self._frequency = 2500
+        self._duty_cycle = 0
+
+        self._start_event = threading.Event()
+        self._events_queue = queue.Queue(100)
+        queue_depth = metrics.gauge(
+            'buzzer_events_queue_depth', 'Buzzer events waiting for the driver thread.')
+        queue_depth.add_source(self._events_queue.qsize)
+        self._process_thread = threading.Thread(target=self._process_thread_func)
+        self._process_thread.start()
+
+        utils_exit.register_on_exit(self.stop)
+
+        _log.debug('BuzzerSim instance created.')
+
+    def start(self):
+        self._set_pwm(2500, 0)
+        self._start_event.set()
+
+    def stop(self):
+        self._start_event.clear()
+        self._set_pwm(2500, 0)
+
+    def set_event(self, event : buzzer.BuzzerEvent):
+        self._events_queue.put(event, True, None)
+
+    def clear_all_events(self):
+        try:
+            while True:
+                self._events_queue.get_nowait()
+        except queue.Empty:
+            self._set_pwm(2500, 0)
+
+    def get_pwm(self) -> tuple:
+        with self._state_lock:
+            return (self._frequency, self._duty_cycle)
+
+    def _set_pwm(self, frequency, duty_cycle):
+        with self._state_lock:
+            self._frequency = frequency
+            self._duty_cycle = duty_cycle
+
+    def _process_thread_func(self):
+        try:
+            _log.debug('buzzer sim _process_tone_func thread started.')
+
+            while True:
+                self._start_event.wait()
+
+                event : buzzer.BuzzerEvent = self._events_queue.get(True, None)
+
+                self._set_pwm(event.frequency, int(event.duty_cycle * 10000))
+                time.sleep(event.time)
+                self._set_pwm(2500, 0)
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
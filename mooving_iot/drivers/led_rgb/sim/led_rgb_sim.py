@@ -0,0 +1,89 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import threading
+import time
+import traceback
+import queue
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.metrics as metrics
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.drivers.led_rgb.led_rgb as drv_led_rgb
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+class LedRgbSim(drv_led_rgb.LedRgbImplementationBase):
+    def __init__(self, r_pin, g_pin, b_pin):
+        self._color_lock = threading.Lock()
+        self._color = (0, 0, 0)
+
+        self._events_queue = queue.Queue(100)
+        queue_depth = metrics.gauge(
+            'led_rgb_events_queue_depth', 'LED RGB events waiting for the driver thread.')
+        queue_depth.add_source(self._events_queue.qsize)
+        self._start_event = threading.Event()
+        self._process_thread = threading.Thread(target=self._process_thread_func)
+        self._process_thread.start()
+
+        utils_exit.register_on_exit(self.stop)
+
+        _log.debug('LedRgbSim instance created.')
+
+    def start(self):
+        self._start_event.set()
+
+    def stop(self):
+        self._start_event.clear()
+        self._set_color( (0, 0, 0) )
+
+    def set_event(self, event : drv_led_rgb.LedRgbEvent):
+        self._events_queue.put(event, True, None)
+
+    def clear_all_events(self):
+        try:
+            while True:
+                self._events_queue.get_nowait()
+        except queue.Empty:
+            self._set_color( (0, 0, 0) )
+
+    def get_color(self) -> tuple:
+        with self._color_lock:
+            return self._color
+
+    def _set_color(self, color):
+        with self._color_lock:
+            self._color = color
+
+    def _process_thread_func(self):
+        try:
+            _log.debug('led sim _process_tone_func thread started.')
+
+            while True:
+                self._start_event.wait()
+
+                event : drv_led_rgb.LedRgbEvent = self._events_queue.get(True, None)
+
+                self._set_color(
+                    (int(event.r_bright * 2.55),
+                    int(event.g_bright * 2.55),
+                    int(event.b_bright * 2.55)) )
+
+                time.sleep(event.time)
+                self._set_color( (0, 0, 0) )
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
@@ -14,6 +14,7 @@ import neopixel
 # Project imports
 import mooving_iot.utils.logger as logger
 import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.metrics as metrics
 import mooving_iot.project_config as prj_cfg
 
 import mooving_iot.drivers.led_rgb.led_rgb as drv_led_rgb
@@ -35,6 +36,9 @@ class LedWs2812b(drv_led_rgb.LedRgbImplementationBase):
         self._neopixel : Union[neopixel.NeoPixel, None] = None
 
         self._events_queue = queue.Queue(100)
+        queue_depth = metrics.gauge(
+            'led_rgb_events_queue_depth', 'LED RGB events waiting for the driver thread.')
+        queue_depth.add_source(self._events_queue.qsize)
         self._start_event = threading.Event()
         self._process_thread = threading.Thread(target=self._process_thread_func)
         self._process_thread.start()
@@ -12,6 +12,7 @@ import RPi.GPIO as GPIO
 # Project imports
 import mooving_iot.utils.logger as logger
 import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.metrics as metrics
 import mooving_iot.project_config as prj_cfg
 
 import mooving_iot.drivers.relay.relay as relay
@@ -35,6 +36,9 @@ class RelayAdjh23005(relay.RelayImplementationBase):
         self._current_state = None
 
         self._state_queue = queue.Queue(100)
+        queue_depth = metrics.gauge(
+            'relay_state_queue_depth', 'Relay states waiting for the driver thread.')
+        queue_depth.add_source(self._state_queue.qsize)
 
         self._start_event = threading.Event()
         self._process_thread = threading.Thread(target=self._process_thread_func)
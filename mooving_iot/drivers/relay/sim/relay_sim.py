@@ -0,0 +1,78 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import threading
+import time
+import traceback
+import queue
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.metrics as metrics
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.drivers.relay.relay as relay
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+class RelaySim(relay.RelayImplementationBase):
+    STATE_CHANGE_TIME = 0.05
+
+    def __init__(self, set_pin, reset_pin):
+        self._set_pin = set_pin
+        self._reset_pin = reset_pin
+        self._current_state = None
+
+        self._state_queue = queue.Queue(100)
+        queue_depth = metrics.gauge(
+            'relay_state_queue_depth', 'Relay states waiting for the driver thread.')
+        queue_depth.add_source(self._state_queue.qsize)
+
+        self._start_event = threading.Event()
+        self._process_thread = threading.Thread(target=self._process_thread_func)
+        self._process_thread.start()
+
+        utils_exit.register_on_exit(self.stop)
+
+        _log.debug('RelaySim instance created.')
+
+    def start(self, state=False):
+        self._start_event.set()
+        self.set_state(state)
+
+    def stop(self):
+        self._start_event.clear()
+
+    def set_state(self, state : bool):
+        _log.debug('set relay state: {}.'.format(state))
+        self._state_queue.put(state, True, None)
+
+    def get_state(self):
+        return self._current_state
+
+    def _process_thread_func(self):
+        try:
+            _log.debug('relay sim process_thread_func thread started.')
+
+            while True:
+                self._start_event.wait()
+
+                state = self._state_queue.get(True, None)
+
+                if state != self._current_state:
+                    time.sleep(RelaySim.STATE_CHANGE_TIME)
+                    self._current_state = state
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
@@ -2,7 +2,29 @@
 # Imports
 #***************************************************************************************************
 # Global packages imports
-import board as adafruit_pinout
+import enum
+import os
+
+
+#***************************************************************************************************
+# Hardware backend
+#***************************************************************************************************
+class HW_BACKEND(enum.Enum):
+    # Real Raspberry Pi peripherals.
+    DEVICE = 'device'
+    # Hardware-free simulated drivers with deterministic data streams.
+    SIM = 'sim'
+    # Accelerometer, ADC and GNSS fed from a recorded sensor trace, other drivers simulated.
+    REPLAY = 'replay'
+
+# Drivers backend, can be overridden with MOOVING_IOT_HW_BACKEND environment variable.
+BACKEND = HW_BACKEND(os.environ.get('MOOVING_IOT_HW_BACKEND', HW_BACKEND.DEVICE.value))
+
+if BACKEND == HW_BACKEND.DEVICE:
+    import board as adafruit_pinout
+    _LED_RGB_DATA_PIN = adafruit_pinout.D10
+else:
+    _LED_RGB_DATA_PIN = 10
 
 
 #***************************************************************************************************
@@ -12,6 +34,12 @@ import board as adafruit_pinout
 class ACC:
     I2C_INST_NUM = 1
     I2C_ADDR = 0x1D
+    # BCM pin wired to the accelerometer INT1 output, None - STATUS register polling.
+    INT1_PIN = None
+    # Output data rate, Hz: 10, 50, 100, 200, 400 or 800.
+    ODR_HZ = 10
+    # FIFO stream mode with burst reads, recommended for ODR of 100 Hz and above.
+    FIFO_ENABLED = False
 
 class RELAY:
     SET_PIN = 23
@@ -24,6 +52,22 @@ class GPS:
     RST_PIN = 17
 
 class LED_RGB:
-    R_PIN = adafruit_pinout.D10
-    G_PIN = adafruit_pinout.D10
-    B_PIN = adafruit_pinout.D10
+    R_PIN = _LED_RGB_DATA_PIN
+    G_PIN = _LED_RGB_DATA_PIN
+    B_PIN = _LED_RGB_DATA_PIN
+
+# Simulation backend configuration, rates can be overridden with MOOVING_IOT_SIM_* variables.
+class SIM:
+    SEED = int(os.environ.get('MOOVING_IOT_SIM_SEED', 0))
+    ACC_RATE_HZ = float(os.environ.get('MOOVING_IOT_SIM_ACC_RATE_HZ', 10))
+    ADC_RATE_HZ = float(os.environ.get('MOOVING_IOT_SIM_ADC_RATE_HZ', 10))
+    GNSS_RATE_HZ = float(os.environ.get('MOOVING_IOT_SIM_GNSS_RATE_HZ', 1))
+
+# Sensor trace configuration.
+class TRACE:
+    # Trace file to record accelerometer, ADC and NMEA data to, recording is disabled if None.
+    RECORD_FILE = os.environ.get('MOOVING_IOT_TRACE_RECORD', None)
+    # Trace file used by the replay backend.
+    REPLAY_FILE = os.environ.get('MOOVING_IOT_TRACE_REPLAY', None)
+    # Replay speed factor, 1.0 is the original speed.
+    REPLAY_SPEED = float(os.environ.get('MOOVING_IOT_TRACE_REPLAY_SPEED', 1.0))
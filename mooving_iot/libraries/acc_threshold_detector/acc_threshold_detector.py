@@ -3,17 +3,28 @@
 #***************************************************************************************************
 # Global imports
 import os
+import time
 import threading
 import math
-import time
+import itertools
 import traceback
 
+# NumPy is optional, batches are processed with plain Python if it is not installed.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 # Project imports
 import mooving_iot.utils.logger as logger
 import mooving_iot.project_config as prj_cfg
 import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.clock as clock
+import mooving_iot.utils.metrics as metrics
 
 import mooving_iot.drivers.acc.acc as drv_acc
+import mooving_iot.libraries.ring_buffer.ring_buffer as lib_ring_buffer
+import mooving_iot.libraries.event_bus.event_bus as lib_event_bus
 
 
 #***************************************************************************************************
@@ -22,6 +33,19 @@ import mooving_iot.drivers.acc.acc as drv_acc
 _log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.INFO)
 
 
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+# Smaller batches are processed with plain Python, NumPy call overhead is higher than its gain.
+_NUMPY_MIN_BATCH_SIZE = 64
+# np.arcsin() may differ from math.asin() in the last bits, angles closer than this to the
+# threshold limits are rechecked with the scalar formula to get the same results as update().
+_ANGLE_LIMIT_EPSILON = 1e-6
+# Default samples history size and rolling statistics windows, samples.
+_DEFAULT_HISTORY_SIZE = 1024
+_DEFAULT_STATS_WINDOWS = (10, 100)
+
+
 #***************************************************************************************************
 # Public classes
 #***************************************************************************************************
@@ -35,15 +59,43 @@ class AccAngles:
         return 'X: {0:.2f}, Y: {0:.2f}, Z: {0:.2f}.'.format(self.x, self.y, self.z)
 
 
+class AccAxisStats:
+    def __init__(self, mean, variance, rms, peak):
+        self.mean = mean
+        self.variance = variance
+        self.rms = rms
+        self.peak = peak
+
+
+class AccStats:
+    def __init__(self, x : AccAxisStats, y : AccAxisStats, z : AccAxisStats):
+        self.x = x
+        self.y = y
+        self.z = z
+
+
 class AccThresholdDetector:
     DEFAULT_ACC_ANGLE_X = -50
     DEFAULT_ACC_ANGLE_Y = 0
     DEFAULT_ACC_ANGLE_Z = 40
-    def __init__(self, acc_driver : drv_acc.Acc):
+    # start_thread=False leaves sample processing to update() calls, e.g. for offline trace replay.
+    # batch_mode=True processes sample blocks from the driver batch listener instead of the last
+    # driver sample, so no samples are skipped at high output data rates.
+    # history_size is the number of kept samples, stats_windows are the rolling statistics window
+    # sizes in samples. Sample updates are published to event_bus, the process wide bus if None.
+    def __init__(self, acc_driver : drv_acc.Acc, start_thread=True, batch_mode=False,
+        history_size=_DEFAULT_HISTORY_SIZE, stats_windows=_DEFAULT_STATS_WINDOWS,
+        event_bus : lib_event_bus.EventBus=None
+    ):
         self._acc_driver = acc_driver
         self._last_acc_data = drv_acc.AccData(0, 0, 0)
         self._acc_angles = AccAngles(0, 0, 0)
 
+        self._history = [lib_ring_buffer.RingBuffer(history_size, 'h') for _ in range(3)]
+        self._stats = {
+            window : [lib_ring_buffer.RollingStats(window, 'h') for _ in range(3)]
+            for window in stats_windows}
+
         self._acc_out_of_thr_peak_count = 0
         self._acc_out_of_thr_start_time_ms = 0
         self._is_acc_out_of_thr = False
@@ -57,9 +109,21 @@ class AccThresholdDetector:
         self._angle_threshold_degree = None
         self._angle_total_duration_ms = None
 
+        self._event_bus = (lib_event_bus.EventBus.get_instance() if event_bus == None
+            else event_bus)
+
+        self._samples_metric = metrics.counter(
+            'acc_samples_total', 'Accelerometer samples processed by threshold detectors.')
+        self._update_time_metric = metrics.histogram(
+            'acc_update_seconds', 'Accelerometer sample or batch processing time.')
+
         self._data_lock = threading.Lock()
-        self._update_thread = threading.Thread(target=self._update)
-        self._update_thread.start()
+        self._update_thread = None
+        if batch_mode:
+            acc_driver.set_batch_listener(self._on_batch)
+        elif start_thread:
+            self._update_thread = threading.Thread(target=self._update_thread_func)
+            self._update_thread.start()
 
     def set_acc_threshold(self, threshold_mg, peak_duration_ms, total_duration_ms, peak_count):
         with self._data_lock:
@@ -79,7 +143,7 @@ class AccThresholdDetector:
     def is_acc_out_of_threshold(self) -> bool:
         with self._data_lock:
             if self._acc_peak_count != None:
-                current_time_ms = int(time.time() * 1000)
+                current_time_ms = clock.time_ms()
                 end_time_ms = self._acc_out_of_thr_start_time_ms + self._acc_total_duration_ms
 
                 if current_time_ms > end_time_ms:
@@ -97,73 +161,171 @@ class AccThresholdDetector:
                 (self._angle_total_duration_ms == None)):
                 return False
             else:
-                current_time_ms = int(time.time() * 1000)
+                current_time_ms = clock.time_ms()
                 return ((self._angle_out_of_thr_start_time_ms + self._angle_total_duration_ms)
                     <= current_time_ms)
 
+    # Returns copies of the last count samples (all kept samples if None) as x, y, z arrays of mg
+    # values, oldest first.
+    def get_history(self, count=None):
+        with self._data_lock:
+            return tuple(axis.get_last(count) for axis in self._history)
+
+    # Returns rolling statistics of the last window samples, window should be one of stats_windows.
+    def get_stats(self, window) -> AccStats:
+        with self._data_lock:
+            return AccStats(*[
+                AccAxisStats(
+                    axis.get_mean(), axis.get_variance(), axis.get_rms(), axis.get_peak())
+                for axis in self._stats[window]])
+
     def clear(self):
         with self._data_lock:
             self._angle_out_of_thr_start_time_ms = None
             self._acc_out_of_thr_peak_count = 0
 
-    def _update(self):
+    # Processes the last accelerometer driver sample.
+    def update(self):
+        start_time = time.perf_counter()
+        with self._data_lock:
+            was_detection_pending = self._is_detection_pending()
+            self._last_acc_data = self._acc_driver.get_last_data()
+            is_acc_data_threshold = self._acc_driver.is_acc_out_of_threshold()
+            current_time_ms = clock.time_ms()
+
+            _log.debug(
+                'Acc data updated: x = %s mg, y = %s mg, z = %s mg. Out of threshold: %s.',
+                self._last_acc_data.x_mg,
+                self._last_acc_data.y_mg,
+                self._last_acc_data.z_mg,
+                is_acc_data_threshold)
+
+            self._add_to_history(
+                (self._last_acc_data.x_mg, self._last_acc_data.y_mg, self._last_acc_data.z_mg))
+            self._calculate_angles()
+
+            _log.debug(
+                'Acc angles updated: x = %s, y = %s, z = %s.',
+                self._acc_angles.x,
+                self._acc_angles.y,
+                self._acc_angles.z)
+
+            if self._calc_is_angles_out_of_thr():
+                self._angle_out_of_thr_stop_time_ms = None
+                if self._angle_out_of_thr_start_time_ms == None:
+                    self._angle_out_of_thr_start_time_ms = current_time_ms
+            else:
+                if self._angle_out_of_thr_stop_time_ms == None:
+                    self._angle_out_of_thr_stop_time_ms = current_time_ms
+                elif ((self._angle_out_of_thr_stop_time_ms + self._angle_total_duration_ms)
+                    <= current_time_ms):
+                    self._angle_out_of_thr_start_time_ms = None
+
+            if (self._acc_peak_count != None) and is_acc_data_threshold:
+                self._acc_out_of_thr_peak_count += 1
+
+            is_detection_pending = self._is_detection_pending()
+
+        self._samples_metric.inc()
+        self._update_time_metric.observe(time.perf_counter() - start_time)
+        if was_detection_pending or is_detection_pending:
+            self._event_bus.publish(lib_event_bus.SENSOR_TOPIC.ACC)
+
+    # Processes a block of samples, results are the same as update() called for every sample at
+    # its sample time. is_out_of_threshold is either the driver flag for the whole batch (counted as
+    # one peak, like one update() call) or a sequence of per sample flags.
+    def update_batch(self, batch : drv_acc.AccDataBatch, is_out_of_threshold):
+        start_time = time.perf_counter()
+        samples_count = len(batch)
+        if samples_count == 0:
+            return
+
+        timestamp = batch.timestamp
+        sample_period = 0 if batch.rate_hz == None else 1.0 / batch.rate_hz
+
+        def sample_time_ms(index):
+            return int((timestamp - (samples_count - 1 - index) * sample_period) * 1000)
+
+        use_numpy = (np != None) and (samples_count >= _NUMPY_MIN_BATCH_SIZE)
+        x_angles, y_angles, z_angles = _calculate_angles_batch(batch, use_numpy)
+
+        with self._data_lock:
+            was_detection_pending = self._is_detection_pending()
+            self._last_acc_data = drv_acc.AccData(
+                batch.x_mg[-1], batch.y_mg[-1], batch.z_mg[-1])
+            self._acc_angles = _calculate_angles(self._last_acc_data)
+            for axis, values in enumerate((batch.x_mg, batch.y_mg, batch.z_mg)):
+                self._history[axis].extend(values)
+                for stats in self._stats.values():
+                    stats[axis].extend(values)
+
+            _log.debug('Acc batch updated: %d samples, last angles: x = %s, y = %s, z = %s.',
+                samples_count, self._acc_angles.x, self._acc_angles.y, self._acc_angles.z)
+
+            # Angles state only changes on the first samples of runs of equal out of threshold
+            # values and the start time reset condition is monotonic inside a run.
+            out_of_thr = self._calc_is_angles_out_of_thr_batch(
+                batch, x_angles, y_angles, z_angles, use_numpy)
+            for start, end, is_out in _get_runs(out_of_thr, samples_count, use_numpy):
+                if is_out:
+                    self._angle_out_of_thr_stop_time_ms = None
+                    if self._angle_out_of_thr_start_time_ms == None:
+                        self._angle_out_of_thr_start_time_ms = sample_time_ms(start)
+                else:
+                    if self._angle_out_of_thr_stop_time_ms == None:
+                        self._angle_out_of_thr_stop_time_ms = sample_time_ms(start)
+                        start += 1
+                    if ((start < end) and (self._angle_total_duration_ms != None)
+                        and ((self._angle_out_of_thr_stop_time_ms + self._angle_total_duration_ms)
+                        <= sample_time_ms(end - 1))
+                    ):
+                        self._angle_out_of_thr_start_time_ms = None
+
+            if self._acc_peak_count != None:
+                if isinstance(is_out_of_threshold, bool):
+                    if is_out_of_threshold:
+                        self._acc_out_of_thr_peak_count += 1
+                else:
+                    self._acc_out_of_thr_peak_count += int(sum(is_out_of_threshold))
+
+            is_detection_pending = self._is_detection_pending()
+
+        self._samples_metric.inc(samples_count)
+        self._update_time_metric.observe(time.perf_counter() - start_time)
+        if was_detection_pending or is_detection_pending:
+            self._event_bus.publish(lib_event_bus.SENSOR_TOPIC.ACC)
+
+    def _on_batch(self, batch : drv_acc.AccDataBatch):
+        self.update_batch(batch, self._acc_driver.is_acc_out_of_threshold())
+
+    def _update_thread_func(self):
         try:
             acc_data_updated = self._acc_driver.get_data_updated_event()
 
             while True:
                 acc_data_updated.wait()
                 acc_data_updated.clear()
-                with self._data_lock:
-                    self._last_acc_data = self._acc_driver.get_last_data()
-                    is_acc_data_threshold = self._acc_driver.is_acc_out_of_threshold()
-                    current_time_ms = int(time.time() * 1000)
-
-                    _log.debug(
-                        'Acc data updated: x = {x} mg, y = {y} mg, z = {z} mg. Out of threshold: {thr}.'
-                        .format(
-                            x=self._last_acc_data.x_mg,
-                            y=self._last_acc_data.y_mg,
-                            z=self._last_acc_data.z_mg,
-                            thr=is_acc_data_threshold))
-
-                    self._calculate_angles()
-
-                    _log.debug(
-                        'Acc angles updated: x = {x}, y = {y}, z = {z}.'
-                        .format(
-                            x=self._acc_angles.x,
-                            y=self._acc_angles.y,
-                            z=self._acc_angles.z))
-
-                    if self._calc_is_angles_out_of_thr():
-                        self._angle_out_of_thr_stop_time_ms = None
-                        if self._angle_out_of_thr_start_time_ms == None:
-                            self._angle_out_of_thr_start_time_ms = current_time_ms
-                    else:
-                        if self._angle_out_of_thr_stop_time_ms == None:
-                            self._angle_out_of_thr_stop_time_ms = current_time_ms
-                        elif ((self._angle_out_of_thr_stop_time_ms + self._angle_total_duration_ms)
-                            <= current_time_ms):
-                            self._angle_out_of_thr_start_time_ms = None
-
-                    if (self._acc_peak_count != None) and is_acc_data_threshold:
-                        self._acc_out_of_thr_peak_count += 1
+                self.update()
         except:
             _log.error(traceback.format_exc())
             utils_exit.exit(1)
 
-    def _calculate_angles(self):
-        x_pow2 = self._last_acc_data.x_mg ** 2
-        y_pow2 = self._last_acc_data.y_mg ** 2
-        z_pow2 = self._last_acc_data.z_mg ** 2
-
-        g_vector_length = math.sqrt(x_pow2 + y_pow2 + z_pow2)
+    # Samples are published on the event bus only while peaks are counted, movement is detected or
+    # angles are out of threshold, and once after that, so a parked device does not wake the
+    # detection on every sample. Should be called with the data lock acquired.
+    def _is_detection_pending(self) -> bool:
+        return ((self._acc_out_of_thr_peak_count > 0) or self._is_acc_out_of_thr
+            or (self._angle_out_of_thr_start_time_ms != None))
 
-        x_angle = math.degrees(math.asin(self._last_acc_data.x_mg / g_vector_length))
-        y_angle = math.degrees(math.asin(self._last_acc_data.y_mg / g_vector_length))
-        z_angle = math.degrees(math.asin(self._last_acc_data.z_mg / g_vector_length))
+    # values: x, y, z sample, should be called with the data lock acquired.
+    def _add_to_history(self, values):
+        for axis, value in enumerate(values):
+            self._history[axis].append(value)
+            for stats in self._stats.values():
+                stats[axis].add(value)
 
-        self._acc_angles = AccAngles(x_angle, y_angle, z_angle)
+    def _calculate_angles(self):
+        self._acc_angles = _calculate_angles(self._last_acc_data)
 
     def _calc_is_angles_out_of_thr(self):
         if (self._angle_threshold_degree == None):
@@ -186,3 +348,98 @@ class AccThresholdDetector:
             return False
         else:
             return True
+
+    # Same as _calc_is_angles_out_of_thr() for every sample, returns a sequence of bools.
+    def _calc_is_angles_out_of_thr_batch(self, batch : drv_acc.AccDataBatch,
+        x_angles, y_angles, z_angles, use_numpy):
+        if (self._angle_threshold_degree == None):
+            return [False] * len(x_angles)
+
+        threshold = self._angle_threshold_degree
+        x_min = AccThresholdDetector.DEFAULT_ACC_ANGLE_X - threshold
+        x_max = AccThresholdDetector.DEFAULT_ACC_ANGLE_X + threshold
+        y_min = AccThresholdDetector.DEFAULT_ACC_ANGLE_Y - threshold
+        y_max = AccThresholdDetector.DEFAULT_ACC_ANGLE_Y + threshold
+        z_min = AccThresholdDetector.DEFAULT_ACC_ANGLE_Z - threshold
+        z_max = AccThresholdDetector.DEFAULT_ACC_ANGLE_Z + threshold
+
+        if use_numpy:
+            in_range = (
+                (x_min <= x_angles) & (x_angles <= x_max)
+                & (y_min <= y_angles) & (y_angles <= y_max)
+                & (z_min <= z_angles) & (z_angles <= z_max))
+
+            near_limit = np.zeros(len(batch), dtype=bool)
+            for angles, limit in (
+                (x_angles, x_min), (x_angles, x_max), (y_angles, y_min),
+                (y_angles, y_max), (z_angles, z_min), (z_angles, z_max)
+            ):
+                near_limit |= np.abs(angles - limit) < _ANGLE_LIMIT_EPSILON
+            for index in np.flatnonzero(near_limit).tolist():
+                angles = _calculate_angles(
+                    drv_acc.AccData(batch.x_mg[index], batch.y_mg[index], batch.z_mg[index]))
+                in_range[index] = ((x_min <= angles.x <= x_max)
+                    and (y_min <= angles.y <= y_max) and (z_min <= angles.z <= z_max))
+
+            return ~in_range
+
+        return [
+            not ((x_min <= x <= x_max) and (y_min <= y <= y_max) and (z_min <= z <= z_max))
+            for x, y, z in zip(x_angles, y_angles, z_angles)]
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _calculate_angles(acc_data : drv_acc.AccData) -> AccAngles:
+    x_pow2 = acc_data.x_mg ** 2
+    y_pow2 = acc_data.y_mg ** 2
+    z_pow2 = acc_data.z_mg ** 2
+
+    g_vector_length = math.sqrt(x_pow2 + y_pow2 + z_pow2)
+
+    x_angle = math.degrees(math.asin(acc_data.x_mg / g_vector_length))
+    y_angle = math.degrees(math.asin(acc_data.y_mg / g_vector_length))
+    z_angle = math.degrees(math.asin(acc_data.z_mg / g_vector_length))
+
+    return AccAngles(x_angle, y_angle, z_angle)
+
+
+# Tilt angles of every batch sample, same formula as _calculate_angles().
+def _calculate_angles_batch(batch : drv_acc.AccDataBatch, use_numpy):
+    if use_numpy:
+        x_mg = np.asarray(batch.x_mg, dtype=np.float64)
+        y_mg = np.asarray(batch.y_mg, dtype=np.float64)
+        z_mg = np.asarray(batch.z_mg, dtype=np.float64)
+        g_vector_length = np.sqrt(x_mg ** 2 + y_mg ** 2 + z_mg ** 2)
+        return (
+            np.degrees(np.arcsin(x_mg / g_vector_length)),
+            np.degrees(np.arcsin(y_mg / g_vector_length)),
+            np.degrees(np.arcsin(z_mg / g_vector_length)))
+
+    x_angles = []
+    y_angles = []
+    z_angles = []
+    for x, y, z in zip(batch.x_mg, batch.y_mg, batch.z_mg):
+        g_vector_length = math.sqrt(x ** 2 + y ** 2 + z ** 2)
+        x_angles.append(math.degrees(math.asin(x / g_vector_length)))
+        y_angles.append(math.degrees(math.asin(y / g_vector_length)))
+        z_angles.append(math.degrees(math.asin(z / g_vector_length)))
+    return x_angles, y_angles, z_angles
+
+
+# Splits a sequence of bools into (start, end, value) runs of equal values.
+def _get_runs(values, length, use_numpy) -> list:
+    if use_numpy:
+        values = np.asarray(values, dtype=bool)
+        starts = [0] + (np.flatnonzero(values[1:] != values[:-1]) + 1).tolist()
+        ends = starts[1:] + [length]
+        return [(start, end, bool(values[start])) for start, end in zip(starts, ends)]
+
+    runs = []
+    start = 0
+    for value, group in itertools.groupby(values):
+        end = start + len(list(group))
+        runs.append((start, end, value))
+        start = end
+    return runs
@@ -3,6 +3,7 @@
 #***************************************************************************************************
 # Global imports
 import os
+import asyncio
 import threading
 import traceback
 import math
@@ -14,6 +15,7 @@ from typing import Union
 import mooving_iot.project_config as prj_cfg
 import mooving_iot.utils.exit as utils_exit
 import mooving_iot.utils.logger as logger
+import mooving_iot.utils.aio as aio
 
 import mooving_iot.drivers.buzzer.buzzer as drv_buzzer
 
@@ -114,6 +116,8 @@ class BUZZER_PATTERN_ID(enum.IntEnum):
     ALARM_PHASE_3 = 6
 
 
+# With loop patterns are sent from a task of the asyncio runtime loop instead of a thread, methods
+# should be called from the loop thread then.
 class BuzzerPatternGenerator:
     _PATTERNS_TABLE = {
         BUZZER_PATTERN_ID.ALARM: _alarm_pattern,
@@ -125,14 +129,16 @@ class BuzzerPatternGenerator:
         BUZZER_PATTERN_ID.ALARM_PHASE_3: _alarm_pattern_phase_3
     }
 
-    def __init__(self, buzzer_driver : drv_buzzer.Buzzer):
+    def __init__(self, buzzer_driver : drv_buzzer.Buzzer, loop : asyncio.AbstractEventLoop=None):
         self._buzzer_driver = buzzer_driver
+        self._loop = loop
         self._pattern_repeate_count = 0
         self._current_pattern = None
         self._current_pattern_volume = 0
 
         self._pattern_thread : Union[threading.Thread, None] = None
         self._pattern_thread_stop = False
+        self._pattern_task : Union[asyncio.Task, None] = None
 
     def start_pattern(self, pattern_id, volume=None, repeate_count=0):
         self.stop_pattern()
@@ -146,7 +152,11 @@ class BuzzerPatternGenerator:
         if self._current_pattern == None:
             return
 
-        _log.debug('Start buzzer pattern with ID: {}.'.format(pattern_id))
+        _log.debug('Start buzzer pattern with ID: %s.', pattern_id)
+
+        if self._loop != None:
+            self._pattern_task = self._loop.create_task(self._event_send_task())
+            return
 
         self._pattern_thread = threading.Thread(target=self._event_send_thread)
         self._pattern_thread_stop = False
@@ -156,6 +166,9 @@ class BuzzerPatternGenerator:
         _log.debug('Stop buzzer pattern.')
 
         self._pattern_thread_stop = True
+        if self._pattern_task != None:
+            self._pattern_task.cancel()
+            self._pattern_task = None
         self._buzzer_driver.clear_all_events()
         if (self._pattern_thread != None) and self._pattern_thread.is_alive():
             self._pattern_thread.join()
@@ -164,14 +177,7 @@ class BuzzerPatternGenerator:
         try:
             while True:
                 for event in self._current_pattern:
-                    duty_cycle = _DUTY_CYCLE_OFF
-                    if event.duty_cycle != _DUTY_CYCLE_OFF:
-                        if self._current_pattern_volume != None:
-                            duty_cycle = self._current_pattern_volume / 2.0
-                        else:
-                            duty_cycle = event.duty_cycle
-                    event_copy = drv_buzzer.BuzzerEvent(duty_cycle, event.time, event.frequency)
-                    self._buzzer_driver.set_event(event_copy)
+                    self._buzzer_driver.set_event(self._get_event(event))
 
                 self._pattern_repeate_count -= 1
                 if self._pattern_repeate_count < 0:
@@ -181,3 +187,29 @@ class BuzzerPatternGenerator:
         except:
             _log.error(traceback.format_exc())
             utils_exit.exit(1)
+
+    # Events are paced by the task, so the driver queue never fills and set_event() does not block.
+    async def _event_send_task(self):
+        try:
+            while True:
+                for event in self._current_pattern:
+                    self._buzzer_driver.set_event(self._get_event(event))
+                    await aio.sleep(event.time)
+
+                self._pattern_repeate_count -= 1
+                if self._pattern_repeate_count < 0:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
+
+    def _get_event(self, event : drv_buzzer.BuzzerEvent) -> drv_buzzer.BuzzerEvent:
+        duty_cycle = _DUTY_CYCLE_OFF
+        if event.duty_cycle != _DUTY_CYCLE_OFF:
+            if self._current_pattern_volume != None:
+                duty_cycle = self._current_pattern_volume / 2.0
+            else:
+                duty_cycle = event.duty_cycle
+        return drv_buzzer.BuzzerEvent(duty_cycle, event.time, event.frequency)
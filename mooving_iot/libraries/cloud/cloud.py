@@ -9,6 +9,7 @@ import paho.mqtt.client as mqtt
 # Local packages imports
 import mooving_iot.utils.logger as logger
 import mooving_iot.project_config as prj_cfg
+import mooving_iot.libraries.cloud.connection_manager as connection_manager
 
 
 #***************************************************************************************************
@@ -47,6 +48,57 @@ class CloudConnectionParameters:
         )
 
 
+# Telemetry delivery counters. A message is delivered when the broker acknowledges it (PUBACK)
+# with qos 1, or when it is written to the socket with qos 0. Dropped messages were accepted but
+# lost on disconnect, rejected ones were refused (in-flight window full or client error) and stay
+# with the sender. Retried counts retransmissions after reconnect. Ack latencies are seconds.
+class DeliveryStats:
+    def __init__(self,
+        published=0, delivered=0, dropped=0, retried=0, rejected=0, inflight=0,
+        ack_latency_p50=0.0, ack_latency_p99=0.0
+    ):
+        self.published = published
+        self.delivered = delivered
+        self.dropped = dropped
+        self.retried = retried
+        self.rejected = rejected
+        self.inflight = inflight
+        self.ack_latency_p50 = ack_latency_p50
+        self.ack_latency_p99 = ack_latency_p99
+
+    def __str__(self):
+        return (
+            'published: {}, delivered: {}, dropped: {}, retried: {}, rejected: {}, inflight: {}, '
+                .format(self.published, self.delivered, self.dropped, self.retried,
+                    self.rejected, self.inflight)
+            + 'ack latency p50: {:.1f} ms, p99: {:.1f} ms.'
+                .format(1000 * self.ack_latency_p50, 1000 * self.ack_latency_p99)
+        )
+
+
+# Connection counters, downtime is the time from disconnect to the next successful connect, seconds.
+# Rollovers are reconnects made to switch to a new authentication token.
+class ConnectionStats:
+    def __init__(self,
+        reconnects=0, failed_attempts=0, rollovers=0,
+        last_downtime=0.0, max_downtime=0.0, total_downtime=0.0
+    ):
+        self.reconnects = reconnects
+        self.failed_attempts = failed_attempts
+        self.rollovers = rollovers
+        self.last_downtime = last_downtime
+        self.max_downtime = max_downtime
+        self.total_downtime = total_downtime
+
+    def __str__(self):
+        return (
+            'reconnects: {}, failed attempts: {}, rollovers: {}, '
+                .format(self.reconnects, self.failed_attempts, self.rollovers)
+            + 'downtime last: {:.3f} s, max: {:.3f} s, total: {:.3f} s.'
+                .format(self.last_downtime, self.max_downtime, self.total_downtime)
+        )
+
+
 class CloudImplementationBase:
     def __init__(self, cloud_conn_params: CloudConnectionParameters):
         self._cloud_conn_params = cloud_conn_params
@@ -65,9 +117,41 @@ class CloudImplementationBase:
     def wait_for_configuration(self) -> str:
         raise NotImplementedError
 
+    # Commands are passed to callback(cmd_json) instead of wait_for_command() queue.
+    def set_command_listener(self, callback):
+        raise NotImplementedError
+
+    # Configurations are passed to callback(cfg_json) instead of wait_for_configuration() queue.
+    def set_configuration_listener(self, callback):
+        raise NotImplementedError
+
     def send_event(self, payload) -> int:
         raise NotImplementedError
 
+    # Sends several payloads in one message.
+    def send_events(self, payloads : list) -> int:
+        raise NotImplementedError
+
+    def is_connected(self) -> bool:
+        raise NotImplementedError
+
+    # callback(is_connected) is called from the network thread when the connection state changes.
+    def set_connection_listener(self, callback):
+        raise NotImplementedError
+
+    def get_connection_state(self) -> connection_manager.CONNECTION_STATE:
+        raise NotImplementedError
+
+    # callback(state) is called from the network thread on every connection state change.
+    def set_connection_state_listener(self, callback):
+        raise NotImplementedError
+
+    def get_connection_stats(self) -> ConnectionStats:
+        raise NotImplementedError
+
+    def get_delivery_stats(self) -> DeliveryStats:
+        raise NotImplementedError
+
 
 class Cloud:
     def __init__(self,
@@ -93,5 +177,32 @@ class Cloud:
     def wait_for_configuration(self) -> str:
         return self._cloud_impl.wait_for_configuration()
 
+    def set_command_listener(self, callback):
+        self._cloud_impl.set_command_listener(callback)
+
+    def set_configuration_listener(self, callback):
+        self._cloud_impl.set_configuration_listener(callback)
+
     def send_event(self, payload) -> int:
         return self._cloud_impl.send_event(payload)
+
+    def send_events(self, payloads : list) -> int:
+        return self._cloud_impl.send_events(payloads)
+
+    def is_connected(self) -> bool:
+        return self._cloud_impl.is_connected()
+
+    def set_connection_listener(self, callback):
+        self._cloud_impl.set_connection_listener(callback)
+
+    def get_connection_state(self) -> connection_manager.CONNECTION_STATE:
+        return self._cloud_impl.get_connection_state()
+
+    def set_connection_state_listener(self, callback):
+        self._cloud_impl.set_connection_state_listener(callback)
+
+    def get_connection_stats(self) -> ConnectionStats:
+        return self._cloud_impl.get_connection_stats()
+
+    def get_delivery_stats(self) -> DeliveryStats:
+        return self._cloud_impl.get_delivery_stats()
@@ -5,8 +5,20 @@
 import os
 import datetime
 import json
+import math
+import struct
 from typing import Union
 
+# CBOR and MessagePack encoders are optional
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 # Project imports
 import mooving_iot.utils.logger as logger
 import mooving_iot.project_config as prj_cfg
@@ -18,6 +30,37 @@ import mooving_iot.project_config as prj_cfg
 _log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
 
 
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+_STRUCT_FORMAT_VERSION = 1
+# Batch header: format version, packets count, device ID length. Device ID follows the header.
+_STRUCT_HEADER = struct.Struct('<BBB')
+# Packet: timestamp (s, ms), interval (s), batteries voltages (mV), flags, latitude and longitude
+# (1e-7 degree), altitude (cm), heading (0.01 degree), state, events count. Events follow it.
+_STRUCT_PACKET = struct.Struct('<IHHHHBiiiHBB')
+# Event: event type, event value.
+_STRUCT_EVENT = struct.Struct('<Bf')
+_STRUCT_FLAG_CHARGING = 0x01
+_STRUCT_FLAG_ALARM = 0x02
+_STRUCT_INT32_UNKNOWN = -0x80000000
+_STRUCT_UINT16_UNKNOWN = 0xFFFF
+_STRUCT_UINT8_UNKNOWN = 0xFF
+_STRUCT_STATES = {'lock': 0, 'unlock': 1, 'unavailable': 2}
+# Event map key to event type, the value is converted to float.
+_STRUCT_EVENTS = {
+    'type': 1,
+    'charging': 2,
+    'accMoving': 3,
+    'gnssMoving': 4,
+    'accFall': 5,
+    'batteryVoltage': 6,
+    'internalBatteryVoltage': 7}
+# Map values which are sent as strings for the JSON backend.
+_BOOL_KEYS = ('charging', 'alarm', 'accMoving', 'gnssMoving', 'accFall')
+_NUMBER_KEYS = ('latitude', 'longitude', 'altitude', 'heading')
+
+
 #***************************************************************************************************
 # Public classes
 #***************************************************************************************************
@@ -109,11 +152,23 @@ class IntBattEvent(Event):
         }
 
 
+# Compact metrics map, see metrics.MetricsRegistry.get_compact_map().
+class MetricsEvent(Event):
+    def __init__(self, metrics_map : dict):
+        self._metrics_map = metrics_map
+
+    def to_map(self) -> dict:
+        return {
+            'metrics': self._metrics_map
+        }
+
+
+# With events the packet carries an 'events' array instead of a single 'event'.
 class TelemetryPacket:
     def __init__(self,
         device_id, interval, ext_batt, int_batt, ext_batt_charging,
         longtitude, latitude, altitude, heading, alarm, state,
-        event : Event=EmptyEvent()):
+        event : Event=EmptyEvent(), events : list=None):
         self._device_id = device_id
         self._interval = interval
         self._ext_batt = ext_batt
@@ -126,13 +181,14 @@ class TelemetryPacket:
         self._alarm = alarm
         self._state = state
         self._event = event
+        self._events = events
         self._timestamp_utc = datetime.datetime.utcnow().isoformat()
 
     def __str__(self) -> str:
         return str(self.to_map())
 
     def to_map(self) -> dict:
-        return {
+        packet_map = {
             'deviceId': self._device_id,
             'interval': self._interval,
             'timestamp': self._timestamp_utc,
@@ -144,8 +200,38 @@ class TelemetryPacket:
             'altitude': self._altitude,
             'heading': self._heading,
             'alarm': 'true' if self._alarm else 'false',
-            'state': self._state,
-            'event': self._event.to_map()
+            'state': self._state
+        }
+        if self._events != None:
+            packet_map['events'] = [event.to_map() for event in self._events]
+        else:
+            packet_map['event'] = self._event.to_map()
+        return packet_map
+
+
+# Result of the 'profile' command, stacks are collapsed stack lines 'thread;frame;...;frame count'.
+class ProfilePacket:
+    def __init__(self, device_id, duration, samples, overhead, stacks : list):
+        self._device_id = device_id
+        self._duration = duration
+        self._samples = samples
+        self._overhead = overhead
+        self._stacks = stacks
+        self._timestamp_utc = datetime.datetime.utcnow().isoformat()
+
+    def __str__(self) -> str:
+        return str(self.to_map())
+
+    def to_map(self) -> dict:
+        return {
+            'deviceId': self._device_id,
+            'timestamp': self._timestamp_utc,
+            'profile': {
+                'duration': round(self._duration, 3),
+                'samples': self._samples,
+                'overhead': round(self._overhead, 4),
+                'stacks': self._stacks
+            }
         }
 
 
@@ -174,6 +260,14 @@ class CommandPacket:
             elif self._cmd_dict['command'] == 'set-intervals':
                 if 'states' in self._cmd_dict:
                     self._is_valid = True
+            elif self._cmd_dict['command'] == 'profile':
+                duration = self._cmd_dict.get('duration')
+                threads = self._cmd_dict.get('threads', [])
+                if (isinstance(duration, (int, float)) and not isinstance(duration, bool)
+                    and (0 < duration <= prj_cfg.PROFILER_MAX_DURATION)
+                    and isinstance(threads, list)
+                    and all(isinstance(name, str) for name in threads)):
+                    self._is_valid = True
 
 
     def is_valid(self) -> bool:
@@ -184,3 +278,202 @@ class CommandPacket:
             return self._cmd_dict
 
         return None
+
+
+# Serializes telemetry maps (TelemetryPacket.to_map()) for the cloud. encode_batch() packs several
+# maps into one message.
+class PayloadEncoderBase:
+    def get_name(self) -> str:
+        raise NotImplementedError
+
+    def encode(self, payload : dict) -> bytes:
+        raise NotImplementedError
+
+    def encode_batch(self, payloads : list) -> bytes:
+        raise NotImplementedError
+
+
+# JSON without whitespace, a batch is a JSON array. With native_types booleans and coordinates are
+# sent as JSON booleans and numbers instead of strings.
+class JsonEncoder(PayloadEncoderBase):
+    def __init__(self, native_types=False, indent=None):
+        self._native_types = native_types
+        self._indent = indent
+        self._separators = None if indent != None else (',', ':')
+
+    def get_name(self) -> str:
+        return 'json-native' if self._native_types else 'json'
+
+    def encode(self, payload : dict) -> bytes:
+        if self._native_types:
+            payload = get_native_map(payload)
+        return json.dumps(
+            payload, indent=self._indent, separators=self._separators).encode('utf-8')
+
+    def encode_batch(self, payloads : list) -> bytes:
+        if self._native_types:
+            payloads = [get_native_map(payload) for payload in payloads]
+        return json.dumps(
+            payloads, indent=self._indent, separators=self._separators).encode('utf-8')
+
+
+# CBOR (RFC 7049) with native types, a batch is an array. Requires cbor2 package.
+class CborEncoder(PayloadEncoderBase):
+    def __init__(self):
+        if cbor2 == None:
+            raise RuntimeError('CBOR encoder requires cbor2 package.')
+
+    def get_name(self) -> str:
+        return 'cbor'
+
+    def encode(self, payload : dict) -> bytes:
+        return cbor2.dumps(get_native_map(payload))
+
+    def encode_batch(self, payloads : list) -> bytes:
+        return cbor2.dumps([get_native_map(payload) for payload in payloads])
+
+
+# MessagePack with native types, a batch is an array. Requires msgpack package.
+class MsgpackEncoder(PayloadEncoderBase):
+    def __init__(self):
+        if msgpack == None:
+            raise RuntimeError('MessagePack encoder requires msgpack package.')
+
+    def get_name(self) -> str:
+        return 'msgpack'
+
+    def encode(self, payload : dict) -> bytes:
+        return msgpack.packb(get_native_map(payload), use_bin_type=True)
+
+    def encode_batch(self, payloads : list) -> bytes:
+        return msgpack.packb(
+            [get_native_map(payload) for payload in payloads], use_bin_type=True)
+
+
+# Little endian binary format, see _STRUCT_HEADER, _STRUCT_PACKET and _STRUCT_EVENT. A single
+# packet is a batch of one. Packets of a batch should have the same device ID, unknown values are
+# sent as the minimum int32 or maximum unsigned values.
+class StructEncoder(PayloadEncoderBase):
+    def get_name(self) -> str:
+        return 'struct'
+
+    def encode(self, payload : dict) -> bytes:
+        return self.encode_batch([payload])
+
+    def encode_batch(self, payloads : list) -> bytes:
+        if not (0 < len(payloads) <= 0xFF):
+            raise ValueError('Struct batch should have from 1 to 255 packets.')
+        if any('profile' in payload for payload in payloads):
+            raise ValueError('Struct format can not carry profiles.')
+
+        device_id = str(payloads[0].get('deviceId', '')).encode('utf-8')[:0xFF]
+        data = [_STRUCT_HEADER.pack(_STRUCT_FORMAT_VERSION, len(payloads), len(device_id)),
+            device_id]
+        for payload in payloads:
+            data.append(self._pack(payload))
+        return b''.join(data)
+
+    def _pack(self, payload : dict) -> bytes:
+        timestamp_s, timestamp_ms = divmod(
+            int(round(_get_timestamp(payload.get('timestamp')) * 1000)), 1000)
+        flags = 0
+        if _to_bool(payload.get('charging')):
+            flags |= _STRUCT_FLAG_CHARGING
+        if _to_bool(payload.get('alarm')):
+            flags |= _STRUCT_FLAG_ALARM
+
+        events = []
+        for event_map in payload.get('events', [payload.get('event', {})]):
+            for key, value in event_map.items():
+                # Nested maps, e.g. metrics, do not fit into the fixed event format.
+                if isinstance(value, dict):
+                    continue
+                if key == 'type':
+                    event_value = _STRUCT_STATES.get(value, _STRUCT_UINT8_UNKNOWN)
+                elif key in _BOOL_KEYS:
+                    event_value = 1.0 if _to_bool(value) else 0.0
+                else:
+                    event_value = _to_float(value, math.nan)
+                events.append(_STRUCT_EVENT.pack(
+                    _STRUCT_EVENTS.get(key, _STRUCT_UINT8_UNKNOWN), event_value))
+        events = events[:0xFF]
+
+        return _STRUCT_PACKET.pack(
+            timestamp_s, timestamp_ms,
+            _to_scaled_int(payload.get('interval'), 1, 0, _STRUCT_UINT16_UNKNOWN),
+            _to_scaled_int(payload.get('batteryVoltage'), 1000, 0, _STRUCT_UINT16_UNKNOWN),
+            _to_scaled_int(payload.get('internalBatteryVoltage'), 1000, 0, _STRUCT_UINT16_UNKNOWN),
+            flags,
+            _to_scaled_int(payload.get('latitude'), 1e7, -0x7FFFFFFF, _STRUCT_INT32_UNKNOWN),
+            _to_scaled_int(payload.get('longitude'), 1e7, -0x7FFFFFFF, _STRUCT_INT32_UNKNOWN),
+            _to_scaled_int(payload.get('altitude'), 100, -0x7FFFFFFF, _STRUCT_INT32_UNKNOWN),
+            _to_scaled_int(payload.get('heading'), 100, 0, _STRUCT_UINT16_UNKNOWN),
+            _STRUCT_STATES.get(payload.get('state'), _STRUCT_UINT8_UNKNOWN),
+            len(events)) + b''.join(events)
+
+
+#***************************************************************************************************
+# Public functions
+#***************************************************************************************************
+# Returns a copy of a telemetry map with 'true'/'false' strings as booleans and coordinates as
+# numbers (None if unknown).
+def get_native_map(payload : dict) -> dict:
+    native_map = dict(payload)
+    for key in _BOOL_KEYS:
+        if key in native_map:
+            native_map[key] = _to_bool(native_map[key])
+    for key in _NUMBER_KEYS:
+        if key in native_map:
+            native_map[key] = _to_float(native_map[key])
+    if isinstance(native_map.get('event'), dict):
+        native_map['event'] = get_native_map(native_map['event'])
+    if isinstance(native_map.get('events'), list):
+        native_map['events'] = [get_native_map(event_map) for event_map in native_map['events']]
+    return native_map
+
+
+# Encoders by name, the optional ones are only available with their packages.
+def get_encoder(name) -> PayloadEncoderBase:
+    encoders = {
+        'json': JsonEncoder,
+        'json-native': lambda: JsonEncoder(native_types=True),
+        'cbor': CborEncoder,
+        'msgpack': MsgpackEncoder,
+        'struct': StructEncoder}
+    if name not in encoders:
+        raise ValueError('Unknown payload encoder: {}.'.format(name))
+    return encoders[name]()
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _to_bool(value) -> bool:
+    if isinstance(value, str):
+        return value == 'true'
+    return bool(value)
+
+
+def _to_float(value, default=None):
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        return default
+    return result if math.isfinite(result) else default
+
+
+def _to_scaled_int(value, scale, min_value, unknown):
+    value = _to_float(value)
+    if value == None:
+        return unknown
+    max_value = unknown - 1 if unknown > 0 else 0x7FFFFFFF
+    return max(min_value, min(max_value, int(round(value * scale))))
+
+
+# TelemetryPacket timestamp is an ISO format UTC time without time zone.
+def _get_timestamp(timestamp) -> float:
+    try:
+        return datetime.datetime.fromisoformat(timestamp).replace(
+            tzinfo=datetime.timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
@@ -0,0 +1,235 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global packages imports
+import os
+import enum
+import time
+import random
+import threading
+import traceback
+
+# Local packages imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.project_config as prj_cfg
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+class CONNECTION_STATE(enum.Enum):
+    # Not started or stopped.
+    DISCONNECTED = 'disconnected'
+    # Connect request is sent, waiting for the broker acknowledgment.
+    CONNECTING = 'connecting'
+    CONNECTED = 'connected'
+    # Waiting for the next connection attempt.
+    BACKOFF = 'backoff'
+
+
+# Exponential backoff with full jitter: the delay before the attempt n is uniform in
+# [0, min(max_delay, min_delay * 2^n)], devices which lost the connection together spread their
+# reconnects over the whole delay. jitter=False gives plain exponential delays.
+class ReconnectBackoff:
+    def __init__(self, min_delay, max_delay, jitter=True, rng : random.Random=None):
+        if (min_delay <= 0) or (max_delay < min_delay):
+            raise ValueError('Reconnect delays should be positive, max delay not less than min.')
+
+        self._min_delay = min_delay
+        self._max_delay = max_delay
+        self._jitter = jitter
+        self._rng = random.Random() if rng == None else rng
+        self._delay = min_delay
+
+    def get_delay(self) -> float:
+        delay = self._delay
+        self._delay = min(self._max_delay, self._delay * 2)
+        return self._rng.uniform(0, delay) if self._jitter else delay
+
+    def reset(self):
+        self._delay = self._min_delay
+
+
+# Keeps a client connected: connects, runs the network loop while connected and reconnects with
+# backoff, all in its own thread. connect_func() sends a connect request and returns 0 on success,
+# loop_func() processes network traffic for a short time and returns non-zero when the connection
+# is lost, disconnect_func() requests a clean disconnect. The client calls on_connack() and
+# on_connection_lost() from its callbacks, possibly from other threads.
+class ConnectionManager:
+    _LOOP_TIMEOUT = 1.0
+
+    def __init__(self, connect_func, loop_func, disconnect_func,
+        backoff : ReconnectBackoff, connack_timeout=10.0
+    ):
+        self._connect_func = connect_func
+        self._loop_func = loop_func
+        self._disconnect_func = disconnect_func
+        self._backoff = backoff
+        self._connack_timeout = connack_timeout
+
+        self._lock = threading.Lock()
+        self._wakeup_event = threading.Event()
+        self._thread = None
+        self._state = CONNECTION_STATE.DISCONNECTED
+        self._state_listeners = []
+        self._stop_requested = False
+        self._reconnect_requested = False
+        self._next_attempt_time = 0
+        self._connack_deadline = 0
+
+        # Downtime is the time from connection loss to the next acknowledged connect, seconds.
+        self._disconnect_time = None
+        self._reconnect_count = 0
+        self._failed_attempt_count = 0
+        self._last_downtime = 0.0
+        self._max_downtime = 0.0
+        self._total_downtime = 0.0
+
+    def start(self):
+        if self._thread == None:
+            self._stop_requested = False
+            self._thread = threading.Thread(target=self._connection_thread, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_requested = True
+        if self._state == CONNECTION_STATE.CONNECTED:
+            self._disconnect_func()
+        self._wakeup_event.set()
+        if (self._thread != None) and (self._thread != threading.current_thread()):
+            self._thread.join()
+        self._thread = None
+        self._set_state(CONNECTION_STATE.DISCONNECTED)
+
+    # Disconnects and connects again without backoff, e.g. to renew credentials.
+    def reconnect(self):
+        if self._state == CONNECTION_STATE.CONNECTED:
+            self._reconnect_requested = True
+            self._disconnect_func()
+
+    def get_state(self) -> CONNECTION_STATE:
+        return self._state
+
+    # callback(state) is called on every state change.
+    def add_state_listener(self, callback):
+        self._state_listeners.append(callback)
+
+    def get_reconnect_count(self) -> int:
+        return self._reconnect_count
+
+    def get_failed_attempt_count(self) -> int:
+        return self._failed_attempt_count
+
+    def get_last_downtime(self) -> float:
+        return self._last_downtime
+
+    def get_max_downtime(self) -> float:
+        return self._max_downtime
+
+    def get_total_downtime(self) -> float:
+        return self._total_downtime
+
+    def on_connack(self, is_accepted):
+        with self._lock:
+            if self._state != CONNECTION_STATE.CONNECTING:
+                return
+            if not is_accepted:
+                self._failed_attempt_count += 1
+                self._schedule_attempt(self._backoff.get_delay())
+                return
+
+            self._backoff.reset()
+            if self._disconnect_time != None:
+                downtime = time.monotonic() - self._disconnect_time
+                self._disconnect_time = None
+                self._reconnect_count += 1
+                self._last_downtime = downtime
+                self._max_downtime = max(self._max_downtime, downtime)
+                self._total_downtime += downtime
+                _log.info('Reconnected after {:.3f} s.'.format(downtime))
+        self._set_state(CONNECTION_STATE.CONNECTED)
+
+    def on_connection_lost(self):
+        with self._lock:
+            if self._state == CONNECTION_STATE.CONNECTED:
+                self._disconnect_time = time.monotonic()
+            elif self._state == CONNECTION_STATE.CONNECTING:
+                self._failed_attempt_count += 1
+            else:
+                return
+
+            if self._reconnect_requested:
+                self._reconnect_requested = False
+                delay = 0
+            else:
+                delay = self._backoff.get_delay()
+            self._schedule_attempt(delay)
+
+    def _connection_thread(self):
+        try:
+            while not self._stop_requested:
+                state = self._state
+                if state == CONNECTION_STATE.CONNECTED:
+                    self._loop()
+                elif state == CONNECTION_STATE.CONNECTING:
+                    if time.monotonic() < self._connack_deadline:
+                        self._loop()
+                    else:
+                        _log.info('No connect acknowledgment in {} s.'.format(
+                            self._connack_timeout))
+                        self._on_attempt_failed()
+                else:
+                    wait_time = self._next_attempt_time - time.monotonic()
+                    if wait_time > 0:
+                        self._wakeup_event.wait(wait_time)
+                        self._wakeup_event.clear()
+                    else:
+                        self._connect()
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
+
+    def _loop(self):
+        if self._loop_func() != 0:
+            # The client callback is not called when the socket is closed before the connect
+            # acknowledgment.
+            self.on_connection_lost()
+
+    def _connect(self):
+        self._set_state(CONNECTION_STATE.CONNECTING)
+        try:
+            rc = self._connect_func()
+        except OSError as error:
+            _log.info('Failed to connect: {}'.format(error))
+            rc = None
+
+        if rc == 0:
+            self._connack_deadline = time.monotonic() + self._connack_timeout
+        else:
+            self._on_attempt_failed()
+
+    def _on_attempt_failed(self):
+        with self._lock:
+            self._failed_attempt_count += 1
+            self._schedule_attempt(self._backoff.get_delay())
+
+    # Called with the lock held.
+    def _schedule_attempt(self, delay):
+        self._next_attempt_time = time.monotonic() + delay
+        _log.debug('Next connection attempt in %.3f s.', delay)
+        self._set_state(CONNECTION_STATE.BACKOFF)
+        self._wakeup_event.set()
+
+    def _set_state(self, state):
+        if self._state == state:
+            return
+        self._state = state
+        for callback in self._state_listeners:
+            callback(state)
@@ -8,13 +8,18 @@ import datetime
 import time
 import paho.mqtt.client as mqttc
 import threading
-import json
 import queue
+import traceback
 
 # Local packages imports
 import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.metrics as metrics
 import mooving_iot.project_config as prj_cfg
 import mooving_iot.libraries.cloud.cloud as cloud
+import mooving_iot.libraries.cloud.cloud_protocol as cloud_protocol
+import mooving_iot.libraries.cloud.connection_manager as connection_manager
+import mooving_iot.libraries.ring_buffer.ring_buffer as ring_buffer
 
 
 #***************************************************************************************************
@@ -27,13 +32,41 @@ _log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
 # Public class
 #***************************************************************************************************
 class GoogleCloudIot(cloud.CloudImplementationBase):
+    # JWT token life, new token signing time and time when the connection is renewed with the new
+    # token even if the uplink is busy, minutes after the current token is issued.
     _JWT_TOKEN_LIFE = 60
+    _JWT_REFRESH_TIME = 50
+    _JWT_ROLLOVER_DEADLINE = 58
+    # Uplink is idle when no events are in flight and none were published for this time, seconds.
+    _UPLINK_IDLE_TIME = 2
+    _ROLLOVER_CHECK_PERIOD = 0.5
     _RECONNECT_MIN_DELAY = 2
     _RECONNECT_MAX_DELAY = 60
-
-    def __init__(self, cloud_conn_params):
+    # Number of last ack latencies used for percentiles.
+    _ACK_LATENCY_HISTORY = 1024
+    # Acks which come before publish() returned, more of them are unexpected and the oldest is
+    # dropped.
+    _MAX_EARLY_ACKS = 16
+
+    # With qos 1 at most max_inflight events wait for PUBACK, publishing more is rejected with
+    # MQTT_ERR_QUEUE_SIZE. Unacknowledged events are retransmitted by the client after reconnect.
+    # use_tls=False is used with a local broker. reconnect_backoff defaults to jittered exponential
+    # backoff from _RECONNECT_MIN_DELAY to _RECONNECT_MAX_DELAY.
+    def __init__(self, cloud_conn_params, encoder : cloud_protocol.PayloadEncoderBase=None,
+        qos=0, max_inflight=10, use_tls=True,
+        reconnect_backoff : connection_manager.ReconnectBackoff=None
+    ):
         super().__init__(cloud_conn_params)
 
+        if qos not in (0, 1):
+            raise ValueError('Event qos should be 0 or 1.')
+        if max_inflight <= 0:
+            raise ValueError('Max in-flight events should be positive.')
+
+        self._encoder = cloud_protocol.JsonEncoder() if encoder == None else encoder
+        self._qos = qos
+        self._max_inflight = max_inflight
+
         self._client_id = ('projects/{}/locations/{}/registries/{}/devices/{}'
             .format(
                 self._cloud_conn_params.project_id,
@@ -48,63 +81,100 @@ class GoogleCloudIot(cloud.CloudImplementationBase):
 
         self._cmds_queue = queue.Queue(100)
         self._config_queue = queue.Queue(100)
-
-        self._jwt_expire_time_sec = (GoogleCloudIot._JWT_TOKEN_LIFE - 1) * 60
-        self._jwt_expire_timer = None
+        self._cmd_listener = None
+        self._config_listener = None
+        self._connection_listener = None
+        self._is_connected = False
+
+        self._private_key = None
+        self._jwt = None
+        self._jwt_issue_time = None
+        self._jwt_refresh_thread = None
+        self._last_publish_time = 0
+
+        self._rollover_count = 0
+
+        # Event ID -> publish time of events waiting for acknowledgment. Events acknowledged
+        # before publish() returned are kept in _early_acks with the ack time. Late acks of events
+        # dropped on disconnect are ignored once by _dropped_mids.
+        self._delivery_lock = threading.Lock()
+        self._inflight = {}
+        self._early_acks = {}
+        self._dropped_mids = set()
+        self._ack_latencies = ring_buffer.RingBuffer(GoogleCloudIot._ACK_LATENCY_HISTORY, 'd')
+        self._published_count = 0
+        self._delivered_count = 0
+        self._dropped_count = 0
+        self._retried_count = 0
+        self._rejected_count = 0
+
+        cmds_queue_depth = metrics.gauge(
+            'cloud_commands_queue_depth', 'Cloud commands waiting for processing.')
+        cmds_queue_depth.add_source(self._cmds_queue.qsize)
+        config_queue_depth = metrics.gauge(
+            'cloud_config_queue_depth', 'Cloud configurations waiting for processing.')
+        config_queue_depth.add_source(self._config_queue.qsize)
+        self._published_metric = metrics.counter(
+            'cloud_events_published_total', 'Telemetry events passed to the MQTT client.')
+        self._rejected_metric = metrics.counter(
+            'cloud_events_rejected_total', 'Telemetry events rejected by the MQTT client.')
+        self._publish_time_metric = metrics.histogram(
+            'cloud_publish_seconds', 'MQTT client publish() call time.')
+        self._ack_latency_metric = metrics.histogram(
+            'cloud_ack_latency_seconds', 'Time from publish to PUBACK or socket write.')
 
         self._mqtt_client = mqttc.Client(client_id=self._client_id)
+        self._mqtt_client.max_inflight_messages_set(max_inflight)
 
-        self._mqtt_client.tls_set()
+        if use_tls:
+            self._mqtt_client.tls_set()
 
         self._mqtt_client.on_connect = self._on_connect
         self._mqtt_client.on_disconnect = self._on_disconnect
         self._mqtt_client.on_publish = self._on_publish
         self._mqtt_client.on_message = self._on_message
 
-        self._mqtt_client.reconnect_delay_set(
-            GoogleCloudIot._RECONNECT_MIN_DELAY,
-            GoogleCloudIot._RECONNECT_MAX_DELAY)
+        if reconnect_backoff == None:
+            reconnect_backoff = connection_manager.ReconnectBackoff(
+                GoogleCloudIot._RECONNECT_MIN_DELAY, GoogleCloudIot._RECONNECT_MAX_DELAY)
+        self._connection_manager = connection_manager.ConnectionManager(
+            self._connect, self._mqtt_client.loop, self._mqtt_client.disconnect,
+            reconnect_backoff)
+        self._connection_manager.add_state_listener(self._on_connection_state_changed)
+        self._connection_state_listener = None
 
         _log.info('Google Cloud Client ID: {}'.format(self._client_id))
         _log.info('MQTT events topic: {}'.format(self._mqtt_events_topic))
         _log.info('MQTT commands topic: {}'.format(self._mqtt_cmds_topic))
         _log.info('MQTT configuration topic: {}'.format(self._mqtt_config_topic))
+        _log.info('Payload encoder: {}'.format(self._encoder.get_name()))
+        _log.info('Events qos: {}, max in-flight: {}'.format(qos, max_inflight))
         _log.debug('GoogleCloudIot instance created.')
 
-    def create_connection(self, start_loop=True) -> int:
-        self._mqtt_client.username_pw_set(
-            username='unused',
-            password=self._create_jwt())
-
-        is_failure = True
-        while is_failure:
-            try:
-                conn_status = self._mqtt_client.connect(
-                    self._cloud_conn_params.mqtt_url,
-                    self._cloud_conn_params.mqtt_port)
-
-                is_failure = False
-            except:
-                _log.info('Failed to connect.')
-                time.sleep(5)
-
-        if start_loop:
-            self._mqtt_client.loop_start()
-        _log.info('Connect to cloud, status: {}'.format(mqttc.error_string(conn_status)))
+    # Starts the connection manager and returns without waiting for the connection, its state is
+    # reported by the connection listeners.
+    def create_connection(self) -> int:
+        if self._jwt == None:
+            self._set_jwt(self._create_jwt(), time.monotonic())
 
-        self._jwt_expire_timer = threading.Timer(self._jwt_expire_time_sec, self._jwt_expired)
-        self._jwt_expire_timer.start()
+        self._connection_manager.start()
 
-        return conn_status
+        if self._jwt_refresh_thread == None:
+            self._jwt_refresh_thread = threading.Thread(
+                target=self._jwt_refresh_thread_main, daemon=True)
+            self._jwt_refresh_thread.start()
 
-    def send_event(self, payload) -> int:
-        json_payload = json.dumps(payload, indent=4)
-        msg_info = self._mqtt_client.publish(self._mqtt_events_topic, json_payload, qos=0)
+        return mqttc.MQTT_ERR_SUCCESS
 
-        _log.debug('Send event ID: {}, status: {}'.format(
-            msg_info.mid, mqttc.error_string(msg_info.rc)))
+    def close_connection(self) -> int:
+        self._connection_manager.stop()
+        return mqttc.MQTT_ERR_SUCCESS
 
-        return msg_info.rc
+    def send_event(self, payload) -> int:
+        return self._publish_event(self._encoder.encode(payload))
+
+    def send_events(self, payloads : list) -> int:
+        return self._publish_event(self._encoder.encode_batch(payloads))
 
     def wait_for_command(self) -> str:
         return self._cmds_queue.get(True, None)
@@ -112,9 +182,121 @@ class GoogleCloudIot(cloud.CloudImplementationBase):
     def wait_for_configuration(self) -> str:
         return self._config_queue.get(True, None)
 
-    def _jwt_expired(self):
-        _log.debug('GoogleCloudIot _jwt_expired called.')
-        disconn_status = self._mqtt_client.disconnect()
+    def set_command_listener(self, callback):
+        self._cmd_listener = callback
+
+    def set_configuration_listener(self, callback):
+        self._config_listener = callback
+
+    def is_connected(self) -> bool:
+        return self._is_connected
+
+    def set_connection_listener(self, callback):
+        self._connection_listener = callback
+
+    def get_connection_state(self) -> connection_manager.CONNECTION_STATE:
+        return self._connection_manager.get_state()
+
+    def set_connection_state_listener(self, callback):
+        self._connection_state_listener = callback
+
+    def get_connection_stats(self) -> cloud.ConnectionStats:
+        return cloud.ConnectionStats(
+            reconnects=self._connection_manager.get_reconnect_count(),
+            failed_attempts=self._connection_manager.get_failed_attempt_count(),
+            rollovers=self._rollover_count,
+            last_downtime=self._connection_manager.get_last_downtime(),
+            max_downtime=self._connection_manager.get_max_downtime(),
+            total_downtime=self._connection_manager.get_total_downtime())
+
+    def get_delivery_stats(self) -> cloud.DeliveryStats:
+        with self._delivery_lock:
+            latencies = sorted(self._ack_latencies.get_last())
+            return cloud.DeliveryStats(
+                published=self._published_count,
+                delivered=self._delivered_count,
+                dropped=self._dropped_count,
+                retried=self._retried_count,
+                rejected=self._rejected_count,
+                inflight=len(self._inflight),
+                ack_latency_p50=_get_percentile(latencies, 50),
+                ack_latency_p99=_get_percentile(latencies, 99))
+
+    def _publish_event(self, data : bytes) -> int:
+        with self._delivery_lock:
+            if (self._qos > 0) and (len(self._inflight) >= self._max_inflight):
+                self._rejected_count += 1
+                self._rejected_metric.inc()
+                _log.debug('Event rejected, %d events in flight.', len(self._inflight))
+                return mqttc.MQTT_ERR_QUEUE_SIZE
+
+        publish_time = time.perf_counter()
+        self._last_publish_time = publish_time
+        msg_info = self._mqtt_client.publish(self._mqtt_events_topic, data, qos=self._qos)
+        self._publish_time_metric.observe(time.perf_counter() - publish_time)
+        rc = msg_info.rc
+        # qos 1 event is kept by the client and sent after reconnect.
+        if (self._qos > 0) and (rc == mqttc.MQTT_ERR_NO_CONN):
+            rc = mqttc.MQTT_ERR_SUCCESS
+
+        with self._delivery_lock:
+            ack_time = self._early_acks.pop(msg_info.mid, None)
+            if rc != mqttc.MQTT_ERR_SUCCESS:
+                self._rejected_count += 1
+                self._rejected_metric.inc()
+            else:
+                self._published_count += 1
+                self._published_metric.inc()
+                if ack_time != None:
+                    self._delivered_count += 1
+                    self._ack_latencies.append(ack_time - publish_time)
+                    self._ack_latency_metric.observe(ack_time - publish_time)
+                else:
+                    self._inflight[msg_info.mid] = publish_time
+
+        _log.debug('Send event ID: %s, size: %d bytes, status: %s',
+            msg_info.mid, len(data), mqttc.error_string(msg_info.rc))
+
+        return rc
+
+    # Signs the next token before the current one expires and switches to it with a reconnect when
+    # the uplink is idle. Events published meanwhile stay in the client (qos 1) or in the spool.
+    def _jwt_refresh_thread_main(self):
+        try:
+            while True:
+                issue_time = self._jwt_issue_time
+                time.sleep(max(0,
+                    issue_time + GoogleCloudIot._JWT_REFRESH_TIME * 60 - time.monotonic()))
+
+                sign_time = time.monotonic()
+                next_jwt = self._create_jwt()
+                _log.debug('Next JWT signed in {:.1f} ms.'.format(
+                    1000 * (time.monotonic() - sign_time)))
+
+                deadline = issue_time + GoogleCloudIot._JWT_ROLLOVER_DEADLINE * 60
+                while (not self._is_uplink_idle()) and (time.monotonic() < deadline):
+                    time.sleep(GoogleCloudIot._ROLLOVER_CHECK_PERIOD)
+
+                self._set_jwt(next_jwt, sign_time)
+                if self._is_connected:
+                    _log.info('JWT rollover, reconnect.')
+                    self._rollover_count += 1
+                    self._connection_manager.reconnect()
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
+
+    def _is_uplink_idle(self) -> bool:
+        with self._delivery_lock:
+            return ((len(self._inflight) == 0)
+                and (time.perf_counter() - self._last_publish_time
+                    >= GoogleCloudIot._UPLINK_IDLE_TIME))
+
+    # The token is used on the next connect or reconnect.
+    def _set_jwt(self, token, issue_time):
+        self._jwt = token
+        self._jwt_issue_time = issue_time
+        self._mqtt_client.username_pw_set(username='unused', password=token)
 
     def _create_jwt(self):
         current_time_utc = datetime.datetime.utcnow()
@@ -124,36 +306,111 @@ class GoogleCloudIot(cloud.CloudImplementationBase):
             'aud': self._cloud_conn_params.project_id
         }
 
-        with open(self._cloud_conn_params.private_key_filepath, 'r') as f:
-            private_key = f.read()
-
         return jwt.encode(
-            token, private_key, algorithm=self._cloud_conn_params.private_key_algorithm)
+            token, self._get_private_key(),
+            algorithm=self._cloud_conn_params.private_key_algorithm)
+
+    # The key file is read and parsed once.
+    def _get_private_key(self):
+        if self._private_key == None:
+            with open(self._cloud_conn_params.private_key_filepath, 'r') as f:
+                private_key = f.read()
+            algorithm = jwt.algorithms.get_default_algorithms()[
+                self._cloud_conn_params.private_key_algorithm]
+            self._private_key = algorithm.prepare_key(private_key)
+        return self._private_key
+
+    def _connect(self) -> int:
+        conn_status = self._mqtt_client.connect(
+            self._cloud_conn_params.mqtt_url,
+            self._cloud_conn_params.mqtt_port)
+        _log.info('Connect to cloud, status: {}'.format(mqttc.error_string(conn_status)))
+        return conn_status
 
     def _on_connect(self, client, userdata, flags, rc):
-        _log.debug('on_connect event, status: {}'.format(mqttc.error_string(rc)))
+        _log.debug('on_connect event, status: %s', mqttc.error_string(rc))
 
         status = self._mqtt_client.subscribe(self._mqtt_cmds_topic, qos=1)
         _log.info('Subscribe on commands topic, status: {}'.format(mqttc.error_string(status[0])))
         status = self._mqtt_client.subscribe(self._mqtt_config_topic, qos=1)
         _log.info('Subscribe on config topic, status: {}'.format(mqttc.error_string(status[0])))
 
+        if rc == 0:
+            with self._delivery_lock:
+                if self._qos > 0:
+                    self._retried_count += len(self._inflight)
+                    _log.debug('%d unacknowledged events are retransmitted.',
+                        len(self._inflight))
+                else:
+                    self._drop_inflight()
+
+        self._connection_manager.on_connack(rc == 0)
+
     def _on_disconnect(self, client, userdata, rc):
-        _log.debug('on_disconnect event, status: {}'.format(mqttc.error_string(rc)))
-        self.create_connection(False)
+        _log.debug('on_disconnect event, status: %s', mqttc.error_string(rc))
+        if self._qos == 0:
+            with self._delivery_lock:
+                self._drop_inflight()
+        self._connection_manager.on_connection_lost()
 
     def _on_publish(self, client, userdata, mid):
-        _log.debug('_on_publish event, event ID: {}.'.format(mid))
+        _log.debug('_on_publish event, event ID: %s.', mid)
+
+        ack_time = time.perf_counter()
+        with self._delivery_lock:
+            publish_time = self._inflight.pop(mid, None)
+            if publish_time != None:
+                self._delivered_count += 1
+                self._ack_latencies.append(ack_time - publish_time)
+                self._ack_latency_metric.observe(ack_time - publish_time)
+            elif mid in self._dropped_mids:
+                self._dropped_mids.discard(mid)
+            else:
+                if len(self._early_acks) >= GoogleCloudIot._MAX_EARLY_ACKS:
+                    del self._early_acks[next(iter(self._early_acks))]
+                self._early_acks[mid] = ack_time
+
+    # qos 0 events which were not written to the socket are lost on disconnect and reconnect.
+    def _drop_inflight(self):
+        self._dropped_count += len(self._inflight)
+        self._dropped_mids = set(self._inflight)
+        self._inflight.clear()
+        self._early_acks.clear()
+
+    def _on_connection_state_changed(self, state):
+        _log.debug('Connection state: %s.', state.value)
+        if self._connection_state_listener != None:
+            self._connection_state_listener(state)
+
+        is_connected = state == connection_manager.CONNECTION_STATE.CONNECTED
+        if is_connected != self._is_connected:
+            self._is_connected = is_connected
+            if self._connection_listener != None:
+                self._connection_listener(is_connected)
 
     def _on_message(self, client, userdata, message):
         str_payload = message.payload.decode('utf-8')
         if len(str_payload) > 0:
-            _log.debug('_on_message event, topic: {}, message: {}'
-                .format(message.topic, str_payload))
+            _log.debug('_on_message event, topic: %s, message: %s', message.topic, str_payload)
 
             if message.topic == self._mqtt_config_topic:
-                self._config_queue.put(str_payload, True, None)
+                if self._config_listener != None:
+                    self._config_listener(str_payload)
+                else:
+                    self._config_queue.put(str_payload, True, None)
             else:
-                self._cmds_queue.put(str_payload, True, None)
+                if self._cmd_listener != None:
+                    self._cmd_listener(str_payload)
+                else:
+                    self._cmds_queue.put(str_payload, True, None)
         else:
             _log.debug('_on_message event empty')
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _get_percentile(sorted_values, percent):
+    if len(sorted_values) == 0:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))]
@@ -3,12 +3,14 @@
 #***************************************************************************************************
 # Global imports
 import os
+import types
 import threading
 from typing import Union
 import json
 
 # Project imports
 import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
 import mooving_iot.project_config as prj_cfg
 
 
@@ -27,6 +29,8 @@ class ConfigParam:
         self.value = value
 
 
+# Parameter value has the type of its default value. A new ConfigParam is created on every change,
+# so returned parameters are not modified later.
 class ConfigParamDescription:
     def __init__(self, param: ConfigParam, writable=True, max_value=None, min_value=None):
         self._param = param
@@ -34,20 +38,75 @@ class ConfigParamDescription:
         self._max_value = max_value
         self._min_value = min_value
 
-    def set_param_value(self, value):
-        if (self._max_value != None) and (self._min_value != None) and self._writable:
-            if (value >= self._min_value) and (value <= self._max_value):
-                self._param.value = value
-                _log.debug('Set param: {}, value: {}'.format(self._param.name, value))
-        elif self._writable:
-            self._param.value = value
-            _log.debug('Set param: {}, value: {}'.format(self._param.name, value))
+    # Returns True if the value is applied.
+    def set_param_value(self, value) -> bool:
+        converted_value = self.validate_value(value)
+        if converted_value == None:
+            return False
+
+        self._param = ConfigParam(self._param.name, converted_value)
+        _log.debug('Set param: {}, value: {}'.format(self._param.name, converted_value))
+        return True
+
+    # Returns the value converted to the parameter type, None if the parameter is not writable or
+    # the value has another type or is out of range.
+    def validate_value(self, value):
+        if not self._writable:
+            return None
+
+        converted_value = self._convert_value(value)
+        if converted_value == None:
+            return None
+        if (self._max_value != None) and (self._min_value != None):
+            if (converted_value < self._min_value) or (converted_value > self._max_value):
+                return None
+        return converted_value
 
     def get_param(self) -> ConfigParam:
         return self._param
 
+    # Returns the value converted to the default value type, None if it has another type.
+    def _convert_value(self, value):
+        value_type = type(self._param.value)
+        if isinstance(value, value_type):
+            return value
+        if (value_type == float) and isinstance(value, int):
+            return float(value)
+        if (value_type == int) and isinstance(value, float) and value.is_integer():
+            return int(value)
+        return None
+
+
+# Immutable view of all parameters at one moment. Hot loops read one snapshot per iteration, so
+# they see a consistent configuration without locking.
+class ConfigSnapshot:
+    def __init__(self, values : dict, version : int):
+        self._values = types.MappingProxyType(values)
+        self._version = version
+
+    def __getitem__(self, param_name : str):
+        return self._values[param_name]
+
+    def get(self, param_name : str, default=None):
+        return self._values.get(param_name, default)
+
+    # Incremented on every configuration change.
+    def get_version(self) -> int:
+        return self._version
+
+    def to_dict(self) -> dict:
+        return dict(self._values)
+
 
-# Singleton class
+# get_instance() returns the process wide configuration stored in FILE_CONFIG_PATH. Devices which
+# run in one process create own instances with own config files, config_file_path=None keeps the
+# configuration in memory only.
+# Parameters are indexed by name. Changes are serialized by a lock and publish a new snapshot,
+# readers get immutable parameters and snapshots without locking.
+# set_on_change_callback() callbacks are called on any change, subscribe() callbacks only when one
+# of the given parameters is changed and get the changed ones as {name: (old_value, new_value)}.
+# Changes are written to the file store_delay seconds after the first one, so a burst of changes is
+# written once. The file is replaced atomically, a power loss leaves the previous or the new one.
 class DeviceConfig:
     __instance = None
     __instance_lock = threading.Lock()
@@ -57,108 +116,194 @@ class DeviceConfig:
     def get_instance() -> 'DeviceConfig':
         with DeviceConfig.__instance_lock:
             if DeviceConfig.__instance == None:
-                DeviceConfig(DeviceConfig.__instance_lock)
+                DeviceConfig.__instance = DeviceConfig(DeviceConfig.__config_file_path_name)
             return DeviceConfig.__instance
 
-    def __init__(self, instance_lock=None):
-        if instance_lock is DeviceConfig.__instance_lock:
-            self._params_desc = [
-                ConfigParamDescription(
-                    ConfigParam(name='telemetryIntervalUnlock', value=15),
-                    writable=True, max_value=1000, min_value=1),
-                ConfigParamDescription(
-                    ConfigParam(name='telemetryIntervalLock', value=60),
-                    writable=True, max_value=1000, min_value=1),
-                ConfigParamDescription(
-                    ConfigParam(name='telemetryIntervalUnavailable', value=60),
-                    writable=True, max_value=1000, min_value=1),
-                ConfigParamDescription(
-                    ConfigParam(name='deviceId', value='device_id'),
-                    writable=True),
-                ConfigParamDescription(
-                    ConfigParam(name='deviceState', value='lock'),
-                    writable=True),
-                ConfigParamDescription(
-                    ConfigParam(name='accThresholdMg', value=250),
-                    writable=True, max_value=1999, min_value=1),
-                ConfigParamDescription(
-                    ConfigParam(name='accPeakDurationMs', value=100),
-                    writable=True, max_value=10000, min_value=0),
-                ConfigParamDescription(
-                    ConfigParam(name='accTotalDurationMs', value=2000),
-                    writable=True, max_value=100000, min_value=0),
-                ConfigParamDescription(
-                    ConfigParam(name='accPeakCount', value=5),
-                    writable=True, max_value=1000000, min_value=1),
-                ConfigParamDescription(
-                    ConfigParam(name='accAngleThresholdDegree', value=50),
-                    writable=True, max_value=89, min_value=1),
-                ConfigParamDescription(
-                    ConfigParam(name='accAngleTotalDurationMs', value=2000),
-                    writable=True, max_value=1000000, min_value=1),
-                ConfigParamDescription(
-                    ConfigParam(name='intBattThresholdV', value=0.2),
-                    writable=True, max_value=5.0, min_value=0.1),
-                ConfigParamDescription(
-                    ConfigParam(name='extBattThresholdV', value=2.0),
-                    writable=True, max_value=100.0, min_value=0.1),
-                ConfigParamDescription(
-                    ConfigParam(name='firstPhaseAlarmTimeout', value=2),
-                    writable=True, max_value=100, min_value=1),
-                ConfigParamDescription(
-                    ConfigParam(name='secondPhaseAlarmTimeout', value=5),
-                    writable=True, max_value=200, min_value=2),
-                ConfigParamDescription(
-                    ConfigParam(name='thirdPhaseAlarmTimeout', value=15),
-                    writable=True, max_value=300, min_value=3)
-            ]
-
-            self._on_change_callbacks = []
-
-            if os.path.isfile(DeviceConfig.__config_file_path_name):
+    def __init__(self, config_file_path=None, store_delay=prj_cfg.DEVICE_CONFIG_STORE_DELAY):
+        params_desc = [
+            ConfigParamDescription(
+                ConfigParam(name='telemetryIntervalUnlock', value=15),
+                writable=True, max_value=1000, min_value=1),
+            ConfigParamDescription(
+                ConfigParam(name='telemetryIntervalLock', value=60),
+                writable=True, max_value=1000, min_value=1),
+            ConfigParamDescription(
+                ConfigParam(name='telemetryIntervalUnavailable', value=60),
+                writable=True, max_value=1000, min_value=1),
+            ConfigParamDescription(
+                ConfigParam(name='deviceId', value='device_id'),
+                writable=True),
+            ConfigParamDescription(
+                ConfigParam(name='deviceState', value='lock'),
+                writable=True),
+            ConfigParamDescription(
+                ConfigParam(name='accThresholdMg', value=250),
+                writable=True, max_value=1999, min_value=1),
+            ConfigParamDescription(
+                ConfigParam(name='accPeakDurationMs', value=100),
+                writable=True, max_value=10000, min_value=0),
+            ConfigParamDescription(
+                ConfigParam(name='accTotalDurationMs', value=2000),
+                writable=True, max_value=100000, min_value=0),
+            ConfigParamDescription(
+                ConfigParam(name='accPeakCount', value=5),
+                writable=True, max_value=1000000, min_value=1),
+            ConfigParamDescription(
+                ConfigParam(name='accAngleThresholdDegree', value=50),
+                writable=True, max_value=89, min_value=1),
+            ConfigParamDescription(
+                ConfigParam(name='accAngleTotalDurationMs', value=2000),
+                writable=True, max_value=1000000, min_value=1),
+            ConfigParamDescription(
+                ConfigParam(name='intBattThresholdV', value=0.2),
+                writable=True, max_value=5.0, min_value=0.1),
+            ConfigParamDescription(
+                ConfigParam(name='extBattThresholdV', value=2.0),
+                writable=True, max_value=100.0, min_value=0.1),
+            ConfigParamDescription(
+                ConfigParam(name='firstPhaseAlarmTimeout', value=2),
+                writable=True, max_value=100, min_value=1),
+            ConfigParamDescription(
+                ConfigParam(name='secondPhaseAlarmTimeout', value=5),
+                writable=True, max_value=200, min_value=2),
+            ConfigParamDescription(
+                ConfigParam(name='thirdPhaseAlarmTimeout', value=15),
+                writable=True, max_value=300, min_value=3)
+        ]
+
+        self._params_desc = {
+            param_desc.get_param().name: param_desc for param_desc in params_desc}
+        self._lock = threading.Lock()
+        self._snapshot = self._create_snapshot(0)
+
+        self._on_change_callbacks = []
+        self._subscriptions = []
+        self._config_file_path = config_file_path
+        self._store_delay = store_delay
+        self._store_lock = threading.Lock()
+        self._store_timer = None
+        self._stored_version = 0
+
+        if config_file_path != None:
+            if os.path.isfile(config_file_path):
                 self._load_params()
+            utils_exit.register_on_exit(self.flush)
 
-            DeviceConfig.__instance = self
-        else:
-            raise PermissionError(
-                'This is a Singleton class, use get_instance() method instead of constructor!')
+    def set_param(self, param: ConfigParam) -> bool:
+        return self.set_params([param])
+
+    # Applies all parameters or none of them: an unknown name or an invalid value rejects the whole
+    # change. Change callbacks are called once if any value is changed, subscribers once if any of
+    # their parameters is changed.
+    def set_params(self, params : list) -> bool:
+        with self._lock:
+            values = {}
+            for param in params:
+                param_desc = self._params_desc.get(param.name)
+                value = None if param_desc == None else param_desc.validate_value(param.value)
+                if value == None:
+                    _log.warning('Config change rejected, param: {}, value: {}'.format(
+                        param.name, param.value))
+                    return False
+                values[param.name] = value
 
-    def set_param(self, param: ConfigParam):
-        for param_desc in self._params_desc:
-            if param_desc.get_param().name == param.name:
-                param_desc.set_param_value(param.value)
+            changes = {}
+            for name, value in values.items():
+                old_value = self._params_desc[name].get_param().value
+                if value != old_value:
+                    self._params_desc[name].set_param_value(value)
+                    changes[name] = (old_value, value)
+            if len(changes) == 0:
+                return True
+            self._snapshot = self._create_snapshot(self._snapshot.get_version() + 1)
+
+        if self._store_delay > 0:
+            self._schedule_store()
+        else:
+            self.flush()
 
-        self._store_params()
         for callback in self._on_change_callbacks:
             callback()
+        for param_names, callback in self._subscriptions:
+            subscribed_changes = {
+                name: change for name, change in changes.items() if name in param_names}
+            if len(subscribed_changes) > 0:
+                callback(subscribed_changes)
+        return True
 
     def get_param(self, param_name: str) -> Union[ConfigParam, None]:
-        for param_desc in self._params_desc:
-            if param_desc.get_param().name == param_name:
-                return param_desc.get_param()
+        param_desc = self._params_desc.get(param_name)
+        return None if param_desc == None else param_desc.get_param()
 
-        return None
+    def get_snapshot(self) -> ConfigSnapshot:
+        return self._snapshot
 
     def set_on_change_callback(self, callback):
         self._on_change_callbacks.append(callback)
 
-    def _store_params(self):
-        params_dict = {}
+    # Callback is called with {name: (old_value, new_value)} of the changed subscribed parameters.
+    def subscribe(self, param_names, callback):
+        param_names = frozenset(param_names)
+        unknown_names = param_names - self._params_desc.keys()
+        if len(unknown_names) > 0:
+            raise ValueError('Unknown config params: {}.'.format(sorted(unknown_names)))
+        self._subscriptions.append((param_names, callback))
+
+    # Writes pending changes to the file now. Called on exit as well.
+    def flush(self):
+        with self._store_lock:
+            if self._store_timer != None:
+                self._store_timer.cancel()
+                self._store_timer = None
+
+            snapshot = self._snapshot
+            if ((self._config_file_path == None)
+                or (snapshot.get_version() == self._stored_version)):
+                return
+            self._store_params(snapshot)
+            self._stored_version = snapshot.get_version()
+
+    # Called with the lock held.
+    def _create_snapshot(self, version) -> ConfigSnapshot:
+        return ConfigSnapshot(
+            {name: param_desc.get_param().value for name, param_desc in self._params_desc.items()},
+            version)
 
-        for param_desc in self._params_desc:
-            param = param_desc.get_param()
-            params_dict[param.name] = param.value
+    def _schedule_store(self):
+        with self._store_lock:
+            if (self._config_file_path == None) or (self._store_timer != None):
+                return
+            self._store_timer = threading.Timer(self._store_delay, self.flush)
+            self._store_timer.daemon = True
+            self._store_timer.start()
 
-        os.makedirs(prj_cfg.FILE_CONFIG_PATH, exist_ok=True)
-        with open(file=DeviceConfig.__config_file_path_name, mode='w') as config_file:
-            json.dump(obj=params_dict, fp=config_file, indent=4)
+    # Called with the store lock held.
+    def _store_params(self, snapshot : ConfigSnapshot):
+        os.makedirs(os.path.dirname(self._config_file_path), exist_ok=True)
+        tmp_file_path = self._config_file_path + '.tmp'
+        with open(file=tmp_file_path, mode='w') as config_file:
+            json.dump(obj=snapshot.to_dict(), fp=config_file, indent=4)
+            config_file.flush()
+            os.fsync(config_file.fileno())
+        os.replace(tmp_file_path, self._config_file_path)
+        _log.debug('Config stored, version: {}.'.format(snapshot.get_version()))
 
+    # Values from the file are applied without storing them again, unknown and invalid ones are
+    # skipped.
     def _load_params(self):
-        config_dict = None
-        with open(file=DeviceConfig.__config_file_path_name, mode='r') as config_file:
-            config_dict = json.load(config_file)
+        try:
+            with open(file=self._config_file_path, mode='r') as config_file:
+                config_dict = json.load(config_file)
+        except ValueError:
+            _log.warning('Can not parse config file, defaults are used.')
+            return
 
-        for param_name in config_dict:
-            cfg_param = ConfigParam(param_name, config_dict[param_name])
-            self.set_param(cfg_param)
+        with self._lock:
+            for param_name, value in config_dict.items():
+                param_desc = self._params_desc.get(param_name)
+                if (param_desc == None) or not param_desc.set_param_value(value):
+                    _log.debug('Config file param skipped: {}, value: {}'.format(
+                        param_name, value))
+            self._snapshot = self._create_snapshot(self._snapshot.get_version() + 1)
+            self._stored_version = self._snapshot.get_version()
 
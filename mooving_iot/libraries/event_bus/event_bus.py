@@ -0,0 +1,60 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import threading
+import enum
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.project_config as prj_cfg
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+class SENSOR_TOPIC(enum.IntEnum):
+    # Accelerometer samples which may change movement or angles detection state.
+    ACC = 1
+    # New GNSS fix.
+    GNSS = 2
+
+
+# Publish/subscribe bus for sensor changes. Callbacks are called synchronously in the publisher
+# thread as callback(topic, value), so they should only hand the work over to another thread.
+class EventBus:
+    __instance = None
+    __instance_lock = threading.Lock()
+
+    @staticmethod
+    def get_instance() -> 'EventBus':
+        with EventBus.__instance_lock:
+            if EventBus.__instance == None:
+                EventBus.__instance = EventBus()
+            return EventBus.__instance
+
+    def __init__(self):
+        self._subscribers_lock = threading.Lock()
+        # Subscribers tuples are replaced on change, publish() reads them without locking.
+        self._subscribers = {}
+
+    def subscribe(self, topic, callback):
+        with self._subscribers_lock:
+            self._subscribers[topic] = self._subscribers.get(topic, ()) + (callback,)
+
+    def unsubscribe(self, topic, callback):
+        with self._subscribers_lock:
+            subscribers = self._subscribers.get(topic, ())
+            self._subscribers[topic] = tuple(
+                subscriber for subscriber in subscribers if subscriber != callback)
+
+    def publish(self, topic, value=None):
+        for callback in self._subscribers.get(topic, ()):
+            callback(topic, value)
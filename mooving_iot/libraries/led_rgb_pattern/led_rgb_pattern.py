@@ -3,6 +3,7 @@
 #***************************************************************************************************
 # Global imports
 import os
+import asyncio
 import threading
 import traceback
 import math
@@ -14,6 +15,7 @@ from typing import Union
 import mooving_iot.project_config as prj_cfg
 import mooving_iot.utils.exit as utils_exit
 import mooving_iot.utils.logger as logger
+import mooving_iot.utils.aio as aio
 
 import mooving_iot.drivers.led_rgb.led_rgb as drv_led_rgb
 
@@ -50,19 +52,23 @@ class LED_RGB_PATTERN_ID(enum.IntEnum):
     LOCKED = 1
 
 
+# With loop patterns are sent from a task of the asyncio runtime loop instead of a thread, methods
+# should be called from the loop thread then.
 class LedRgbPatternGenerator:
     _PATTERNS_TABLE = {
         LED_RGB_PATTERN_ID.LOCKED: _locked_pattern,
         LED_RGB_PATTERN_ID.UNLOCKED: _unlocked_pattern
     }
 
-    def __init__(self, led_rgb_driver : drv_led_rgb.LedRgb):
+    def __init__(self, led_rgb_driver : drv_led_rgb.LedRgb, loop : asyncio.AbstractEventLoop=None):
         self._led_rgb_driver = led_rgb_driver
+        self._loop = loop
         self._pattern_repeate_count = 0
         self._current_pattern = None
 
         self._pattern_thread : Union[threading.Thread, None] = None
         self._pattern_thread_stop = False
+        self._pattern_task : Union[asyncio.Task, None] = None
 
     def start_pattern(self, pattern_id, repeate_count=0):
         self.stop_pattern()
@@ -72,7 +78,11 @@ class LedRgbPatternGenerator:
         if self._current_pattern == None:
             return
 
-        _log.debug('Start LED RGB pattern with ID: {}.'.format(pattern_id))
+        _log.debug('Start LED RGB pattern with ID: %s.', pattern_id)
+
+        if self._loop != None:
+            self._pattern_task = self._loop.create_task(self._event_send_task())
+            return
 
         self._pattern_thread = threading.Thread(target=self._event_send_thread)
         self._pattern_thread_stop = False
@@ -82,6 +92,9 @@ class LedRgbPatternGenerator:
         _log.debug('Stop LED RGB pattern.')
 
         self._pattern_thread_stop = True
+        if self._pattern_task != None:
+            self._pattern_task.cancel()
+            self._pattern_task = None
         self._led_rgb_driver.clear_all_events()
         if (self._pattern_thread != None) and self._pattern_thread.is_alive():
             self._pattern_thread.join()
@@ -100,3 +113,20 @@ class LedRgbPatternGenerator:
         except:
             _log.error(traceback.format_exc())
             utils_exit.exit(1)
+
+    # Events are paced by the task, so the driver queue never fills and set_event() does not block.
+    async def _event_send_task(self):
+        try:
+            while True:
+                for event in self._current_pattern:
+                    self._led_rgb_driver.set_event(event)
+                    await aio.sleep(event.time)
+
+                self._pattern_repeate_count -= 1
+                if self._pattern_repeate_count < 0:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
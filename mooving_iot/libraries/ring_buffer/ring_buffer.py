@@ -0,0 +1,283 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import array
+import math
+import operator
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.project_config as prj_cfg
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+_INTEGER_TYPECODES = 'bBhHiIlLqQ'
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+# Fixed size ring buffer backed by a preallocated array, the oldest value is overwritten when the
+# buffer is full. Index 0 is the oldest value, -1 is the newest one.
+class RingBuffer:
+    def __init__(self, size, typecode='h'):
+        if size <= 0:
+            raise ValueError('Ring buffer size should be positive.')
+
+        self._size = size
+        self._data = array.array(typecode, [0]) * size
+        self._write_index = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not (0 <= index < self._count):
+            raise IndexError('Ring buffer index out of range.')
+        return self._data[(self._write_index - self._count + index) % self._size]
+
+    def get_size(self) -> int:
+        return self._size
+
+    def is_full(self) -> bool:
+        return self._count == self._size
+
+    def clear(self):
+        self._write_index = 0
+        self._count = 0
+
+    def append(self, value):
+        self._data[self._write_index] = value
+        self._write_index += 1
+        if self._write_index == self._size:
+            self._write_index = 0
+        if self._count < self._size:
+            self._count += 1
+
+    def extend(self, values):
+        if not isinstance(values, array.array) or values.typecode != self._data.typecode:
+            values = array.array(self._data.typecode, values)
+        count = len(values)
+        if count >= self._size:
+            values = values[count - self._size:]
+            count = self._size
+
+        # Copy with at most two slice assignments, the second one wraps to the buffer start.
+        first_count = min(count, self._size - self._write_index)
+        self._data[self._write_index:self._write_index + first_count] = values[:first_count]
+        self._data[:count - first_count] = values[first_count:]
+        self._write_index = (self._write_index + count) % self._size
+        self._count = min(self._count + count, self._size)
+
+    # Returns a copy of the last count values (all if None), oldest first.
+    def get_last(self, count=None) -> array.array:
+        if (count == None) or (count > self._count):
+            count = self._count
+        start = (self._write_index - count) % self._size
+        if start + count <= self._size:
+            return self._data[start:start + count]
+        return self._data[start:] + self._data[:self._write_index]
+
+
+# Rolling mean, variance, RMS and peak (maximum absolute value) over the last window values.
+# Every add() is O(1): sums are updated incrementally and the peak is kept in a monotonic queue
+# stored in preallocated arrays. Sums are exact for integer typecodes, for floating point ones
+# they are recalculated once per window to avoid accumulating rounding errors.
+# extend() only copies the values: the statistics are computed from the window with C level sum(),
+# max() and min() by the first getter after it, and the next add() rebuilds the incremental state.
+class RollingStats:
+    def __init__(self, window, typecode='h'):
+        self._window = window
+        self._is_integer = typecode in _INTEGER_TYPECODES
+        self._values = array.array(typecode, [0]) * window
+        self._write_index = 0
+        self._count = 0
+
+        self._sum = 0
+        self._sum_sq = 0
+        self._added_count = 0
+
+        # Monotonic queue of absolute values with their sample numbers, decreasing values.
+        self._peak_values = array.array('d', [0.0]) * window
+        self._peak_numbers = array.array('q', [0]) * window
+        self._peak_head = 0
+        self._peak_length = 0
+
+        # Set by extend(): sums and the peak queue are not maintained, _window_stats caches
+        # (sum, sum of squares, peak) of the window, None until a getter computes it.
+        self._is_stale = False
+        self._window_stats = None
+
+    def get_window(self) -> int:
+        return self._window
+
+    def get_count(self) -> int:
+        return self._count
+
+    def clear(self):
+        self._write_index = 0
+        self._count = 0
+        self._sum = 0
+        self._sum_sq = 0
+        self._peak_head = 0
+        self._peak_length = 0
+        self._is_stale = False
+        self._window_stats = None
+
+    def add(self, value):
+        if self._is_stale:
+            self._rebuild()
+
+        window = self._window
+        write_index = self._write_index
+        if self._count == window:
+            old_value = self._values[write_index]
+            self._sum -= old_value
+            self._sum_sq -= old_value * old_value
+        else:
+            self._count += 1
+        self._values[write_index] = value
+        write_index += 1
+        self._write_index = 0 if write_index == window else write_index
+        self._sum += value
+        self._sum_sq += value * value
+        self._added_count += 1
+        number = self._added_count
+
+        if (not self._is_integer) and (number % window == 0):
+            values = self._values[:self._count]
+            self._sum = math.fsum(values)
+            self._sum_sq = math.fsum(value * value for value in values)
+
+        # Drop smaller values from the back of the peak queue, they can not be a peak anymore.
+        abs_value = abs(value)
+        peak_values = self._peak_values
+        head = self._peak_head
+        length = self._peak_length
+        while length > 0:
+            back = head + length - 1
+            if back >= window:
+                back -= window
+            if peak_values[back] > abs_value:
+                break
+            length -= 1
+
+        # Drop the front value if it left the window.
+        if (length > 0) and (self._peak_numbers[head] <= number - window):
+            head += 1
+            if head == window:
+                head = 0
+            length -= 1
+
+        back = head + length
+        if back >= window:
+            back -= window
+        peak_values[back] = abs_value
+        self._peak_numbers[back] = number
+        self._peak_head = head
+        self._peak_length = length + 1
+
+    def extend(self, values):
+        if not isinstance(values, array.array) or values.typecode != self._values.typecode:
+            values = array.array(self._values.typecode, values)
+        window = self._window
+        count = len(values)
+        if count == 0:
+            return
+        self._added_count += count
+        if count > window:
+            values = values[count - window:]
+            count = window
+
+        # Copy with at most two slice assignments, the second one wraps to the buffer start.
+        write_index = self._write_index
+        first_count = min(count, window - write_index)
+        self._values[write_index:write_index + first_count] = values[:first_count]
+        self._values[:count - first_count] = values[first_count:]
+        self._write_index = (write_index + count) % window
+        self._count = min(self._count + count, window)
+
+        self._is_stale = True
+        self._window_stats = None
+
+    def get_mean(self) -> float:
+        if self._count == 0:
+            return 0.0
+        sum_value, _, _ = self._get_stats()
+        return sum_value / self._count
+
+    # Population variance.
+    def get_variance(self) -> float:
+        count = self._count
+        if count == 0:
+            return 0.0
+        sum_value, sum_sq, _ = self._get_stats()
+        return max(count * sum_sq - sum_value * sum_value, 0) / (count * count)
+
+    def get_rms(self) -> float:
+        if self._count == 0:
+            return 0.0
+        _, sum_sq, _ = self._get_stats()
+        return math.sqrt(max(sum_sq, 0) / self._count)
+
+    def get_peak(self):
+        if self._count == 0:
+            return 0
+        _, _, peak = self._get_stats()
+        return peak
+
+    # Returns (sum, sum of squares, peak) of the window.
+    def _get_stats(self) -> tuple:
+        if not self._is_stale:
+            peak = self._peak_values[self._peak_head] if self._peak_length > 0 else 0
+            return self._sum, self._sum_sq, int(peak) if self._is_integer else peak
+
+        if self._window_stats == None:
+            values = self._get_window_values()
+            sum_func = sum if self._is_integer else math.fsum
+            self._window_stats = (
+                sum_func(values),
+                sum_func(map(operator.mul, values, values)),
+                max(max(values), -min(values)) if len(values) > 0 else 0)
+        return self._window_stats
+
+    # Window values, oldest first.
+    def _get_window_values(self) -> array.array:
+        start = (self._write_index - self._count) % self._window
+        if start + self._count <= self._window:
+            return self._values[start:start + self._count]
+        return self._values[start:] + self._values[:self._write_index]
+
+    # Restores the incremental sums and the peak queue after extend(), one pass over the window.
+    def _rebuild(self):
+        self._sum, self._sum_sq, _ = self._get_stats()
+        self._is_stale = False
+        self._window_stats = None
+
+        values = self._get_window_values()
+        first_number = self._added_count - len(values) + 1
+        peak_values = self._peak_values
+        peak_numbers = self._peak_numbers
+        length = 0
+        for offset, value in enumerate(values):
+            abs_value = abs(value)
+            while (length > 0) and (peak_values[length - 1] <= abs_value):
+                length -= 1
+            peak_values[length] = abs_value
+            peak_numbers[length] = first_number + offset
+            length += 1
+        self._peak_head = 0
+        self._peak_length = length
@@ -0,0 +1,176 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import sys
+import time
+import threading
+import collections
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.project_config as prj_cfg
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+# Root frame of stacks deeper than max_depth, the frames closest to the leaf are kept.
+_TRUNCATED_FRAME = '...'
+# Leaf frame of the stacks which do not fit into the uploaded ones.
+_OTHER_FRAME = '[other]'
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+# Samples of one profiler run. Stacks are keyed by (thread name, code objects from the root to the
+# leaf), code objects are turned into 'module:function' frames on request only.
+class ProfileResult:
+    def __init__(self, stacks : dict, sample_count, duration, sampling_time):
+        self._stacks = stacks
+        self._sample_count = sample_count
+        self._duration = duration
+        self._sampling_time = sampling_time
+
+    # Sampling rounds, every round takes one stack of every sampled thread.
+    def get_sample_count(self) -> int:
+        return self._sample_count
+
+    def get_duration(self) -> float:
+        return self._duration
+
+    # Part of the run time spent by the sampler thread.
+    def get_overhead(self) -> float:
+        return self._sampling_time / self._duration if self._duration > 0 else 0.0
+
+    # Collapsed stacks 'thread;frame;...;frame count', the format of flamegraph.pl, the most
+    # frequent first. Stacks after max_stacks are summed up as 'thread;[other]'.
+    def get_collapsed_stacks(self, max_stacks=None) -> list:
+        frame_labels = {}
+        stack_counts = collections.Counter()
+        for (thread_name, codes), count in self._stacks.items():
+            frames = [thread_name]
+            for code in codes:
+                if code == None:
+                    frames.append(_TRUNCATED_FRAME)
+                    continue
+                label = frame_labels.get(code)
+                if label == None:
+                    label = '{}:{}'.format(
+                        os.path.splitext(os.path.basename(code.co_filename))[0], code.co_name)
+                    frame_labels[code] = label
+                frames.append(label)
+            stack_counts[';'.join(frames)] += count
+
+        sorted_stacks = stack_counts.most_common()
+        if (max_stacks != None) and (len(sorted_stacks) > max_stacks):
+            other_counts = collections.Counter()
+            for stack, count in sorted_stacks[max_stacks:]:
+                other_counts[stack.split(';', 1)[0] + ';' + _OTHER_FRAME] += count
+            sorted_stacks = sorted_stacks[:max_stacks] + other_counts.most_common()
+
+        return ['{} {}'.format(stack, count) for stack, count in sorted_stacks]
+
+
+# Wall clock sampling profiler of the threads of the process. A background thread takes the stacks
+# of the threads every interval seconds for a bounded duration and calls done_callback with the
+# ProfileResult from that thread. Threads are identified by their names.
+# The sampler holds the GIL while it walks the stacks, so it waits after every sample at least
+# (sample time / max_duty) seconds: the overhead stays below max_duty on a loaded CPU as well,
+# at the cost of a lower sample rate.
+class SamplingProfiler:
+    def __init__(self, interval, max_duty, max_depth):
+        assert interval > 0, 'Interval should be positive!'
+        assert 0 < max_duty <= 1, 'Duty should be from 0 to 1!'
+        assert max_depth > 0, 'Depth should be positive!'
+
+        self._interval = interval
+        self._max_duty = max_duty
+        self._max_depth = max_depth
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # Returns False if the profiler is already running. thread_names limits sampling to the
+    # threads with these names.
+    def start(self, duration, done_callback, thread_names=None) -> bool:
+        assert duration > 0, 'Duration should be positive!'
+
+        with self._lock:
+            if self.is_running():
+                return False
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._sample_thread_func,
+                args=(duration, done_callback,
+                    None if thread_names == None else frozenset(thread_names)),
+                name='sampling_profiler',
+                daemon=True)
+            self._thread.start()
+
+        _log.info('Profiler started for %s s, threads: %s.',
+            duration, 'all' if thread_names == None else thread_names)
+        return True
+
+    # Ends the current run early, the callback still gets the samples.
+    def stop(self):
+        self._stop_event.set()
+
+    def is_running(self) -> bool:
+        return (self._thread != None) and self._thread.is_alive()
+
+    def _sample_thread_func(self, duration, done_callback, thread_names):
+        own_ident = threading.get_ident()
+        stacks = {}
+        sample_count = 0
+        sampling_time = 0.0
+        start_time = time.perf_counter()
+        end_time = start_time + duration
+
+        while True:
+            sample_start_time = time.perf_counter()
+            if sample_start_time >= end_time:
+                break
+
+            self._sample(stacks, own_ident, thread_names)
+            sample_count += 1
+            sample_time = time.perf_counter() - sample_start_time
+            sampling_time += sample_time
+
+            wait_time = max(self._interval - sample_time, sample_time / self._max_duty)
+            if self._stop_event.wait(min(wait_time, max(0, end_time - time.perf_counter()))):
+                break
+
+        result = ProfileResult(
+            stacks, sample_count, time.perf_counter() - start_time, sampling_time)
+        _log.info('Profiler finished: %d samples, %d stacks, overhead: %.2f %%.',
+            sample_count, len(stacks), result.get_overhead() * 100)
+        done_callback(result)
+
+    def _sample(self, stacks, own_ident, thread_names):
+        thread_name_map = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            thread_name = thread_name_map.get(ident, 'thread-{}'.format(ident))
+            if (thread_names != None) and (thread_name not in thread_names):
+                continue
+
+            codes = []
+            while (frame != None) and (len(codes) < self._max_depth):
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            if frame != None:
+                codes.append(None)
+            codes.reverse()
+
+            key = (thread_name, tuple(codes))
+            stacks[key] = stacks.get(key, 0) + 1
@@ -0,0 +1,219 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import threading
+import struct
+import enum
+import traceback
+from typing import Union
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.clock as clock
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.drivers.acc.acc as drv_acc
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+# Trace file layout:
+#   header: magic, format version, start timestamp (UTC seconds, double);
+#   records: record type, time since previous record (us), type specific payload.
+_TRACE_MAGIC = b'MIOTTRC'
+_TRACE_VERSION = 1
+_HEADER_STRUCT = struct.Struct('<7sBd')
+_RECORD_HEADER_STRUCT = struct.Struct('<BI')
+_ACC_PAYLOAD_STRUCT = struct.Struct('<hhhB')
+_ADC_PAYLOAD_STRUCT = struct.Struct('<ffB')
+_NMEA_PAYLOAD_STRUCT = struct.Struct('<H')
+_MAX_RECORD_DELTA_US = 0xFFFFFFFF
+_WRITE_BUFFER_SIZE = 64 * 1024
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+class TRACE_RECORD_TYPE(enum.IntEnum):
+    ACC = 1
+    ADC = 2
+    NMEA = 3
+
+
+class AccRecord:
+    def __init__(self, timestamp, acc_data : drv_acc.AccData, is_out_of_threshold : bool):
+        self.type = TRACE_RECORD_TYPE.ACC
+        self.timestamp = timestamp
+        self.acc_data = acc_data
+        self.is_out_of_threshold = is_out_of_threshold
+
+
+class AdcRecord:
+    def __init__(self, timestamp, ext_batt_voltage, int_batt_voltage, is_ext_batt_charging):
+        self.type = TRACE_RECORD_TYPE.ADC
+        self.timestamp = timestamp
+        self.ext_batt_voltage = ext_batt_voltage
+        self.int_batt_voltage = int_batt_voltage
+        self.is_ext_batt_charging = is_ext_batt_charging
+
+
+class NmeaRecord:
+    def __init__(self, timestamp, sentence : bytes):
+        self.type = TRACE_RECORD_TYPE.NMEA
+        self.timestamp = timestamp
+        self.sentence = sentence
+
+
+class TraceWriter:
+    def __init__(self, file_path_name):
+        self._file_path_name = file_path_name
+        self._lock = threading.Lock()
+
+        dir_name = os.path.dirname(file_path_name)
+        if len(dir_name) > 0:
+            os.makedirs(dir_name, exist_ok=True)
+
+        start_time = clock.time()
+        self._last_time_us = int(start_time * 1000000)
+        self._file = open(file=file_path_name, mode='wb', buffering=_WRITE_BUFFER_SIZE)
+        self._file.write(_HEADER_STRUCT.pack(_TRACE_MAGIC, _TRACE_VERSION, start_time))
+
+        utils_exit.register_on_exit(self.close)
+
+        _log.info('Trace recording started: {}.'.format(file_path_name))
+
+    def write_acc(self, acc_data : drv_acc.AccData, is_out_of_threshold : bool):
+        self._write(TRACE_RECORD_TYPE.ACC, _ACC_PAYLOAD_STRUCT.pack(
+            acc_data.x_mg, acc_data.y_mg, acc_data.z_mg, 1 if is_out_of_threshold else 0))
+
+    def write_adc(self, ext_batt_voltage, int_batt_voltage, is_ext_batt_charging):
+        self._write(TRACE_RECORD_TYPE.ADC, _ADC_PAYLOAD_STRUCT.pack(
+            ext_batt_voltage, int_batt_voltage, 1 if is_ext_batt_charging else 0))
+
+    def write_nmea(self, sentence : bytes):
+        sentence = sentence[:0xFFFF]
+        self._write(TRACE_RECORD_TYPE.NMEA,
+            _NMEA_PAYLOAD_STRUCT.pack(len(sentence)) + sentence)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+                _log.info('Trace recording closed: {}.'.format(self._file_path_name))
+
+    def _write(self, record_type, payload : bytes):
+        with self._lock:
+            if self._file.closed:
+                return
+
+            current_time_us = int(clock.time() * 1000000)
+            delta_us = min(max(current_time_us - self._last_time_us, 0), _MAX_RECORD_DELTA_US)
+            self._last_time_us += delta_us
+
+            self._file.write(_RECORD_HEADER_STRUCT.pack(record_type, delta_us))
+            self._file.write(payload)
+
+
+class TraceReader:
+    def __init__(self, file_path_name):
+        self._file_path_name = file_path_name
+
+        with open(file=file_path_name, mode='rb') as trace_file:
+            magic, version, self._start_time = _HEADER_STRUCT.unpack(
+                trace_file.read(_HEADER_STRUCT.size))
+
+        if (magic != _TRACE_MAGIC) or (version != _TRACE_VERSION):
+            raise ValueError('Unsupported trace file: {}.'.format(file_path_name))
+
+    def get_start_time(self) -> float:
+        return self._start_time
+
+    def __iter__(self):
+        with open(file=self._file_path_name, mode='rb') as trace_file:
+            data = trace_file.read()
+
+        offset = _HEADER_STRUCT.size
+        time_us = int(self._start_time * 1000000)
+
+        while offset + _RECORD_HEADER_STRUCT.size <= len(data):
+            record_type, delta_us = _RECORD_HEADER_STRUCT.unpack_from(data, offset)
+            offset += _RECORD_HEADER_STRUCT.size
+            time_us += delta_us
+            timestamp = time_us / 1000000
+
+            if record_type == TRACE_RECORD_TYPE.ACC:
+                if offset + _ACC_PAYLOAD_STRUCT.size > len(data):
+                    break
+                x_mg, y_mg, z_mg, flags = _ACC_PAYLOAD_STRUCT.unpack_from(data, offset)
+                offset += _ACC_PAYLOAD_STRUCT.size
+                yield AccRecord(timestamp, drv_acc.AccData(x_mg, y_mg, z_mg), (flags & 0x01) > 0)
+            elif record_type == TRACE_RECORD_TYPE.ADC:
+                if offset + _ADC_PAYLOAD_STRUCT.size > len(data):
+                    break
+                ext_batt_voltage, int_batt_voltage, flags = _ADC_PAYLOAD_STRUCT.unpack_from(
+                    data, offset)
+                offset += _ADC_PAYLOAD_STRUCT.size
+                yield AdcRecord(timestamp, ext_batt_voltage, int_batt_voltage, (flags & 0x01) > 0)
+            elif record_type == TRACE_RECORD_TYPE.NMEA:
+                if offset + _NMEA_PAYLOAD_STRUCT.size > len(data):
+                    break
+                (length,) = _NMEA_PAYLOAD_STRUCT.unpack_from(data, offset)
+                offset += _NMEA_PAYLOAD_STRUCT.size
+                if offset + length > len(data):
+                    break
+                yield NmeaRecord(timestamp, data[offset:offset + length])
+                offset += length
+            else:
+                raise ValueError('Unknown trace record type: {}.'.format(record_type))
+
+
+# Dispatches trace records to the replay drivers, paced by the application clock. Application clock
+# should be aligned with the trace start time before the replay is started.
+class TracePlayer:
+    def __init__(self, reader : TraceReader):
+        self._reader = reader
+        self._sinks = {}
+        self._finished_event = threading.Event()
+        self._play_thread : Union[threading.Thread, None] = None
+        self._start_lock = threading.Lock()
+
+    def add_sink(self, record_type : TRACE_RECORD_TYPE, callback):
+        self._sinks[record_type] = callback
+
+    def dispatch(self, record):
+        callback = self._sinks.get(record.type, None)
+        if callback != None:
+            callback(record)
+
+    def start(self):
+        with self._start_lock:
+            if self._play_thread == None:
+                self._play_thread = threading.Thread(target=self._play_thread_func)
+                self._play_thread.start()
+
+    def get_finished_event(self) -> threading.Event:
+        return self._finished_event
+
+    def _play_thread_func(self):
+        try:
+            _log.info('Trace replay started, speed: {}.'.format(clock.get_speed()))
+
+            for record in self._reader:
+                clock.sleep(record.timestamp - clock.time())
+                self.dispatch(record)
+
+            _log.info('Trace replay finished.')
+            self._finished_event.set()
+        except:
+            _log.error(traceback.format_exc())
+            utils_exit.exit(1)
@@ -0,0 +1,107 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import threading
+import collections
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.clock as clock
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.libraries.cloud.cloud_protocol as lib_cloud_protocol
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+# Telemetry events waiting for the next packet, in arrival order.
+# debounce_periods maps event class names to the minimum time between events of that type,
+# seconds. An event which comes earlier is held until the period ends, a newer event of the same
+# type replaces the held one. An event with the same value as the last released one is dropped
+# (the state flapped and returned). Events of other types are released immediately.
+class TelemetryEventQueue:
+    def __init__(self, debounce_periods : dict=None):
+        self._debounce_periods = {} if debounce_periods == None else dict(debounce_periods)
+        self._lock = threading.Lock()
+
+        self._events = collections.deque()
+        # Event type name -> held event, released time and map of the last released event.
+        self._held_events = {}
+        self._release_times = {}
+        self._release_maps = {}
+        self._dropped_count = 0
+
+    # Returns True if the event is ready to be sent, False if it is held by debounce.
+    def put(self, event : lib_cloud_protocol.Event) -> bool:
+        event_type = type(event).__name__
+        period = self._debounce_periods.get(event_type, 0)
+
+        with self._lock:
+            if period <= 0:
+                self._events.append(event)
+                return True
+
+            if event_type in self._held_events:
+                self._held_events[event_type] = event
+                return False
+
+            current_time = clock.time()
+            release_time = self._release_times.get(event_type)
+            if (release_time == None) or (current_time - release_time >= period):
+                return self._release(event_type, event, current_time)
+
+            self._held_events[event_type] = event
+            return False
+
+    # Releases held events whose debounce period ended, returns True if any event is ready.
+    def has_ready_events(self) -> bool:
+        with self._lock:
+            self._release_held_events(clock.time())
+            return len(self._events) > 0
+
+    # Returns all ready events and removes them from the queue.
+    def pop_all(self) -> list:
+        with self._lock:
+            self._release_held_events(clock.time())
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    # Time when the next held event is released, None if there are no held events.
+    def get_next_release_time(self):
+        with self._lock:
+            release_times = [
+                self._release_times[event_type] + self._debounce_periods[event_type]
+                for event_type in self._held_events]
+            return min(release_times) if len(release_times) > 0 else None
+
+    def get_dropped_count(self) -> int:
+        return self._dropped_count
+
+    def _release(self, event_type, event, current_time) -> bool:
+        event_map = event.to_map()
+        if event_map == self._release_maps.get(event_type):
+            self._dropped_count += 1
+            _log.debug('%s dropped by debounce.', event_type)
+            return False
+
+        self._events.append(event)
+        self._release_times[event_type] = current_time
+        self._release_maps[event_type] = event_map
+        return True
+
+    def _release_held_events(self, current_time):
+        for event_type, event in list(self._held_events.items()):
+            if current_time - self._release_times[event_type] < self._debounce_periods[event_type]:
+                continue
+            del self._held_events[event_type]
+            self._release(event_type, event, current_time)
@@ -0,0 +1,299 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import threading
+import struct
+import zlib
+import json
+import enum
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.project_config as prj_cfg
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+# Record is: payload length, payload CRC32, payload (compact JSON).
+_RECORD_HEADER = struct.Struct('<II')
+_SEGMENT_EXTENSION = '.seg'
+_CURSOR_FILE_NAME = 'cursor'
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+class SPOOL_EVICTION(enum.Enum):
+    # Oldest segment is deleted to free space for new packets.
+    DROP_OLDEST = 'drop_oldest'
+    # New packets are dropped while the spool is full.
+    DROP_NEWEST = 'drop_newest'
+
+
+# Disk backed FIFO of telemetry payloads which survives cloud outages and restarts.
+# Payloads are appended to segment files of about segment_size bytes, fully read segments are
+# deleted. Read position is stored in a cursor file on commit(), so a packet is only removed from
+# the spool after it was sent: peek() returns the oldest payloads, commit(count) removes them.
+# Total size of segment files is limited by max_size, eviction selects what is dropped then.
+# With fsync every put() and commit() is flushed to the storage, otherwise the data is only handed
+# over to the OS (a power loss can lose the last packets, but SD card is not worn by small writes).
+class TelemetrySpool:
+    def __init__(self, path, max_size, segment_size,
+        eviction : SPOOL_EVICTION=SPOOL_EVICTION.DROP_OLDEST, fsync=False
+    ):
+        if max_size < 2 * segment_size:
+            raise ValueError('Spool size should be at least two segments.')
+
+        self._path = path
+        self._max_size = max_size
+        self._segment_size = segment_size
+        self._eviction = eviction
+        self._fsync = fsync
+        self._lock = threading.Lock()
+
+        # Segments as [id, size, records count], oldest first. The last one is written.
+        self._segments = []
+        # Read position in the first segment.
+        self._read_offset = 0
+        self._read_index = 0
+        self._size = 0
+        self._count = 0
+        self._dropped_count = 0
+
+        self._writer = None
+        self._reader = None
+        self._reader_segment_id = None
+        # Segment ID, offset and index after every record returned by the last peek().
+        self._peeked_positions = []
+
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+        _log.debug('TelemetrySpool: {} packets, {} bytes in {}.'.format(
+            self._count, self._size, path))
+
+    def get_count(self) -> int:
+        return self._count
+
+    # Disk space used by segment files, bytes.
+    def get_size(self) -> int:
+        return self._size
+
+    def get_dropped_count(self) -> int:
+        return self._dropped_count
+
+    # Appends a payload, returns False if it was dropped by DROP_NEWEST eviction.
+    def put(self, payload) -> bool:
+        data = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        record = _RECORD_HEADER.pack(len(data), zlib.crc32(data)) + data
+
+        with self._lock:
+            if len(record) > self._segment_size:
+                _log.error('Telemetry packet is bigger than spool segment, dropped.')
+                self._dropped_count += 1
+                return False
+
+            if self._segments[-1][1] + len(record) > self._segment_size:
+                self._add_segment()
+
+            while self._size + len(record) > self._max_size:
+                if self._eviction == SPOOL_EVICTION.DROP_NEWEST:
+                    self._dropped_count += 1
+                    return False
+                self._drop_oldest_segment()
+
+            self._writer.write(record)
+            self._writer.flush()
+            if self._fsync:
+                os.fsync(self._writer.fileno())
+
+            segment = self._segments[-1]
+            segment[1] += len(record)
+            segment[2] += 1
+            self._size += len(record)
+            self._count += 1
+            return True
+
+    # Returns up to max_count oldest payloads without removing them.
+    def peek(self, max_count) -> list:
+        with self._lock:
+            payloads = []
+            self._peeked_positions = []
+            segment_number = 0
+            offset = self._read_offset
+            index = self._read_index
+
+            while (len(payloads) < max_count) and (segment_number < len(self._segments)):
+                segment_id, _, records_count = self._segments[segment_number]
+                if index >= records_count:
+                    segment_number += 1
+                    offset = 0
+                    index = 0
+                    continue
+
+                data, offset = self._read_record(segment_id, offset)
+                index += 1
+                payloads.append(json.loads(data.decode('utf-8')))
+                self._peeked_positions.append((segment_id, offset, index))
+
+            return payloads
+
+    # Removes count payloads returned by the last peek(). Payloads evicted after peek() are
+    # already removed.
+    def commit(self, count):
+        with self._lock:
+            count = min(count, len(self._peeked_positions))
+            if count <= 0:
+                return
+            segment_id, offset, index = self._peeked_positions[count - 1]
+            self._peeked_positions = []
+
+            while self._segments[0][0] < segment_id:
+                self._remove_first_segment()
+            if (self._segments[0][0] == segment_id) and (offset > self._read_offset):
+                self._count -= index - self._read_index
+                self._read_offset = offset
+                self._read_index = index
+            while (len(self._segments) > 1) and (self._read_index >= self._segments[0][2]):
+                self._remove_first_segment()
+
+            # Written segment is emptied when everything is sent, it is not grown forever.
+            if (len(self._segments) == 1) and (self._count == 0):
+                self._writer.truncate(0)
+                self._size = 0
+                self._segments[0][1] = 0
+                self._segments[0][2] = 0
+                self._read_offset = 0
+                self._read_index = 0
+
+            self._save_cursor()
+
+    def close(self):
+        with self._lock:
+            self._close_reader()
+            if self._writer != None:
+                self._writer.close()
+                self._writer = None
+
+    def _get_segment_path(self, segment_id):
+        return os.path.join(self._path, '{:010d}{}'.format(segment_id, _SEGMENT_EXTENSION))
+
+    def _load(self):
+        segment_ids = sorted(
+            int(name[:-len(_SEGMENT_EXTENSION)]) for name in os.listdir(self._path)
+            if name.endswith(_SEGMENT_EXTENSION) and name[:-len(_SEGMENT_EXTENSION)].isdigit())
+
+        cursor_segment_id, cursor_offset = self._load_cursor()
+        for segment_id in segment_ids:
+            if (cursor_segment_id != None) and (segment_id < cursor_segment_id):
+                # Segment was read but not deleted before restart.
+                os.remove(self._get_segment_path(segment_id))
+                continue
+            size, records_count = self._scan_segment(segment_id)
+            self._segments.append([segment_id, size, records_count])
+
+        if len(self._segments) == 0:
+            self._segments.append([0 if cursor_segment_id == None else cursor_segment_id, 0, 0])
+        elif self._segments[0][0] == cursor_segment_id:
+            # Count records before the cursor, the cursor can not be behind a torn record.
+            offset = 0
+            while offset < min(cursor_offset, self._segments[0][1]):
+                _, offset = self._read_record(self._segments[0][0], offset, False)
+                self._read_index += 1
+            self._read_offset = offset
+            self._close_reader()
+
+        self._size = sum(segment[1] for segment in self._segments)
+        self._count = sum(segment[2] for segment in self._segments) - self._read_index
+        self._writer = open(self._get_segment_path(self._segments[-1][0]), 'ab')
+
+    # Returns valid data size and records count, truncates a torn or corrupted tail.
+    def _scan_segment(self, segment_id):
+        path = self._get_segment_path(segment_id)
+        size = 0
+        records_count = 0
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(_RECORD_HEADER.size)
+                if len(header) < _RECORD_HEADER.size:
+                    break
+                length, crc = _RECORD_HEADER.unpack(header)
+                data = f.read(length)
+                if (len(data) < length) or (zlib.crc32(data) != crc):
+                    break
+                size += _RECORD_HEADER.size + length
+                records_count += 1
+
+        if size != os.path.getsize(path):
+            _log.warning('Spool segment {} is damaged, truncated to {} bytes.'.format(
+                segment_id, size))
+            with open(path, 'r+b') as f:
+                f.truncate(size)
+        return size, records_count
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self._path, _CURSOR_FILE_NAME), 'r') as f:
+                segment_id, offset = f.read().split()
+                return int(segment_id), int(offset)
+        except (FileNotFoundError, ValueError):
+            return None, 0
+
+    def _save_cursor(self):
+        path = os.path.join(self._path, _CURSOR_FILE_NAME)
+        with open(path + '.tmp', 'w') as f:
+            f.write('{} {}'.format(self._segments[0][0], self._read_offset))
+            if self._fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    def _read_record(self, segment_id, offset, decode=True):
+        if self._reader_segment_id != segment_id:
+            self._close_reader()
+            self._reader = open(self._get_segment_path(segment_id), 'rb')
+            self._reader_segment_id = segment_id
+        self._reader.seek(offset)
+        length, _ = _RECORD_HEADER.unpack(self._reader.read(_RECORD_HEADER.size))
+        data = self._reader.read(length) if decode else None
+        return data, offset + _RECORD_HEADER.size + length
+
+    def _close_reader(self):
+        if self._reader != None:
+            self._reader.close()
+            self._reader = None
+            self._reader_segment_id = None
+
+    def _add_segment(self):
+        self._writer.close()
+        segment_id = self._segments[-1][0] + 1
+        self._segments.append([segment_id, 0, 0])
+        self._writer = open(self._get_segment_path(segment_id), 'ab')
+
+    def _remove_first_segment(self):
+        segment_id, size, records_count = self._segments.pop(0)
+        self._size -= size
+        self._count -= records_count - self._read_index
+        self._read_offset = 0
+        self._read_index = 0
+        if self._reader_segment_id == segment_id:
+            self._close_reader()
+        os.remove(self._get_segment_path(segment_id))
+
+    def _drop_oldest_segment(self):
+        if len(self._segments) == 1:
+            self._add_segment()
+        dropped_count = self._segments[0][2] - self._read_index
+        self._remove_first_segment()
+        self._save_cursor()
+        self._dropped_count += dropped_count
+        _log.warning('Telemetry spool is full, {} oldest packets dropped.'.format(dropped_count))
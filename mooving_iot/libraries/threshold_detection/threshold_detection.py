@@ -0,0 +1,215 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import time
+import threading
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.clock as clock
+import mooving_iot.utils.metrics as metrics
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.drivers.adc.adc as drv_adc
+import mooving_iot.drivers.GNSS.GNSS as drv_gnss
+import mooving_iot.libraries.cloud.cloud_protocol as lib_cloud_protocol
+import mooving_iot.libraries.acc_threshold_detector.acc_threshold_detector as lib_acc_thr_detector
+import mooving_iot.libraries.device_config.device_config as lib_device_config
+import mooving_iot.libraries.event_bus.event_bus as lib_event_bus
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+# Detection period without sensor events: polling period if the event bus is not used.
+_DEFAULT_IDLE_PERIOD = 0.1
+# Detection period while alarm is active, alarm phases are switched by time.
+_ALARM_PERIOD = 0.1
+
+
+#***************************************************************************************************
+# Public variables
+#***************************************************************************************************
+ALARM_PHASE_NONE = 0
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+# Batteries, movement and GNSS threshold detection with alarm phases processing.
+# on_event(event) is called with every new telemetry event, on_alarm_phase(phase) is called when
+# alarm phase is changed (ALARM_PHASE_NONE when alarm is finished).
+# With event_bus the detection reacts to accelerometer and GNSS changes immediately, idle_period is
+# the detection period without sensor events (batteries voltages are only checked periodically).
+# sensor_event replaces the internal threading.Event, the asyncio runtime passes an aio.LoopEvent
+# and calls async_wait_and_process() from a loop task.
+class ThresholdDetection:
+    def __init__(self,
+        adc : drv_adc.Adc, GNSS : drv_gnss.GNSS,
+        acc_thr_detector : lib_acc_thr_detector.AccThresholdDetector,
+        device_config : lib_device_config.DeviceConfig,
+        on_event, on_alarm_phase,
+        event_bus : lib_event_bus.EventBus=None, idle_period=_DEFAULT_IDLE_PERIOD,
+        sensor_event=None
+    ):
+        self._adc = adc
+        self._GNSS = GNSS
+        self._acc_thr_detector = acc_thr_detector
+        self._device_config = device_config
+        self._on_event = on_event
+        self._on_alarm_phase = on_alarm_phase
+
+        self._is_acc_out_of_thr = False
+        self._is_angle_out_of_thr = False
+        self._is_gps_data_change_detected = False
+        self._last_longitude = GNSS.get_longitude()
+        self._last_latitude = GNSS.get_latitude()
+        self._is_ext_batt_charging = adc.ext_batt_is_charging()
+        self._ext_batt_voltage = adc.get_ext_batt_voltage()
+        self._int_batt_voltage = adc.get_int_batt_voltage()
+
+        self._alarm_phase = ALARM_PHASE_NONE
+        self._alarm_start_time_ms = 0
+        self._is_alarm = False
+
+        self._iteration_time_metric = metrics.histogram(
+            'detection_iteration_seconds', 'Threshold detection iteration time.')
+
+        self._idle_period = idle_period
+        self._sensor_event = threading.Event() if sensor_event == None else sensor_event
+        if event_bus != None:
+            for topic in lib_event_bus.SENSOR_TOPIC:
+                event_bus.subscribe(topic, self._on_sensor_event)
+
+    def is_alarm(self) -> bool:
+        return self._is_alarm
+
+    # Waits for a sensor event or the detection period and runs one detection iteration.
+    def wait_and_process(self):
+        clock.wait(self._sensor_event, self._get_wait_period())
+        self._sensor_event.clear()
+        self._measured_process()
+
+    # Same as wait_and_process() for the asyncio runtime, sensor_event should be an aio.LoopEvent.
+    async def async_wait_and_process(self):
+        await self._sensor_event.wait(self._get_wait_period())
+        self._sensor_event.clear()
+        self._measured_process()
+
+    # One detection iteration, should be called periodically.
+    def process(self):
+        config = self._device_config.get_snapshot()
+        state = config['deviceState']
+
+        # Batteries voltages and charging detection
+        ext_batt_voltage_new = self._adc.get_ext_batt_voltage()
+        int_batt_voltage_new = self._adc.get_int_batt_voltage()
+        is_ext_batt_charging_new = self._adc.ext_batt_is_charging()
+        int_batt_threshold = config['intBattThresholdV']
+        ext_batt_threshold = config['extBattThresholdV']
+
+        if ((int_batt_voltage_new >= self._int_batt_voltage + int_batt_threshold)
+            or (int_batt_voltage_new <= self._int_batt_voltage - int_batt_threshold)
+        ):
+            self._int_batt_voltage = int_batt_voltage_new
+            _log.debug('Internal battery voltage: %s V.', self._int_batt_voltage)
+            self._on_event(lib_cloud_protocol.IntBattEvent(self._int_batt_voltage))
+
+        if ((ext_batt_voltage_new >= self._ext_batt_voltage + ext_batt_threshold)
+            or (ext_batt_voltage_new <= self._ext_batt_voltage - ext_batt_threshold)
+        ):
+            self._ext_batt_voltage = ext_batt_voltage_new
+            _log.debug('External battery voltage: %s V.', self._ext_batt_voltage)
+            self._on_event(lib_cloud_protocol.ExtBattEvent(self._ext_batt_voltage))
+
+        if is_ext_batt_charging_new != self._is_ext_batt_charging:
+            self._is_ext_batt_charging = is_ext_batt_charging_new
+            _log.debug('External battery charge: %s.', self._is_ext_batt_charging)
+            self._on_event(lib_cloud_protocol.ChargingEvent(self._is_ext_batt_charging))
+
+        # Accelerometer movement and angles threshold detection
+        is_acc_out_of_thr_new = self._acc_thr_detector.is_acc_out_of_threshold()
+        is_angle_out_of_thr_new = self._acc_thr_detector.is_angles_out_of_threshold()
+
+        if (is_acc_out_of_thr_new != self._is_acc_out_of_thr) and (state != 'unlock'):
+            self._is_acc_out_of_thr = is_acc_out_of_thr_new
+            _log.debug('Acc data out of threshold updated: %s', self._is_acc_out_of_thr)
+            self._on_event(lib_cloud_protocol.AccMovementEvent(self._is_acc_out_of_thr))
+
+        if (is_angle_out_of_thr_new != self._is_angle_out_of_thr) and (state != 'unlock'):
+            self._is_angle_out_of_thr = is_angle_out_of_thr_new
+            angles = self._acc_thr_detector.get_angles()
+            _log.debug('Angles are: x: %s, y: %s, z: %s.', angles.x, angles.y, angles.z)
+            _log.debug('Angle out of threshold updated: %s', self._is_angle_out_of_thr)
+            self._on_event(lib_cloud_protocol.AccFallEvent(self._is_angle_out_of_thr))
+
+        # GPS threshold detection
+        is_gps_data_change_detected_new, new_longitude, new_latitude = (
+            self._GNSS.get_gps_data_change(self._last_longitude, self._last_latitude))
+        if ((is_gps_data_change_detected_new != self._is_gps_data_change_detected)
+            and (state != 'unlock') and (self._GNSS.get_valid()==True)):
+            if ((new_longitude != "0.0") and (self._last_longitude != "0.0")
+                and (new_latitude != "0.0") and (self._last_latitude != "0.0")):
+                self._is_gps_data_change_detected = is_gps_data_change_detected_new
+            self._last_longitude = new_longitude
+            self._last_latitude = new_latitude
+            _log.debug('GPS position has been changed')
+            self._on_event(
+                lib_cloud_protocol.GNSSMovementEvent(self._is_gps_data_change_detected))
+
+        alarm_active = (self._is_gps_data_change_detected or self._is_acc_out_of_thr
+            or self._is_angle_out_of_thr)
+
+        # Process alarm if required
+        if alarm_active and state != "unlock":
+            current_time_ms = clock.time_ms()
+            if self._alarm_start_time_ms == 0:
+                self._is_alarm = True
+                self._alarm_start_time_ms = current_time_ms
+
+            first_phase_timeout_ms = config['firstPhaseAlarmTimeout'] * 1000
+            second_phase_timeout_ms = config['secondPhaseAlarmTimeout'] * 1000
+            third_phase_timeout_ms = config['thirdPhaseAlarmTimeout'] * 1000
+
+            if self._alarm_start_time_ms + first_phase_timeout_ms >= current_time_ms:
+                if self._alarm_phase == 0:
+                    _log.debug('Alarm first phase started.')
+                    self._set_alarm_phase(1)
+            elif (self._alarm_start_time_ms + second_phase_timeout_ms <= current_time_ms
+                and self._alarm_start_time_ms + third_phase_timeout_ms >= current_time_ms
+            ):
+                if self._alarm_phase == 1:
+                    _log.debug('Alarm second phase started.')
+                    self._set_alarm_phase(2)
+            else:
+                if self._alarm_phase == 2:
+                    _log.debug('Alarm third phase started.')
+                    self._set_alarm_phase(3)
+        elif self._alarm_phase != ALARM_PHASE_NONE:
+            self._is_alarm = False
+            _log.debug('Alarm finished.')
+            self._alarm_start_time_ms = 0
+            self._set_alarm_phase(ALARM_PHASE_NONE)
+
+    def _measured_process(self):
+        start_time = time.perf_counter()
+        self.process()
+        self._iteration_time_metric.observe(time.perf_counter() - start_time)
+
+    def _get_wait_period(self):
+        return self._idle_period if self._alarm_phase == ALARM_PHASE_NONE else _ALARM_PERIOD
+
+    def _on_sensor_event(self, topic, value):
+        self._sensor_event.set()
+
+    def _set_alarm_phase(self, phase):
+        self._alarm_phase = phase
+        self._on_alarm_phase(phase)
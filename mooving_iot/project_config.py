@@ -30,5 +30,61 @@ GLOBAL_LOG_LEVEL = LogLevel.DEBUG if DEBUG else LogLevel.INFO
 FILE_LOG_ENABLE = False
 # Log file path and name
 FILE_LOG_PATH = '{current_dir}/../logs'.format(current_dir=os.path.dirname(__file__))
+# Log file is split into segments of this size, bytes, or age, seconds (None disables age limit).
+# Closed segments are compressed, the oldest ones are deleted when all of them exceed total size.
+FILE_LOG_SEGMENT_SIZE = 1024 * 1024
+FILE_LOG_SEGMENT_MAX_AGE = 24 * 60 * 60
+FILE_LOG_MAX_TOTAL_SIZE = 16 * 1024 * 1024
+FILE_LOG_COMPRESS = True
+# Log file line format: 'text' (same as console) or 'compact' (epoch time, level letter, module)
+FILE_LOG_FORMAT = 'text'
+# Log messages waiting for the background writer, new messages are dropped when it is full
+LOG_QUEUE_SIZE = 10000
 # Config file path and name
 FILE_CONFIG_PATH = '{current_dir}/../config'.format(current_dir=os.path.dirname(__file__))
+# Config changes within this time after the first one are written to the file once, seconds.
+# 0 writes every change immediately. Changes of the last period are lost on power loss.
+DEVICE_CONFIG_STORE_DELAY = 1.0
+# Metrics endpoint http://<host>:<port>/metrics, None port disables it
+METRICS_HTTP_HOST = '127.0.0.1'
+METRICS_HTTP_PORT = None
+# Metrics are sent with telemetry as a MetricsEvent with this period, seconds, 0 disables it
+METRICS_TELEMETRY_PERIOD = 60 * 60
+# Sampling profiler of the 'profile' cloud command: sample interval, seconds, maximum part of the
+# CPU time taken by the sampler and maximum run duration, seconds
+PROFILER_SAMPLE_INTERVAL = 0.01
+PROFILER_MAX_DUTY = 0.02
+PROFILER_MAX_DURATION = 120
+# Frames kept from the leaf of every sampled stack and collapsed stacks in the uploaded profile
+PROFILER_MAX_DEPTH = 24
+PROFILER_MAX_STACKS = 100
+# Telemetry spool path, packets are stored there until they are sent to the cloud
+TELEMETRY_SPOOL_PATH = '{current_dir}/../spool'.format(current_dir=os.path.dirname(__file__))
+# Telemetry spool disk space limit and segment file size, bytes
+TELEMETRY_SPOOL_MAX_SIZE = 4 * 1024 * 1024
+TELEMETRY_SPOOL_SEGMENT_SIZE = 256 * 1024
+# Packets dropped when the spool is full: 'drop_oldest' or 'drop_newest'
+TELEMETRY_SPOOL_EVICTION = 'drop_oldest'
+# Flush every spooled packet to the storage, safer on power loss but wears SD card
+TELEMETRY_SPOOL_FSYNC = False
+# Telemetry payload encoder: 'json', 'json-native', 'cbor', 'msgpack' or 'struct'
+TELEMETRY_ENCODER = 'json'
+# Telemetry MQTT qos: 0 (fire and forget) or 1 (acknowledged by PUBACK, resent after reconnect)
+TELEMETRY_QOS = 0
+# Maximum telemetry messages waiting for PUBACK with qos 1
+TELEMETRY_MAX_INFLIGHT = 10
+# Maximum packets in one cloud message, 1 disables batching
+TELEMETRY_BATCH_SIZE = 1
+# Time a packet can wait for a full batch, seconds. Delays alarm events as well.
+TELEMETRY_BATCH_MAX_DELAY = 0
+# Telemetry events which come within this time after the first one are sent in one packet, seconds
+TELEMETRY_COALESCE_WINDOW = 0.5
+# Minimum time between telemetry events of a type, seconds. Faster changes are sent as the latest
+# state when the time ends, or not sent if the state returned to the last sent one.
+TELEMETRY_EVENTS_DEBOUNCE = {
+    'AccMovementEvent': 10.0,
+    'GNSSMovementEvent': 10.0,
+    'ChargingEvent': 5.0,
+    'ExtBattEvent': 30.0,
+    'IntBattEvent': 30.0
+}
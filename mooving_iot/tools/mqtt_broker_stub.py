@@ -0,0 +1,296 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import time
+import struct
+import asyncio
+import argparse
+import threading
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.project_config as prj_cfg
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.INFO)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+# MQTT 3.1.1 control packet types.
+_CONNECT = 1
+_CONNACK = 2
+_PUBLISH = 3
+_PUBACK = 4
+_SUBSCRIBE = 8
+_SUBACK = 9
+_PINGREQ = 12
+_PINGRESP = 13
+_DISCONNECT = 14
+
+_CONNACK_ACCEPTED = bytes([_CONNACK << 4, 2, 0, 0])
+_PINGRESP_PACKET = bytes([_PINGRESP << 4, 0])
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+# Minimal MQTT 3.1.1 broker stand-in for tests and benchmarks, runs an asyncio loop in its own
+# thread. Accepts any client, acknowledges qos 1 publishes after ack_delay seconds and records
+# received messages (unless record_messages is False) and connect times. publish() sends a
+# message to the clients subscribed to its topic, client publishes are not routed. No retained
+# messages or sessions. stop() and start() again simulate a broker restart on the same port.
+class MqttBrokerStub:
+    def __init__(self, host='127.0.0.1', port=0, ack_delay=0.0, record_messages=True):
+        self._host = host
+        self._port = port
+        self._ack_delay = ack_delay
+        self._acks_enabled = True
+        self._record_messages = record_messages
+        self._message_listener = None
+
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._writers = set()
+        # Writer -> topic filters subscribed by the client.
+        self._subscriptions = {}
+
+        self._lock = threading.Lock()
+        # (topic, payload, dup) of received publishes.
+        self._messages = []
+        # time.monotonic() of received connect requests.
+        self._connect_times = []
+
+    # Starts the broker and returns its port.
+    def start(self) -> int:
+        started_event = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._thread_main, args=(started_event,), daemon=True)
+        self._thread.start()
+        started_event.wait()
+        _log.info('MQTT broker stub listens on {}:{}.'.format(self._host, self._port))
+        return self._port
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def set_ack_delay(self, ack_delay):
+        self._ack_delay = ack_delay
+
+    # Disabled acks are lost, clients retransmit such messages after reconnect.
+    def set_acks_enabled(self, is_enabled):
+        self._acks_enabled = is_enabled
+
+    # Closes all client connections as on a network failure.
+    def disconnect_clients(self):
+        self._loop.call_soon_threadsafe(self._close_writers)
+
+    # Sends a qos 0 message to the clients subscribed to the topic.
+    def publish(self, topic, payload : bytes):
+        packet = _encode_packet(_PUBLISH << 4, _encode_string(topic) + payload)
+        self._loop.call_soon_threadsafe(self._write_subscribed, topic, packet)
+
+    # callback(topic, payload) is called from the broker thread for every received publish.
+    def set_message_listener(self, callback):
+        self._message_listener = callback
+
+    def get_client_count(self) -> int:
+        return len(self._writers)
+
+    def get_messages(self) -> list:
+        with self._lock:
+            return list(self._messages)
+
+    def get_connect_times(self) -> list:
+        with self._lock:
+            return list(self._connect_times)
+
+    def get_duplicate_count(self) -> int:
+        with self._lock:
+            return sum(1 for _, _, dup in self._messages if dup)
+
+    def _thread_main(self, started_event):
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle_client, self._host, self._port))
+        self._port = self._server.sockets[0].getsockname()[1]
+        started_event.set()
+        self._loop.run_forever()
+        # Client handlers end on the end of stream of the closed connections.
+        self._server.close()
+        self._close_writers()
+        self._loop.run_until_complete(
+            asyncio.gather(*asyncio.all_tasks(self._loop), return_exceptions=True))
+        self._loop.run_until_complete(self._server.wait_closed())
+        self._loop.close()
+
+    def _close_writers(self):
+        for writer in list(self._writers):
+            writer.close()
+        self._writers.clear()
+        self._subscriptions.clear()
+
+    def _write_subscribed(self, topic, packet):
+        for writer, topic_filters in self._subscriptions.items():
+            if any(_is_topic_matched(topic_filter, topic) for topic_filter in topic_filters):
+                writer.write(packet)
+
+    async def _handle_client(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while True:
+                header, body = await _read_packet(reader)
+                packet_type = header >> 4
+                if packet_type == _CONNECT:
+                    with self._lock:
+                        self._connect_times.append(time.monotonic())
+                    writer.write(_CONNACK_ACCEPTED)
+                elif packet_type == _PUBLISH:
+                    self._handle_publish(writer, header, body)
+                elif packet_type == _SUBSCRIBE:
+                    # Packet ID, then topic filters with requested qos, qos 1 at most is granted.
+                    granted = bytearray()
+                    topic_filters = self._subscriptions.setdefault(writer, [])
+                    position = 2
+                    while position < len(body):
+                        topic_len, = struct.unpack_from('!H', body, position)
+                        position += 2
+                        topic_filters.append(
+                            body[position:position + topic_len].decode('utf-8'))
+                        position += topic_len
+                        granted.append(min(body[position], 1))
+                        position += 1
+                    writer.write(_encode_packet(_SUBACK << 4, body[0:2] + granted))
+                elif packet_type == _PINGREQ:
+                    writer.write(_PINGRESP_PACKET)
+                elif packet_type == _DISCONNECT:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            self._subscriptions.pop(writer, None)
+            writer.close()
+
+    def _handle_publish(self, writer, header, body):
+        qos = (header >> 1) & 0x03
+        dup = (header & 0x08) != 0
+        topic_len, = struct.unpack_from('!H', body, 0)
+        topic = body[2:2 + topic_len].decode('utf-8')
+        position = 2 + topic_len
+        packet_id = None
+        if qos > 0:
+            packet_id = body[position:position + 2]
+            position += 2
+
+        payload = bytes(body[position:])
+        if self._record_messages:
+            with self._lock:
+                self._messages.append((topic, payload, dup))
+        if self._message_listener != None:
+            self._message_listener(topic, payload)
+
+        if (packet_id == None) or not self._acks_enabled:
+            return
+        puback = bytes([_PUBACK << 4, 2]) + packet_id
+        if self._ack_delay > 0:
+            self._loop.call_later(self._ack_delay, _write_if_open, writer, puback)
+        else:
+            writer.write(puback)
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _parse_command_line_args():
+    parser = argparse.ArgumentParser(
+        description='Minimal MQTT 3.1.1 broker stand-in which acknowledges qos 1 publishes.')
+    parser.add_argument(
+            '--host',
+            default='127.0.0.1',
+            help='Listen address.')
+    parser.add_argument(
+            '--port',
+            default=1883,
+            type=int,
+            help='Listen port.')
+    parser.add_argument(
+            '--ack_delay',
+            default=0.0,
+            type=float,
+            help='PUBACK delay, seconds.')
+    return parser.parse_args()
+
+
+async def _read_packet(reader):
+    header = (await reader.readexactly(1))[0]
+    remaining_length = 0
+    multiplier = 1
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        remaining_length += (byte & 0x7F) * multiplier
+        if (byte & 0x80) == 0:
+            break
+        multiplier *= 128
+    body = await reader.readexactly(remaining_length) if remaining_length > 0 else b''
+    return header, body
+
+
+def _encode_packet(header, body : bytes) -> bytes:
+    length = len(body)
+    encoded_length = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        encoded_length.append(byte | 0x80 if length > 0 else byte)
+        if length == 0:
+            break
+    return bytes([header]) + bytes(encoded_length) + bytes(body)
+
+
+def _encode_string(value : str) -> bytes:
+    data = value.encode('utf-8')
+    return struct.pack('!H', len(data)) + data
+
+
+# MQTT topic filter match, '+' matches one level and '#' the rest of the topic.
+def _is_topic_matched(topic_filter, topic) -> bool:
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for index, filter_level in enumerate(filter_levels):
+        if filter_level == '#':
+            return True
+        if index >= len(topic_levels):
+            return False
+        if (filter_level != '+') and (filter_level != topic_levels[index]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def _write_if_open(writer, data):
+    if not writer.is_closing():
+        writer.write(data)
+
+
+#***************************************************************************************************
+# Startup point
+#***************************************************************************************************
+if __name__ == '__main__':
+    args = _parse_command_line_args()
+    broker = MqttBrokerStub(args.host, args.port, args.ack_delay)
+    broker.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        broker.stop()
+    utils_exit.exit(0)
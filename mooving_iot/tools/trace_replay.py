@@ -0,0 +1,116 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global imports
+import os
+import time
+import argparse
+import functools
+
+# Project imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.clock as clock
+import mooving_iot.project_config as prj_cfg
+
+import mooving_iot.drivers.acc.acc as drv_acc
+import mooving_iot.drivers.acc.trace.acc_trace as drv_acc_trace
+import mooving_iot.drivers.adc.adc as drv_adc
+import mooving_iot.drivers.adc.trace.adc_trace as drv_adc_trace
+import mooving_iot.drivers.GNSS.GNSS as drv_gnss
+import mooving_iot.drivers.GNSS.trace.gnss_trace as drv_gnss_trace
+import mooving_iot.libraries.sensor_trace.sensor_trace as lib_sensor_trace
+import mooving_iot.libraries.acc_threshold_detector.acc_threshold_detector as lib_acc_thr_detector
+import mooving_iot.libraries.device_config.device_config as lib_device_config
+import mooving_iot.libraries.threshold_detection.threshold_detection as lib_threshold_detection
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.INFO)
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _parse_command_line_args():
+    parser = argparse.ArgumentParser(
+        description='Replay a sensor trace through the detection pipeline as fast as possible.')
+    parser.add_argument(
+            'trace_file',
+            help='Sensor trace file recorded with MOOVING_IOT_TRACE_RECORD.')
+    parser.add_argument(
+            '--detection_period',
+            default=0.1,
+            type=float,
+            help='Threshold detection period in trace time, seconds.')
+    return parser.parse_args()
+
+
+# Replays the whole trace synchronously in trace time and returns the number of replayed records.
+def replay(trace_file, detection_period, on_event, on_alarm_phase) -> int:
+    reader = lib_sensor_trace.TraceReader(trace_file)
+    player = lib_sensor_trace.TracePlayer(reader)
+    clock.set_manual_time(reader.get_start_time())
+
+    acc = drv_acc.Acc(
+        functools.partial(drv_acc_trace.AccTraceReplay, trace_player=player), None, None)
+    adc = drv_adc.Adc(functools.partial(drv_adc_trace.AdcTraceReplay, trace_player=player))
+    GNSS = drv_gnss.GNSS(
+        functools.partial(drv_gnss_trace.GNSSTraceReplay, trace_player=player), None)
+
+    device_config = lib_device_config.DeviceConfig.get_instance()
+    acc_thr_detector = lib_acc_thr_detector.AccThresholdDetector(acc, start_thread=False)
+    acc_thr_detector.set_acc_threshold(
+        device_config.get_param('accThresholdMg').value,
+        device_config.get_param('accPeakDurationMs').value,
+        device_config.get_param('accTotalDurationMs').value,
+        device_config.get_param('accPeakCount').value)
+    acc_thr_detector.set_angles_threshold(
+        device_config.get_param('accAngleThresholdDegree').value,
+        device_config.get_param('accAngleTotalDurationMs').value)
+
+    threshold_detection = lib_threshold_detection.ThresholdDetection(
+        adc, GNSS, acc_thr_detector, device_config, on_event, on_alarm_phase)
+
+    records_count = 0
+    next_detection_time = reader.get_start_time() + detection_period
+    for record in reader:
+        while next_detection_time <= record.timestamp:
+            clock.set_manual_time(next_detection_time)
+            threshold_detection.process()
+            next_detection_time += detection_period
+
+        clock.set_manual_time(record.timestamp)
+        player.dispatch(record)
+        if record.type == lib_sensor_trace.TRACE_RECORD_TYPE.ACC:
+            acc_thr_detector.update()
+        records_count += 1
+
+    return records_count
+
+
+#***************************************************************************************************
+# Startup point
+#***************************************************************************************************
+if __name__ == '__main__':
+    args = _parse_command_line_args()
+    start_time = lib_sensor_trace.TraceReader(args.trace_file).get_start_time()
+
+    def on_event(event):
+        _log.info('[{:10.3f} s] Event: {}'.format(clock.time() - start_time, str(event)))
+
+    def on_alarm_phase(phase):
+        _log.info('[{:10.3f} s] Alarm phase: {}'.format(clock.time() - start_time, phase))
+
+    wall_start = time.monotonic()
+    records_count = replay(args.trace_file, args.detection_period, on_event, on_alarm_phase)
+    wall_time = time.monotonic() - wall_start
+    trace_time = clock.time() - start_time
+
+    _log.info('Replayed {} records, trace time: {:.1f} s, wall time: {:.3f} s.'
+        .format(records_count, trace_time, wall_time))
+    _log.info('Throughput: {:.0f} records/s, {:.1f}x real time.'
+        .format(records_count / max(wall_time, 1e-9), trace_time / max(wall_time, 1e-9)))
+    utils_exit.exit(0)
@@ -0,0 +1,53 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global packages imports
+import asyncio
+import threading
+
+# Local packages imports
+import mooving_iot.utils.clock as clock
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+# threading.Event replacement for the asyncio runtime. set() can be called from any thread, driver
+# and network threads use it to wake up loop tasks. clear() and wait() are loop thread only.
+class LoopEvent:
+    def __init__(self, loop : asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._loop_thread_id = None
+        self._event = asyncio.Event()
+
+    def set(self):
+        if threading.get_ident() == self._loop_thread_id:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(self._event.set)
+
+    def clear(self):
+        self._event.clear()
+
+    def is_set(self) -> bool:
+        return self._event.is_set()
+
+    # Same as clock.wait(): timeout is in application clock seconds, returns the event state.
+    async def wait(self, timeout=None) -> bool:
+        self._loop_thread_id = threading.get_ident()
+        if timeout == None:
+            await self._event.wait()
+        else:
+            try:
+                await asyncio.wait_for(self._event.wait(), max(0, timeout) / clock.get_speed())
+            except asyncio.TimeoutError:
+                pass
+        return self._event.is_set()
+
+
+#***************************************************************************************************
+# Public functions
+#***************************************************************************************************
+# Same as clock.sleep() for loop tasks.
+async def sleep(seconds):
+    await asyncio.sleep(max(0, seconds) / clock.get_speed())
@@ -0,0 +1,69 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global packages imports
+import time as _time
+import threading
+
+
+#***************************************************************************************************
+# Private variables
+#***************************************************************************************************
+# Application time is: _virtual_origin + (real time - _real_origin) * _speed.
+# In manual mode application time is frozen at _virtual_origin until set_manual_time() is called.
+_clock_lock = threading.Lock()
+_real_origin = _time.time()
+_virtual_origin = _real_origin
+_speed = 1.0
+_is_manual = False
+
+
+#***************************************************************************************************
+# Public functions
+#***************************************************************************************************
+# Scales application time, used to replay sensor traces faster than real time.
+def set_speed(speed, virtual_time=None):
+    assert speed > 0, 'Speed should be a positive value!'
+
+    global _real_origin, _virtual_origin, _speed, _is_manual
+    with _clock_lock:
+        current_time = time() if virtual_time == None else virtual_time
+        _real_origin = _time.time()
+        _virtual_origin = current_time
+        _speed = speed
+        _is_manual = False
+
+
+# Switches to manually driven time, sleeps return immediately.
+def set_manual_time(virtual_time):
+    global _virtual_origin, _is_manual
+    with _clock_lock:
+        _virtual_origin = virtual_time
+        _is_manual = True
+
+
+def get_speed() -> float:
+    return _speed
+
+
+def time() -> float:
+    if _is_manual:
+        return _virtual_origin
+    return _virtual_origin + (_time.time() - _real_origin) * _speed
+
+
+def time_ms() -> int:
+    return int(time() * 1000)
+
+
+def sleep(seconds):
+    if not _is_manual:
+        _time.sleep(max(0, seconds) / _speed)
+
+
+def wait(event : threading.Event, timeout=None) -> bool:
+    if timeout == None:
+        return event.wait()
+    if _is_manual:
+        return event.is_set()
+    return event.wait(max(0, timeout) / _speed)
@@ -0,0 +1,140 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global packages imports
+import os
+import time
+import smbus2
+
+# Local packages imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.i2c_lock as i2c_lock
+import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.metrics as metrics
+import mooving_iot.project_config as prj_cfg
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Private variables
+#***************************************************************************************************
+# Open bus handles by bus number, guarded by the common I2C lock.
+_buses = {}
+# Devices by (bus number, address).
+_devices = {}
+
+_lock_wait_time = metrics.histogram(
+    'i2c_lock_wait_seconds', 'Time waiting for the common I2C lock before a transaction.')
+_transaction_time = metrics.histogram(
+    'i2c_transaction_seconds', 'I2C combined transaction time.')
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+# Device on a shared I2C bus. Transactions are serialized with the common I2C lock and use the bus
+# handle which is kept open, so register accesses do not open and close the bus device file.
+class I2cDevice:
+    def __init__(self, bus_num, addr):
+        self._bus_num = bus_num
+        self._addr = addr
+        self._transactions_count = 0
+        self._bytes_count = 0
+
+    def get_bus_num(self) -> int:
+        return self._bus_num
+
+    def get_addr(self) -> int:
+        return self._addr
+
+    def get_transactions_count(self) -> int:
+        return self._transactions_count
+
+    def get_bytes_count(self) -> int:
+        return self._bytes_count
+
+    def read_register(self, register_id) -> int:
+        return self.read_registers(register_id, 1)[0]
+
+    # Reads length consecutive registers, the device should auto increment the register address.
+    def read_registers(self, register_id, length) -> bytes:
+        write = smbus2.i2c_msg.write(self._addr, [register_id])
+        read = smbus2.i2c_msg.read(self._addr, length)
+        self.transaction(write, read)
+        return bytes(read)
+
+    # Reads not consecutive registers in one combined transaction, values are returned in the
+    # same order as register_ids.
+    def read_register_list(self, register_ids) -> list:
+        msgs = []
+        reads = []
+        for register_id in register_ids:
+            read = smbus2.i2c_msg.read(self._addr, 1)
+            msgs.append(smbus2.i2c_msg.write(self._addr, [register_id]))
+            msgs.append(read)
+            reads.append(read)
+        self.transaction(*msgs)
+        return [list(read)[0] for read in reads]
+
+    def write_register(self, register_id, value):
+        self.transaction(smbus2.i2c_msg.write(self._addr, [register_id, value]))
+
+    # Writes list of (register_id, value) pairs in one combined transaction.
+    def write_register_list(self, values):
+        self.transaction(
+            *[smbus2.i2c_msg.write(self._addr, [register_id, value])
+            for register_id, value in values])
+
+    def transaction(self, *msgs):
+        start_time = time.perf_counter()
+        with i2c_lock.i2c_get_lock():
+            lock_time = time.perf_counter()
+            get_bus(self._bus_num).i2c_rdwr(*msgs)
+            transaction_time = time.perf_counter() - lock_time
+            self._transactions_count += 1
+            self._bytes_count += sum(msg.len for msg in msgs)
+        _transaction_time.observe(transaction_time)
+        _lock_wait_time.observe(lock_time - start_time)
+
+
+#***************************************************************************************************
+# Public functions
+#***************************************************************************************************
+# Returns the open handle of the bus, should be called with the I2C lock acquired. Buses are closed
+# on exit after the drivers created before the first bus access are stopped.
+def get_bus(bus_num) -> smbus2.SMBus:
+    bus = _buses.get(bus_num, None)
+    if bus == None:
+        if len(_buses) == 0:
+            utils_exit.register_on_exit(close_all)
+        bus = smbus2.SMBus(bus_num)
+        _buses[bus_num] = bus
+        _log.debug('I2C bus {} opened.'.format(bus_num))
+    return bus
+
+
+# Returns the device instance shared by all users of the (bus_num, addr) device.
+def get_device(bus_num, addr) -> I2cDevice:
+    with i2c_lock.i2c_get_lock():
+        device = _devices.get((bus_num, addr), None)
+        if device == None:
+            device = I2cDevice(bus_num, addr)
+            _devices[(bus_num, addr)] = device
+        return device
+
+
+def get_devices() -> list:
+    with i2c_lock.i2c_get_lock():
+        return list(_devices.values())
+
+
+def close_all():
+    with i2c_lock.i2c_get_lock():
+        for bus in _buses.values():
+            bus.close()
+        _buses.clear()
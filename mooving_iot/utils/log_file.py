@@ -0,0 +1,144 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global packages imports
+import datetime
+import os
+import sys
+import time
+import gzip
+import shutil
+import threading
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+_SEGMENT_PREFIX = 'log_'
+_SEGMENT_EXT = '.log'
+_COMPRESSED_EXT = '.log.gz'
+# Lower than the gzip module default 9: less CPU on the device for slightly larger files.
+_COMPRESS_LEVEL = 6
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+# Log file split into segments log_<UTC time>.log. A segment is closed when it reaches max_size
+# bytes or is older than max_age seconds, closed segments are compressed in a background thread.
+# The oldest segments are deleted when all of them take more than max_total_size bytes.
+# Segments left uncompressed by a previous run are compressed on start.
+# Not thread safe, the logger serializes writes.
+class RotatingLogFile:
+    def __init__(self, path, max_size, max_age, max_total_size, compress=True):
+        assert max_size > 0, 'Segment size should be positive!'
+
+        self._path = path
+        self._max_size = max_size
+        self._max_age = max_age
+        self._max_total_size = max_total_size
+        self._compress = compress
+        self._compress_lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        self._file = None
+        self._open_segment()
+        self._start_compression(self._get_closed_segments())
+
+    def write(self, text : str):
+        if ((self._segment_size >= self._max_size)
+            or ((self._max_age != None)
+                and (time.monotonic() - self._segment_open_time >= self._max_age))):
+            self.rotate()
+
+        self._file.write(text)
+        self._segment_size += len(text)
+
+    def flush(self):
+        self._file.flush()
+
+    # Closes the current segment and starts a new one.
+    def rotate(self):
+        closed_segment = self._file_path_name
+        self._file.close()
+        self._open_segment()
+        self._start_compression([closed_segment])
+
+    def close(self):
+        if self._file != None:
+            self._file.close()
+            self._file = None
+
+    def get_file_path_name(self) -> str:
+        return self._file_path_name
+
+    def _open_segment(self):
+        self._file_path_name = os.path.join(self._path, '{prefix}{date}{ext}'.format(
+            prefix=_SEGMENT_PREFIX,
+            date=datetime.datetime.utcnow().strftime('%Y_%m_%d_T%H_%M_%S_%f'),
+            ext=_SEGMENT_EXT))
+        self._file = open(file=self._file_path_name, mode='w')
+        self._segment_size = 0
+        self._segment_open_time = time.monotonic()
+
+    # Closed uncompressed segments, the oldest first.
+    def _get_closed_segments(self) -> list:
+        return sorted(
+            os.path.join(self._path, file_name) for file_name in os.listdir(self._path)
+            if file_name.startswith(_SEGMENT_PREFIX) and file_name.endswith(_SEGMENT_EXT)
+                and (os.path.join(self._path, file_name) != self._file_path_name))
+
+    def _start_compression(self, segments):
+        thread = threading.Thread(
+            target=self._compress_thread_func, args=(segments,), daemon=True)
+        thread.start()
+
+    def _compress_thread_func(self, segments):
+        with self._compress_lock:
+            if self._compress:
+                for segment in segments:
+                    _compress_segment(segment)
+            self._apply_retention()
+
+    # Deletes the oldest closed segments over the total size limit. With compression only compressed
+    # segments are counted, the uncompressed ones are waiting for their compression thread.
+    def _apply_retention(self):
+        segment_ext = _COMPRESSED_EXT if self._compress else _SEGMENT_EXT
+        segments = []
+        for file_name in sorted(os.listdir(self._path)):
+            file_path_name = os.path.join(self._path, file_name)
+            if (file_name.startswith(_SEGMENT_PREFIX)
+                and file_name.endswith(segment_ext)
+                and (file_path_name != self._file_path_name)):
+                try:
+                    segments.append((file_path_name, os.path.getsize(file_path_name)))
+                except OSError:
+                    pass
+
+        total_size = self._max_size + sum(size for _, size in segments)
+        for file_path_name, size in segments:
+            if total_size <= self._max_total_size:
+                break
+            try:
+                os.remove(file_path_name)
+            except OSError:
+                pass
+            total_size -= size
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+# Writes <segment>.gz and removes the segment. Errors are reported to stderr, the logger can not log
+# its own file errors.
+def _compress_segment(file_path_name):
+    compressed_path_name = file_path_name[:-len(_SEGMENT_EXT)] + _COMPRESSED_EXT
+    tmp_path_name = compressed_path_name + '.tmp'
+    try:
+        with open(file=file_path_name, mode='rb') as src_file:
+            with gzip.open(tmp_path_name, mode='wb', compresslevel=_COMPRESS_LEVEL) as dst_file:
+                shutil.copyfileobj(src_file, dst_file)
+        os.replace(tmp_path_name, compressed_path_name)
+        os.remove(file_path_name)
+    except OSError as err:
+        print('Log segment {} is not compressed: {}'.format(file_path_name, err), file=sys.stderr)
@@ -3,12 +3,15 @@
 #***************************************************************************************************
 # Global packages imports
 import datetime
-import os
+import sys
+import time
+import queue
 import threading
 
 # Local packages imports
 import mooving_iot.project_config as prj_cfg
 import mooving_iot.utils.exit as utils_exit
+import mooving_iot.utils.log_file as utils_log_file
 
 
 #***************************************************************************************************
@@ -19,14 +22,121 @@ _MSG_TYPE_STR_WARN = 'WARNING'
 _MSG_TYPE_STR_INFO = 'INFO'
 _MSG_TYPE_STR_DEBUG = 'DEBUG'
 
+# Plain int levels, compared on every log call.
+_LEVEL_ERROR = int(prj_cfg.LogLevel.ERROR)
+_LEVEL_WARNING = int(prj_cfg.LogLevel.WARNING)
+_LEVEL_INFO = int(prj_cfg.LogLevel.INFO)
+_LEVEL_DEBUG = int(prj_cfg.LogLevel.DEBUG)
+
+# Time to write queued messages on exit and flush(), seconds.
+_WRITER_STOP_TIMEOUT = 2.0
+
+
+#***************************************************************************************************
+# Private classes
+#***************************************************************************************************
+# Writes log messages in a background thread, so log calls never wait for the console or the
+# file. Messages are formatted by the writer, a full queue drops new messages and the writer reports
+# how many were dropped. After stop() messages are written by the calling thread.
+class _LogWriter:
+    def __init__(self, queue_size):
+        self._queue = queue.SimpleQueue()
+        self._queue_size = queue_size
+        self._dropped_count = 0
+        self._log_file = None
+        self._is_file_compact = False
+        self._write_lock = threading.Lock()
+        self._is_stopped = False
+
+        self._thread = threading.Thread(target=self._write_thread_func, daemon=True)
+        self._thread.start()
+
+    def put(self, record):
+        if self._is_stopped:
+            self._write([record])
+            return
+
+        # Approximate limit, SimpleQueue puts are much cheaper than bounded Queue ones.
+        if self._queue.qsize() >= self._queue_size:
+            self._dropped_count += 1
+        else:
+            self._queue.put(record)
+
+    def set_log_file(self, log_file, is_compact):
+        with self._write_lock:
+            self._log_file = log_file
+            self._is_file_compact = is_compact
+
+    # Waits until messages queued before the call are written.
+    def flush(self):
+        if self._is_stopped:
+            return
+
+        written_event = threading.Event()
+        self._queue.put(written_event)
+        written_event.wait(_WRITER_STOP_TIMEOUT)
+
+    # Writes queued messages and closes the log file.
+    def stop(self):
+        self.flush()
+        self._is_stopped = True
+        with self._write_lock:
+            if self._log_file != None:
+                self._log_file.close()
+                self._log_file = None
+
+    def _write_thread_func(self):
+        while True:
+            records = [self._queue.get()]
+            while len(records) < self._queue_size:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if self._dropped_count > 0:
+                dropped_count, self._dropped_count = self._dropped_count, 0
+                records.append((time.time(), _MSG_TYPE_STR_WARN, 'logger',
+                    '%d log messages dropped, queue is full.', (dropped_count,)))
+
+            written_events = [record for record in records if isinstance(record, threading.Event)]
+            self._write([record for record in records if not isinstance(record, threading.Event)])
+            for written_event in written_events:
+                written_event.set()
+
+    def _write(self, records):
+        if len(records) == 0:
+            return
+
+        messages = [_format_message(record) for record in records]
+        text = ''.join([
+            _format_line(record, message) for record, message in zip(records, messages)])
+        with self._write_lock:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+            if self._log_file == None:
+                return
+
+            if self._is_file_compact:
+                text = ''.join([_format_compact_line(record, message)
+                    for record, message in zip(records, messages)])
+            # A full storage should not stop console logging.
+            try:
+                self._log_file.write(text)
+                self._log_file.flush()
+            except OSError as err:
+                print('Log file write error: {}'.format(err), file=sys.stderr)
+
 
 #***************************************************************************************************
 # Public classes
 #***************************************************************************************************
+# Messages take lazy %-style arguments: _log.debug('x = %d mg', x) is formatted by the writer
+# thread and only if the level is enabled. Arguments should not be changed after the call.
 class Logger:
-    __log_file = None
-    __file_lock = threading.Lock()
-    __print_lock = threading.Lock()
+    __instances = []
+    __writer = None
+    __writer_lock = threading.Lock()
 
     def __init__(self, module_name, log_level):
         assert type(module_name) is str, 'Value should be a string!'
@@ -34,57 +144,101 @@ class Logger:
 
         self._module_name = module_name
         self._log_level = log_level
-
-        if prj_cfg.FILE_LOG_ENABLE and (Logger.__log_file == None):
-            file_path_name = '{path}/log_{date}.log'.format(
-                path=prj_cfg.FILE_LOG_PATH,
-                date=datetime.datetime.utcnow().strftime('%Y_%m_%d_T%H_%M_%S_%f'))
-
-            with Logger.__file_lock:
-                try:
-                    os.makedirs(prj_cfg.FILE_LOG_PATH, exist_ok=True)
-                    Logger.__log_file = open(file=file_path_name, mode='w')
-                except OSError as err:
-                    self.error('Cannot open file: {file}, error: {err}'
-                        .format(file=file_path_name, err=err))
-                else:
-                    utils_exit.register_on_exit(Logger.close_log_file)
+        self._update_enabled_level()
+        Logger.__instances.append(self)
+
+        with Logger.__writer_lock:
+            if Logger.__writer != None:
+                return
+            Logger.__writer = _LogWriter(prj_cfg.LOG_QUEUE_SIZE)
+            utils_exit.register_on_exit(Logger.close_log_file)
+
+        if prj_cfg.FILE_LOG_ENABLE:
+            try:
+                log_file = utils_log_file.RotatingLogFile(
+                    prj_cfg.FILE_LOG_PATH,
+                    prj_cfg.FILE_LOG_SEGMENT_SIZE,
+                    prj_cfg.FILE_LOG_SEGMENT_MAX_AGE,
+                    prj_cfg.FILE_LOG_MAX_TOTAL_SIZE,
+                    prj_cfg.FILE_LOG_COMPRESS)
+            except OSError as err:
+                self.error('Cannot open log file in: %s, error: %s', prj_cfg.FILE_LOG_PATH, err)
+            else:
+                Logger.__writer.set_log_file(log_file, prj_cfg.FILE_LOG_FORMAT == 'compact')
 
     def error(self, value, *args):
-        if self._is_log_enabled(prj_cfg.LogLevel.ERROR):
-            self._print(_MSG_TYPE_STR_ERR, value, *args)
+        if self._enabled_level >= _LEVEL_ERROR:
+            self._print(_MSG_TYPE_STR_ERR, value, args)
 
     def warning(self, value, *args):
-        if self._is_log_enabled(prj_cfg.LogLevel.WARNING):
-            self._print(_MSG_TYPE_STR_WARN, value, *args)
+        if self._enabled_level >= _LEVEL_WARNING:
+            self._print(_MSG_TYPE_STR_WARN, value, args)
 
     def info(self, value, *args):
-        if self._is_log_enabled(prj_cfg.LogLevel.INFO):
-            self._print(_MSG_TYPE_STR_INFO, value, *args)
+        if self._enabled_level >= _LEVEL_INFO:
+            self._print(_MSG_TYPE_STR_INFO, value, args)
 
     def debug(self, value, *args):
-        if self._is_log_enabled(prj_cfg.LogLevel.DEBUG):
-            self._print(_MSG_TYPE_STR_DEBUG, value, *args)
+        if self._enabled_level >= _LEVEL_DEBUG:
+            self._print(_MSG_TYPE_STR_DEBUG, value, args)
 
+    # For arguments which are expensive to compute even when passed lazily.
+    def is_enabled(self, log_level) -> bool:
+        return self._enabled_level >= log_level
+
+    # Changes GLOBAL_LOG_LEVEL at runtime, levels are cached by every logger.
+    @staticmethod
+    def set_global_log_level(log_level):
+        assert isinstance(log_level, prj_cfg.LogLevel), 'Value should be a LogLevel enum value!'
+
+        prj_cfg.GLOBAL_LOG_LEVEL = log_level
+        for instance in Logger.__instances:
+            instance._update_enabled_level()
+
+    # Waits until the messages logged so far are written.
+    @staticmethod
+    def flush():
+        if Logger.__writer != None:
+            Logger.__writer.flush()
+
+    # Writes queued messages and closes the log file, later messages are written synchronously.
     @staticmethod
     def close_log_file():
-        if Logger.__log_file != None:
-            Logger.__log_file.close()
+        if Logger.__writer != None:
+            Logger.__writer.stop()
 
-    def _print(self, msg_type, value, *args):
-        assert type(msg_type) is str, 'Value should be a string!'
+    def _print(self, msg_type, value, args):
         assert type(value) is str, 'Value should be a string!'
 
-        with Logger.__print_lock:
-            format_str = '[{date}] <{type}> "{module}": {value}'.format(
-                date=datetime.datetime.utcnow().isoformat(),
-                module=self._module_name,
-                type=msg_type,
-                value=value)
+        Logger.__writer.put((time.time(), msg_type, self._module_name, value, args))
+
+    def _update_enabled_level(self):
+        self._enabled_level = int(min(self._log_level, prj_cfg.GLOBAL_LOG_LEVEL))
 
-            print(format_str, *args)
-            if prj_cfg.FILE_LOG_ENABLE and (Logger.__log_file != None):
-                print(format_str, *args, file=Logger.__log_file)
 
-    def _is_log_enabled(self, log_level):
-        return (self._log_level >= log_level) and (prj_cfg.GLOBAL_LOG_LEVEL >= log_level)
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+def _format_message(record) -> str:
+    _, _, _, value, args = record
+    if len(args) > 0:
+        try:
+            return value % args
+        except (TypeError, ValueError, KeyError):
+            return '{} {}'.format(value, args)
+    return value
+
+
+def _format_line(record, message) -> str:
+    timestamp, msg_type, module_name, _, _ = record
+    return '[{date}] <{type}> "{module}": {value}\n'.format(
+        date=datetime.datetime.utcfromtimestamp(timestamp).isoformat(),
+        module=module_name,
+        type=msg_type,
+        value=message)
+
+
+# <epoch time> <first letter of the type> <module>: <message>
+def _format_compact_line(record, message) -> str:
+    timestamp, msg_type, module_name, _, _ = record
+    return '{:.3f} {} {}: {}\n'.format(timestamp, msg_type[0], module_name, message)
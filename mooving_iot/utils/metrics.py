@@ -0,0 +1,310 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global packages imports
+import threading
+import weakref
+import inspect
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+# Histogram buckets are log-linear: values below 2 * _SUB_BUCKETS have own buckets, every next
+# power of two range is split into _SUB_BUCKETS buckets, so a bucket is within 1/16 of its values.
+_SUB_BUCKET_BITS = 4
+_SUB_BUCKETS = 1 << _SUB_BUCKET_BITS
+_LINEAR_LIMIT = 2 * _SUB_BUCKETS
+
+# Quantiles of exported histograms.
+_QUANTILES = (0.5, 0.9, 0.99)
+
+
+#***************************************************************************************************
+# Private classes
+#***************************************************************************************************
+# Values accumulated by one thread, written by that thread only.
+class _HistogramCell:
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+# Every thread increments its own cell, so inc() takes no lock. The value is the sum of the cells,
+# cells of finished threads are kept.
+class Counter:
+    def __init__(self, name : str, help_text : str):
+        self._name = name
+        self._help_text = help_text
+        self._local = threading.local()
+        self._cells = []
+        self._cells_lock = threading.Lock()
+
+    def get_name(self) -> str:
+        return self._name
+
+    def get_help_text(self) -> str:
+        return self._help_text
+
+    def inc(self, value=1):
+        try:
+            self._local.cell[0] += value
+        except AttributeError:
+            self._create_cell()[0] += value
+
+    def get_value(self):
+        return sum(cell[0] for cell in list(self._cells))
+
+    def _create_cell(self) -> list:
+        cell = [0]
+        self._local.cell = cell
+        with self._cells_lock:
+            self._cells.append(cell)
+        return cell
+
+
+# Last set() value plus values of the sources. Sources are functions read on collection, e.g. the
+# qsize() of a queue, so the measured code does not change. Bound method sources are weak, they
+# are removed with their objects.
+class Gauge:
+    def __init__(self, name : str, help_text : str):
+        self._name = name
+        self._help_text = help_text
+        self._value = 0
+        self._sources = []
+        self._sources_lock = threading.Lock()
+
+    def get_name(self) -> str:
+        return self._name
+
+    def get_help_text(self) -> str:
+        return self._help_text
+
+    def set(self, value):
+        self._value = value
+
+    def add_source(self, source_func):
+        if inspect.ismethod(source_func):
+            source_ref = weakref.WeakMethod(source_func)
+        else:
+            source_ref = lambda: source_func
+        with self._sources_lock:
+            self._sources.append(source_ref)
+
+    def get_value(self):
+        value = self._value
+        with self._sources_lock:
+            self._sources = [source_ref for source_ref in self._sources if source_ref() != None]
+            sources = list(self._sources)
+        for source_ref in sources:
+            source_func = source_ref()
+            if source_func != None:
+                value += source_func()
+        return value
+
+
+class HistogramSnapshot:
+    def __init__(self, counts : dict, count : int, sum_value : float, max_value : float, scale):
+        self._counts = counts
+        self._count = count
+        self._sum = sum_value
+        self._max = max_value
+        self._scale = scale
+
+    def get_count(self) -> int:
+        return self._count
+
+    def get_sum(self) -> float:
+        return self._sum
+
+    def get_max(self) -> float:
+        return self._max
+
+    # Middle of the bucket with the percentile value, 0 without values.
+    def get_percentile(self, percentile) -> float:
+        if self._count == 0:
+            return 0.0
+
+        rank = max(1, percentile / 100 * self._count)
+        accumulated_count = 0
+        for index in sorted(self._counts):
+            accumulated_count += self._counts[index]
+            if accumulated_count >= rank:
+                lower, upper = _get_bucket_range(index)
+                return min((lower + upper) / 2 / self._scale, self._max)
+        return self._max
+
+
+# HDR-style histogram of non-negative values. Values are multiplied by scale and counted in
+# log-linear integer buckets, e.g. scale 1e6 records seconds with microsecond resolution. Every
+# thread counts in its own cell, so observe() takes no lock.
+class Histogram:
+    def __init__(self, name : str, help_text : str, scale=1e6):
+        self._name = name
+        self._help_text = help_text
+        self._scale = scale
+        self._local = threading.local()
+        self._cells = []
+        self._cells_lock = threading.Lock()
+
+    def get_name(self) -> str:
+        return self._name
+
+    def get_help_text(self) -> str:
+        return self._help_text
+
+    def observe(self, value):
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._create_cell()
+
+        scaled_value = int(value * self._scale)
+        if scaled_value < _LINEAR_LIMIT:
+            index = max(0, scaled_value)
+        else:
+            shift = scaled_value.bit_length() - _SUB_BUCKET_BITS - 1
+            index = (shift << _SUB_BUCKET_BITS) + (scaled_value >> shift)
+
+        cell.counts[index] = cell.counts.get(index, 0) + 1
+        cell.count += 1
+        cell.sum += value
+        if value > cell.max:
+            cell.max = value
+
+    def get_snapshot(self) -> HistogramSnapshot:
+        counts = {}
+        count = 0
+        sum_value = 0.0
+        max_value = 0.0
+        for cell in list(self._cells):
+            for index, bucket_count in dict(cell.counts).items():
+                counts[index] = counts.get(index, 0) + bucket_count
+            count += cell.count
+            sum_value += cell.sum
+            max_value = max(max_value, cell.max)
+        return HistogramSnapshot(counts, count, sum_value, max_value, self._scale)
+
+    def _create_cell(self) -> _HistogramCell:
+        cell = _HistogramCell()
+        self._local.cell = cell
+        with self._cells_lock:
+            self._cells.append(cell)
+        return cell
+
+
+# Metrics by name. Creating a metric which exists returns the existing one, so modules and
+# instances can create their metrics without coordination.
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name : str, help_text : str) -> Counter:
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name : str, help_text : str) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text)
+
+    def histogram(self, name : str, help_text : str, scale=1e6) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, scale)
+
+    def get_metrics(self) -> list:
+        with self._lock:
+            return list(self._metrics.values())
+
+    # Prometheus text exposition format, histograms are exported as summaries.
+    def get_text(self) -> str:
+        lines = []
+        for metric in self.get_metrics():
+            name = metric.get_name()
+            lines.append('# HELP {} {}'.format(name, metric.get_help_text()))
+            if isinstance(metric, Histogram):
+                snapshot = metric.get_snapshot()
+                lines.append('# TYPE {} summary'.format(name))
+                for quantile in _QUANTILES:
+                    lines.append('{}{{quantile="{}"}} {}'.format(
+                        name, quantile, _format_value(snapshot.get_percentile(quantile * 100))))
+                lines.append('{}_sum {}'.format(name, _format_value(snapshot.get_sum())))
+                lines.append('{}_count {}'.format(name, snapshot.get_count()))
+            else:
+                lines.append('# TYPE {} {}'.format(
+                    name, 'counter' if isinstance(metric, Counter) else 'gauge'))
+                lines.append('{} {}'.format(name, _format_value(metric.get_value())))
+        return '\n'.join(lines) + '\n'
+
+    # Map for telemetry: counters and gauges as numbers, histograms as [count, p50, p99, max].
+    def get_compact_map(self) -> dict:
+        compact_map = {}
+        for metric in self.get_metrics():
+            if isinstance(metric, Histogram):
+                snapshot = metric.get_snapshot()
+                compact_map[metric.get_name()] = [
+                    snapshot.get_count(),
+                    _round_value(snapshot.get_percentile(50)),
+                    _round_value(snapshot.get_percentile(99)),
+                    _round_value(snapshot.get_max())]
+            else:
+                compact_map[metric.get_name()] = _round_value(metric.get_value())
+        return compact_map
+
+    def _get_or_create(self, MetricCls, name, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric == None:
+                metric = MetricCls(name, *args)
+                self._metrics[name] = metric
+            elif type(metric) != MetricCls:
+                raise ValueError('Metric {} is a {}.'.format(name, type(metric).__name__))
+            return metric
+
+
+#***************************************************************************************************
+# Private variables
+#***************************************************************************************************
+_registry = MetricsRegistry()
+
+
+#***************************************************************************************************
+# Public functions
+#***************************************************************************************************
+# Process wide registry, the module functions below create metrics in it.
+def get_registry() -> MetricsRegistry:
+    return _registry
+
+
+def counter(name : str, help_text : str) -> Counter:
+    return _registry.counter(name, help_text)
+
+
+def gauge(name : str, help_text : str) -> Gauge:
+    return _registry.gauge(name, help_text)
+
+
+def histogram(name : str, help_text : str, scale=1e6) -> Histogram:
+    return _registry.histogram(name, help_text, scale)
+
+
+#***************************************************************************************************
+# Private functions
+#***************************************************************************************************
+# Returns [lower, upper) scaled values of a histogram bucket.
+def _get_bucket_range(index):
+    if index < _LINEAR_LIMIT:
+        return index, index + 1
+    shift = (index >> _SUB_BUCKET_BITS) - 1
+    lower = (index - (shift << _SUB_BUCKET_BITS)) << shift
+    return lower, lower + (1 << shift)
+
+
+def _format_value(value) -> str:
+    return str(value) if isinstance(value, int) else '{:.9g}'.format(value)
+
+
+def _round_value(value):
+    return value if isinstance(value, int) else float('{:.4g}'.format(value))
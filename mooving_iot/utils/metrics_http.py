@@ -0,0 +1,69 @@
+#***************************************************************************************************
+# Imports
+#***************************************************************************************************
+# Global packages imports
+import os
+import threading
+import http.server
+
+# Local packages imports
+import mooving_iot.utils.logger as logger
+import mooving_iot.utils.metrics as metrics
+import mooving_iot.project_config as prj_cfg
+
+
+#***************************************************************************************************
+# Module logger
+#***************************************************************************************************
+_log = logger.Logger(os.path.basename(__file__)[0:-3], prj_cfg.LogLevel.DEBUG)
+
+
+#***************************************************************************************************
+# Private constants
+#***************************************************************************************************
+_METRICS_PATH = '/metrics'
+_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+#***************************************************************************************************
+# Private classes
+#***************************************************************************************************
+class _MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != _METRICS_PATH:
+            self.send_error(404)
+            return
+
+        body = self.server.registry.get_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', _CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        _log.debug('%s %s', self.address_string(), format % args)
+
+
+#***************************************************************************************************
+# Public classes
+#***************************************************************************************************
+# Serves the registry in Prometheus text format at http://<host>:<port>/metrics from a background
+# thread. Port 0 selects a free port.
+class MetricsHttpServer:
+    def __init__(self, host, port, registry : metrics.MetricsRegistry=None):
+        self._server = http.server.ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+        self._server.daemon_threads = True
+        self._server.registry = metrics.get_registry() if registry == None else registry
+        self._thread = None
+
+    def start(self) -> int:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        host, port = self._server.server_address[:2]
+        _log.info('Metrics are served at http://%s:%d%s.', host, port, _METRICS_PATH)
+        return port
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()